@@ -0,0 +1,74 @@
+"""
+Tables of the squares each kind of piece moves through and attacks from
+every square of an empty board, and of the squares between two others,
+shared by the move generators, the tablebases and the batch evaluator.
+
+Squares are board array indexes (0 is a8, 63 is h1) and bitmasks have bit n
+set for square n, as in bitboard.py.
+"""
+
+STRAIGHT = ((1, 0), (-1, 0), (0, 1), (0, -1))
+DIAGONAL = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+DIRECTIONS = {
+    'k': STRAIGHT + DIAGONAL, 'q': STRAIGHT + DIAGONAL, 'r': STRAIGHT,
+    'b': DIAGONAL, 'n': ((1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)),
+}
+REACH = {'k': 1, 'n': 1, 'q': 7, 'r': 7, 'b': 7}
+
+def _square(x, y):
+    return y * 8 + x if 0 <= x < 8 and 0 <= y < 8 else None
+
+def _rays(letter, square):
+    """The squares piece letter can move through from square, a tuple per direction."""
+    x, y = square % 8, square // 8
+    rays = []
+    for stepx, stepy in DIRECTIONS[letter]:
+        ray = []
+        for step in range(1, REACH[letter] + 1):
+            to = _square(x + stepx * step, y + stepy * step)
+            if to is None:
+                break
+            ray.append(to)
+        rays.append(tuple(ray))
+    return tuple(rays)
+
+def _between(a, b):
+    """Bitmask of the squares strictly between a and b on a line, or 0."""
+    stepx = (b % 8 > a % 8) - (b % 8 < a % 8)
+    stepy = (b // 8 > a // 8) - (b // 8 < a // 8)
+    if a == b or (b % 8 - a % 8) * stepy != (b // 8 - a // 8) * stepx:
+        return 0
+    mask = 0
+    square = a + stepy * 8 + stepx
+    while square != b:
+        mask |= 1 << square
+        square += stepy * 8 + stepx
+    return mask
+
+# letter -> the _rays() of each square.
+RAYS = {letter: [_rays(letter, square) for square in range(64)] for letter in DIRECTIONS}
+# The squares a pawn of each side (white False, black True) takes on.
+PAWN_TAKES = {
+    black: [
+        tuple(to for to in (
+            _square(square % 8 - 1, square // 8 + (1 if black else -1)),
+            _square(square % 8 + 1, square // 8 + (1 if black else -1)),
+        ) if to is not None)
+        for square in range(64)
+    ]
+    for black in (False, True)
+}
+# (letter, black) -> bitmask of the squares attacked from each square,
+# ignoring anything in the way.
+ATTACKS = {}
+for _letter in DIRECTIONS:
+    for _black in (False, True):
+        ATTACKS[_letter, _black] = [
+            sum(1 << to for ray in RAYS[_letter][square] for to in ray)
+            for square in range(64)
+        ]
+for _black in (False, True):
+    ATTACKS['p', _black] = [
+        sum(1 << to for to in PAWN_TAKES[_black][square]) for square in range(64)
+    ]
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
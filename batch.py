@@ -0,0 +1,166 @@
+"""
+Many positions at once with NumPy, for making datasets and scoring lots of
+positions, where doing them one Squares at a time is too slow.
+
+encode() turns positions into an (N, 12, 64) array of bools, a plane for
+each piece and side (white pawn, knight, bishop, rook, queen, king, then
+black's) with a square set where there's one of those pieces, squares being
+numbered like the board array (a8 first, h1 last). The rest work on that:
+    counts()     (N, 12) the number of each piece
+    evaluate()   (N,) the material and piece-square score, as evaluation.py
+    attacks()    (N, 2, 64) how many of white's and black's pieces attack
+                 each square, as Piece.attacks() would find
+
+They work through the positions CHUNK at a time so the arrays made along the
+way stay small. NumPy is only needed to use this module.
+
+Usage:
+    python chess.py batch <fen file> <output .npz>
+"""
+
+import argparse
+import time
+
+import attacks
+import chess
+import evaluation
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The piece code of each plane.
+PLANE_CODES = tuple(
+    (piece + 1) | (chess.BLACK_PIECE if black else 0)
+    for black in (False, True) for piece in range(len(chess.PIECE_LETTERS)))
+PLANES = len(PLANE_CODES)
+# Positions worked on at a time.
+CHUNK = 4096
+
+_NP = {}
+
+def _numpy():
+    if numpy is None:
+        raise ImportError('batch.py needs NumPy')
+    return numpy
+
+def _tables():
+    """The lookup arrays, made the first time they're needed."""
+    if _NP:
+        return _NP
+    np = _numpy()
+    letters = [(black, letter) for black in (False, True) for letter in chess.PIECE_LETTERS]
+    # Columns: midgame score, endgame score, phase.
+    scores = np.zeros((PLANES, 64, 3), dtype=np.float32)
+    for plane, (black, letter) in enumerate(letters):
+        scores[plane, :, 0] = evaluation.MIDGAME[black, letter]
+        scores[plane, :, 1] = evaluation.ENDGAME[black, letter]
+        scores[plane, :, 2] = evaluation.PHASE[letter]
+    _NP['scores'] = scores.reshape(PLANES * 64, 3)
+
+    # masks[plane, square]: the squares a piece attacks from square with
+    # nothing in the way.
+    _NP['masks'] = np.array([
+        [[mask >> to & 1 for to in range(64)] for mask in attacks.ATTACKS[letter, black]]
+        for black, letter in letters], dtype=bool)
+    # between[a, b]: bitboard of the squares strictly between a and b.
+    _NP['between'] = np.array(attacks.BETWEEN, dtype=np.uint64)
+    return _NP
+
+def encode(positions):
+    """
+    The (N, 12, 64) bool planes of positions, each a Squares or a FEN
+    string.
+    """
+    np = _numpy()
+    codes = b''.join(
+        (position if isinstance(position, chess.Squares)
+         else chess.Squares.fromfen(position)).codes
+        for position in positions)
+    codes = np.frombuffer(codes, dtype=np.uint8).reshape(-1, 1, 64)
+    return codes == np.array(PLANE_CODES, dtype=np.uint8).reshape(1, PLANES, 1)
+
+def blackturns(positions):
+    """(N,) bool, whether it's blacks turn in each of positions (Squares)."""
+    return _numpy().array([position.blackturn for position in positions], dtype=bool)
+
+def counts(planes):
+    """(N, 12) the number of each piece, in the order of the planes."""
+    return planes.sum(axis=2, dtype=_numpy().int16)
+
+def evaluate(planes, blackturn=None):
+    """
+    (N,) the scores of evaluation.evaluate() in centipawns, from whites
+    point of view or, given the blackturn bools, the side to move's.
+    """
+    np = _numpy()
+    scores = _tables()['scores']
+    result = np.empty(len(planes), dtype=np.int32)
+    for start in range(0, len(planes), CHUNK):
+        chunk = planes[start:start + CHUNK]
+        # Every number is a whole one well within float32's precision.
+        totals = (chunk.reshape(len(chunk), -1).astype(np.float32) @ scores).astype(np.int64)
+        midgame, endgame, phase = totals.T
+        phase = np.minimum(phase, evaluation.PHASE_TOTAL)
+        result[start:start + CHUNK] = (
+            midgame * phase + endgame * (evaluation.PHASE_TOTAL - phase)
+        ) // evaluation.PHASE_TOTAL
+    if blackturn is not None:
+        result[blackturn] *= -1
+    return result
+
+def attacks(planes):
+    """
+    (N, 2, 64) the number of white's and black's pieces attacking each
+    square, counting pieces of their own side that they defend.
+    """
+    np = _numpy()
+    tables = _tables()
+    result = np.empty((len(planes), 2, 64), dtype=np.uint8)
+    for start in range(0, len(planes), CHUNK):
+        chunk = planes[start:start + CHUNK]
+        count = len(chunk)
+        # Each position's occupied squares as a bitboard, bit n for square n.
+        occupied = np.packbits(chunk.any(axis=1), axis=1, bitorder='little').view('<u8')
+        # A row for every piece in the chunk, of the squares it attacks.
+        numbers, planenumbers, squares = np.nonzero(chunk)
+        blocked = tables['between'][squares] & occupied[numbers] != 0
+        hits = tables['masks'][planenumbers, squares] & ~blocked
+        rows, targets = np.nonzero(hits)
+        sides = planenumbers[rows] >= 6
+        found = np.bincount(
+            (numbers[rows] * 2 + sides) * 64 + targets, minlength=count * 128)
+        result[start:start + count] = found.reshape(count, 2, 64)
+    return result
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py batch',
+        description='Encode and score the positions of a file of FENs, one a line.')
+    parser.add_argument('fens')
+    parser.add_argument('output', help='.npz file with planes, blackturn, score and attacks')
+    args = parser.parse_args(argv)
+    if numpy is None:
+        parser.error('this needs NumPy')
+    start = time.perf_counter()
+    boards = []
+    try:
+        with open(args.fens) as file:
+            for line in file:
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                # EPD lines have no move counters.
+                if len(fields) < 6 or not (fields[4].isdigit() and fields[5].isdigit()):
+                    fields = fields[:4] + ['0', '1']
+                boards.append(chess.Squares.fromfen(' '.join(fields[:6])))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    planes = encode(boards)
+    blackturn = blackturns(boards)
+    numpy.savez_compressed(
+        args.output, planes=planes, blackturn=blackturn,
+        score=evaluate(planes, blackturn), attacks=attacks(planes))
+    print('Wrote {} positions in {:.1f}s.'.format(len(boards), time.perf_counter() - start))
+    return 0
@@ -0,0 +1,44 @@
+"""
+What the benchmarks share. Importing it puts the repository on sys.path, so
+import it before the modules being measured.
+
+The benchmarks all take their arguments the same way: the positional ones
+say what to measure or how much of it (games, positions, tables, table
+sizes, worker counts), everything else is an option, and the ones that
+measure calls per second run each measurement for --seconds.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def parser(doc, seconds=None):
+    """
+    An ArgumentParser described by the first paragraph of a benchmark's
+    docstring, with --seconds if it's given a default for it.
+    """
+    parser = argparse.ArgumentParser(description=doc.strip().split('\n\n')[0])
+    if seconds is not None:
+        parser.add_argument(
+            '--seconds', type=float, default=seconds,
+            help='how long to time each measurement for (default {})'.format(seconds))
+    return parser
+
+def rate(function, seconds):
+    """Call function() over and over for about seconds, returning calls/s."""
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        function()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+def timed(function, *args):
+    """Call function(*args) once, returning its result and the seconds taken."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
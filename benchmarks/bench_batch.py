@@ -0,0 +1,94 @@
+"""
+Compares positions per second of the NumPy batch functions in batch.py
+against looping over each board's Piece objects, for positions from random
+games. Checks the two agree first.
+
+Usage (from the repository root):
+    python benchmarks/bench_batch.py [positions]
+"""
+
+import random
+import sys
+
+import bench
+
+import batch
+import chess
+import evaluation
+
+def randomboards(count, seed=1):
+    """count positions from games of random moves."""
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        game = chess.Game()
+        while game.outcome is None and len(game.moves) < 120 and len(boards) < count:
+            game.play(*rng.choice(game.legalmoves()))
+            boards.append(chess.Squares.fromfen(game.fen()))
+    return boards
+
+def loopencode(board):
+    planes = [[0] * 64 for _ in range(batch.PLANES)]
+    for black in (False, True):
+        for index, piece in board.pieces[black].items():
+            planes[black * 6 + chess.PIECE_LETTERS.index(piece.letter)][index] = 1
+    return planes
+
+def loopcounts(board):
+    counts = [0] * batch.PLANES
+    for black in (False, True):
+        for piece in board.pieces[black].values():
+            counts[black * 6 + chess.PIECE_LETTERS.index(piece.letter)] += 1
+    return counts
+
+def loopattacks(board):
+    attacks = [[0] * 64, [0] * 64]
+    for black in (False, True):
+        for index, piece in board.pieces[black].items():
+            for x, y in piece.attacks(board, index):
+                attacks[black][y * 8 + x] += 1
+    return attacks
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('positions', type=int, nargs='?', default=20000)
+    count = parser.parse_args(argv).positions
+    if batch.numpy is None:
+        print('batch.py needs NumPy')
+        return 1
+    boards = randomboards(count)
+    planes = batch.encode(boards)
+    blackturn = batch.blackturns(boards)
+    sample = range(0, count, max(count // 500, 1))
+    scores = batch.evaluate(planes, blackturn)
+    counts = batch.counts(planes)
+    attacks = batch.attacks(planes)
+    for number in sample:
+        board = boards[number]
+        if (planes[number].tolist() != [[bool(x) for x in row] for row in loopencode(board)]
+                or counts[number].tolist() != loopcounts(board)
+                or scores[number] != evaluation.fullevaluate(board)
+                or attacks[number].tolist() != loopattacks(board)):
+            print('Batch and loop disagree on ' + board.fen())
+            return 1
+
+    rows = (
+        ('encode', lambda: [loopencode(board) for board in boards],
+         lambda: batch.encode(boards)),
+        ('counts', lambda: [loopcounts(board) for board in boards],
+         lambda: batch.counts(planes)),
+        ('evaluate', lambda: [evaluation.fullevaluate(board) for board in boards],
+         lambda: batch.evaluate(planes, blackturn)),
+        ('attacks', lambda: [loopattacks(board) for board in boards],
+         lambda: batch.attacks(planes)),
+    )
+    print('{} positions, positions/s:'.format(count))
+    print('{:10} {:>12} {:>12} {:>9}'.format('', 'loop', 'batch', 'speedup'))
+    for name, loop, vectorised in rows:
+        slow = count / bench.timed(loop)[1]
+        fast = count / bench.timed(vectorised)[1]
+        print('{:10} {:12.0f} {:12.0f} {:8.1f}x'.format(name, slow, fast, fast / slow))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
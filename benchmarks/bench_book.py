@@ -0,0 +1,67 @@
+"""
+Builds an opening book from random games with book.py and measures lookups
+of positions in it and of positions that aren't.
+
+Usage (from the repository root):
+    python benchmarks/bench_book.py [games] [--plies N] [--seconds S]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import bench
+
+import book
+import chess
+import pgn
+
+def randomgames(path, count, plies, rng):
+    """Write count random openings of plies moves, returning their positions."""
+    positions = []
+    with open(path, 'w') as file:
+        for number in range(count):
+            game = chess.Game()
+            words = []
+            while game.outcome is None and len(game.moves) < plies:
+                positions.append(game.board.zobrist())
+                move = rng.choice(game.legalmoves())
+                words.append(pgn.sanname(game, *move))
+                game.play(*move)
+            result = rng.choice(pgn.RESULTS[:3])
+            file.write('[Result "{}"]\n\n{} {}\n\n'.format(result, ' '.join(words), result))
+    return positions
+
+def lookups(opened, keys, seconds):
+    """Lookups/s of keys and book moves found per lookup."""
+    found = sum(len(opened.moves(key)) for key in keys) / len(keys)
+    return bench.rate(lambda: [opened.moves(key) for key in keys], seconds) * len(keys), found
+
+def main(argv):
+    parser = bench.parser(__doc__, seconds=1.0)
+    parser.add_argument('games', type=int, nargs='?', default=2000)
+    parser.add_argument('--plies', type=int, default=12)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        games = os.path.join(directory, 'games.pgn')
+        path = os.path.join(directory, 'games.book')
+        positions = randomgames(games, args.games, args.plies, rng)
+        (_, entries), elapsed = bench.timed(book.buildbook, path, [games], args.plies)
+        print('built {} entries in {:.2f}s, {:.0f} games/s, {:.1f} MB'.format(
+            entries, elapsed, args.games / elapsed, os.path.getsize(path) / 1e6))
+
+        with book.OpeningBook(path) as opened:
+            for name, keys in (
+                ('in book', rng.sample(positions, min(1000, len(positions)))),
+                ('not in book', [rng.getrandbits(64) for _ in range(1000)]),
+            ):
+                rate, found = lookups(opened, keys, args.seconds)
+                print('{:12}: {:8.0f} lookups/s, {:5.1f} us each, {:.1f} moves found'.format(
+                    name, rate, 1e6 / rate, found))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark of Piece.validmove and Game.status, the check, checkmate
+and stalemate test run after every move, on a few midgame positions. Each
+is timed against the way it was done before the board kept an index of the
+pieces (the scan functions below), which found every piece and the king by
+scanning the whole board and tried every move out to see if it left the
+king in check.
+
+Usage (from the repository root):
+    python benchmarks/bench_checks.py [--seconds S]
+"""
+
+import sys
+
+import bench
+
+import chess
+
+# Openings played out from the start position to reach midgames.
+GAMES = [
+    'e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 d2d4 e5d4 c3d4 c5b4 b1c3 f6e4',
+    'd2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 e8g8 g1f3 b8d7 a1c1 c7c6',
+    'e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6 c1e3 e7e5 d4b3 c8e6',
+]
+
+def positions():
+    boards = []
+    for game in GAMES:
+        board = chess.Board()
+        for move in game.split():
+            board.game.move(move)
+        boards.append(board)
+    return boards
+
+def scanpieces(board, black):
+    """(square, piece) of every piece of a side, found by scanning the board."""
+    return [
+        (square, piece) for square, piece in enumerate(board)
+        if piece is not None and piece.black is black]
+
+def scankingchecked(board, black):
+    """The old Piece.kingchecked: all the enemy's moves, is the king in them?"""
+    king = next(square for square, piece in scanpieces(board, black) if piece.name == 'king')
+    kingcoords = board[king].indextocoords(king)
+    return kingcoords in [
+        move for square, piece in scanpieces(board, not black)
+        for move in piece.moves(board, square, allowspecial=False)]
+
+def scanwillcheck(board, curr, to):
+    """The old Piece.movewillcheckownking: try the move out and look."""
+    piece, taken = board[curr], board[to]
+    board[curr] = None
+    board[to] = piece
+    checked = scankingchecked(board, piece.black)
+    board[curr] = piece
+    board[to] = taken
+    return checked
+
+def scanvalidmove(board, curr, to):
+    """The old Piece.validmove."""
+    piece = board[curr]
+    if curr == to or scanwillcheck(board, curr, to):
+        return False
+    return piece.indextocoords(to) in piece.moves(board, curr)
+
+def scanstatus(board):
+    """
+    The old check and checkmate test made after every move, returning
+    (check, no moves) for the side to move of a Board.
+    """
+    squares = board.board
+    black = squares.blackturn
+    for square, piece in scanpieces(squares, black):
+        for move in piece.moves(squares, square):
+            if not scanwillcheck(squares, square, piece.coordstoindex(move)):
+                return scankingchecked(squares, black), False
+    return scankingchecked(squares, black), True
+
+def validmoves(board, validmove=None):
+    """
+    Ask validmove about every from/to pair of the side to move, apart from
+    moves onto its own pieces.
+    """
+    squares = board.board
+    for curr, piece in enumerate(squares):
+        if piece is None or piece.black != board.blackturn:
+            continue
+        for to, target in enumerate(squares):
+            if target is None or target.black != piece.black:
+                if validmove is None:
+                    piece.validmove(squares, curr, to)
+                else:
+                    validmove(squares, curr, to)
+
+def scanvalidmoves(board):
+    validmoves(board, scanvalidmove)
+
+def status(board):
+    """Run the check/checkmate test the last move would run."""
+    board.game.status()
+
+def callspersecond(function, boards, seconds):
+    return bench.rate(lambda: [function(board) for board in boards], seconds) * len(boards)
+
+def main(argv):
+    seconds = bench.parser(__doc__, seconds=2.0).parse_args(argv).seconds
+    boards = positions()
+    print('{:20} {:>12} {:>12} {:>8}'.format('positions/s', 'scan', 'now', 'speedup'))
+    for name, before, after in (
+        ('all validmove pairs', scanvalidmoves, validmoves),
+        ('status', scanstatus, status),
+    ):
+        scan = callspersecond(before, boards, seconds)
+        now = callspersecond(after, boards, seconds)
+        print('{:20} {:12.2f} {:12.2f} {:7.1f}x'.format(name, scan, now, now / scan))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
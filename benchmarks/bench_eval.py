@@ -0,0 +1,36 @@
+"""
+Compares evaluations per second of the incrementally kept scores against
+adding up every piece, over positions from the perft reference set.
+
+Usage (from the repository root):
+    python benchmarks/bench_eval.py [--seconds S]
+"""
+
+import sys
+
+import bench
+
+import chess
+import evaluation
+import perft
+
+def evaluationspersecond(evaluate, boards, seconds):
+    return bench.rate(lambda: [evaluate(board) for board in boards], seconds) * len(boards)
+
+def main(argv):
+    seconds = bench.parser(__doc__, seconds=2.0).parse_args(argv).seconds
+    boards = [chess.Squares.fromfen(fen) for _, fen, _ in perft.POSITIONS]
+    for board in boards:
+        if evaluation.evaluate(board) != evaluation.fullevaluate(board):
+            print('Kept score is wrong for ' + board.fen())
+            return 1
+
+    full = evaluationspersecond(evaluation.fullevaluate, boards, seconds)
+    kept = evaluationspersecond(evaluation.evaluate, boards, seconds)
+    print('full scan  : {:12.0f} evaluations/s'.format(full))
+    print('incremental: {:12.0f} evaluations/s'.format(kept))
+    print('speedup    : {:12.1f}x'.format(kept / full))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
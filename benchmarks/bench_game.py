@@ -0,0 +1,51 @@
+"""
+Plays random games through the headless Game API, by move name as another
+program would, and reports games and moves per second.
+
+Usage (from the repository root):
+    python benchmarks/bench_game.py [games] [--seed N] [--backend list|bitboard]
+"""
+
+import collections
+import random
+import sys
+
+import bench
+
+import chess
+
+def randomgame(rng, backend):
+    """Play random legal moves until the game ends, returning the Game."""
+    game = chess.Game(backend=backend)
+    while game.outcome is None:
+        move = rng.choice(game.legalmoves())
+        result = game.move(chess.movename(*move))
+        if not result.legal:
+            raise AssertionError('{} rejected: {}'.format(result.move, result.reason))
+    return game
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('games', type=int, nargs='?', default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend', choices=('list', 'bitboard'), default='list')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    outcomes = collections.Counter()
+    games, elapsed = bench.timed(
+        lambda: [randomgame(rng, args.backend) for _ in range(args.games)])
+    moves = 0
+    for game in games:
+        outcomes[game.outcome] += 1
+        moves += len(game.board.undos)
+
+    print('{} games, {} moves in {:.2f}s'.format(args.games, moves, elapsed))
+    print('{:.2f} games/s, {:.0f} moves/s'.format(
+        args.games / elapsed, moves / elapsed))
+    for outcome, count in outcomes.most_common():
+        print('  {}: {}'.format(outcome, count))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
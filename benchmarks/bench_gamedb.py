@@ -0,0 +1,79 @@
+"""
+Builds a game archive, indexes it with gamedb.py and measures lookups.
+
+Random games take a long time to play, so the archive is a pool of random
+openings saved over and over, which is enough to give the index millions of
+entries and each position many games.
+
+Usage (from the repository root):
+    python benchmarks/bench_gamedb.py [games] [--openings N] [--plies N] [--dir DIR]
+        [--seconds S]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import bench
+
+import chess
+import gamedb
+import gamefile
+
+def openings(count, plies, rng):
+    """Random games of plies moves, and some positions reached in them."""
+    games = []
+    positions = []
+    for _ in range(count):
+        game = chess.Game()
+        while game.outcome is None and len(game.moves) < plies:
+            game.play(*rng.choice(game.legalmoves()))
+            if len(game.moves) == plies // 2:
+                positions.append(game.board.zobrist())
+        games.append(game)
+    return games, positions
+
+def timed(name, function, *args):
+    result, elapsed = bench.timed(function, *args)
+    print('{:14}: {:8.2f}s'.format(name, elapsed))
+    return result, elapsed
+
+def writearchive(path, games, count):
+    records = [gamefile.pack(game) for game in games]
+    with open(path, 'wb') as file:
+        for number in range(count):
+            file.write(records[number % len(records)])
+
+def lookups(path, positions, seconds):
+    """Lookups/s of the games reaching each position, and games found."""
+    with gamedb.GameDatabase(path) as database:
+        found = sum(len(database.gamesreaching(key)) for key in positions) / len(positions)
+        rate = bench.rate(lambda: [database.gamesreaching(key) for key in positions], seconds)
+        return rate * len(positions), found
+
+def main(argv):
+    parser = bench.parser(__doc__, seconds=2.0)
+    parser.add_argument('games', type=int, nargs='?', default=1000000)
+    parser.add_argument('--openings', type=int, default=2000)
+    parser.add_argument('--plies', type=int, default=16)
+    parser.add_argument('--dir', help='where to put the archive (default: a temporary directory)')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    (games, positions), _ = timed('openings', openings, args.openings, args.plies, rng)
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        path = os.path.join(directory, 'archive.bin')
+        timed('write archive', writearchive, path, games, args.games)
+        (indexed, entries), elapsed = timed('index', gamedb.buildindex, path)
+        print('{} games, {} entries, {:.0f} games/s indexed'.format(
+            indexed, entries, indexed / elapsed))
+        print('archive {:.1f} MB, index {:.1f} MB'.format(
+            os.path.getsize(path) / 1e6,
+            os.path.getsize(gamedb.indexpath(path)) / 1e6))
+        rate, found = lookups(path, positions, args.seconds)
+        print('{:.0f} lookups/s, {:.0f} games found per lookup'.format(rate, found))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
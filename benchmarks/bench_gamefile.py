@@ -0,0 +1,72 @@
+"""
+Measures saving and loading games with gamefile.py: games/s appended to a
+file, read back as records without replaying them, and loaded as Games.
+
+Usage (from the repository root):
+    python benchmarks/bench_gamefile.py [games] [--seed N]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import bench
+
+import chess
+import gamefile
+
+# Random games are slow to play, so a few are saved over and over.
+SAMPLES = 20
+
+def randomgame(rng, plies=200):
+    game = chess.Game()
+    while game.outcome is None and len(game.moves) < plies:
+        game.play(*rng.choice(game.legalmoves()))
+    return game
+
+def rate(name, count, elapsed):
+    print('{:8}: {:10.0f} games/s'.format(name, count / elapsed))
+
+def load(path, games):
+    """Load the games saved at path, returning how many match games."""
+    loaded = 0
+    for game, saved in zip(gamefile.load(path), games):
+        if game.moves != saved.moves:
+            break
+        loaded += 1
+    return loaded
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('games', type=int, nargs='?', default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    count = args.games
+    rng = random.Random(args.seed)
+    samples = [randomgame(rng) for _ in range(SAMPLES)]
+    games = [samples[i % SAMPLES] for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.bin')
+        rate('save', count, bench.timed(gamefile.save, path, *games)[1])
+        size = os.path.getsize(path)
+
+        with open(path, 'rb') as file:
+            data = gamefile.mapfile(file)
+            scanned, elapsed = bench.timed(lambda: sum(1 for _ in gamefile.records(data)))
+            rate('scan', scanned, elapsed)
+            data.close()
+
+        loaded, elapsed = bench.timed(load, path, games)
+        if loaded < count:
+            print('Game {} loaded wrong!'.format(loaded))
+            return 1
+        rate('load', loaded, elapsed)
+
+    print('{:.0f} bytes/game, {:.1f} moves/game'.format(
+        size / count, sum(len(game.moves) for game in games) / count))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""
+Searches a few positions to a fixed depth with transposition tables of
+different sizes, reporting the table statistics, to help size it.
+
+Usage (from the repository root):
+    python benchmarks/bench_hash.py [megabytes ...] [--depth N]
+"""
+
+import sys
+
+import bench
+
+import chess
+import engine
+from transposition import TranspositionTable
+
+POSITIONS = (
+    'r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+)
+
+def search(table, depth):
+    """Search every position to depth with table, returning the nodes searched."""
+    nodes = 0
+    for fen in POSITIONS:
+        board = chess.Board()
+        board.setfen(fen)
+        nodes += engine.bestmove(board.board, depth=depth, table=table).nodes
+    return nodes
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('megabytes', type=int, nargs='*', default=[0, 1, 16, 64])
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args(argv)
+    print('{:>5} {:>9} {:>8} {:>7} {:>7} {:>10} {:>10}'.format(
+        'MB', 'nodes', 'seconds', 'hits', 'full', 'collisions', 'overwrites'))
+    for size in args.megabytes:
+        table = TranspositionTable(size)
+        nodes, elapsed = bench.timed(search, table, args.depth)
+        stats = table.stats()
+        print('{:5.0f} {:9} {:8.2f} {:6.1f}% {:6.2f}% {:10} {:10}'.format(
+            stats['megabytes'], nodes, elapsed, stats['hitrate'] * 100,
+            stats['fillrate'] * 100, stats['collisions'], stats['overwrites']))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""
+Reports the memory used to hold positions, both as whole boards (Squares)
+and packed with Squares.pack(), per position and per 10,000 of them.
+
+Usage (from the repository root):
+    python benchmarks/bench_memory.py [positions]
+"""
+
+import sys
+import tracemalloc
+
+import bench
+
+import chess
+import perft
+
+def allocated(make, count):
+    """Bytes still allocated after making count things with make(i)."""
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        kept = [make(i) for i in range(count)]
+        used = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del kept
+    return used
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('positions', type=int, nargs='?', default=10000)
+    count = parser.parse_args(argv).positions
+    fens = [fen for _, fen, _ in perft.POSITIONS]
+    boards = [chess.Squares.fromfen(fen) for fen in fens]
+
+    def board(i):
+        board = chess.Squares.fromfen(fens[i % len(fens)])
+        # Only the position, not the game it came from.
+        board.history = []
+        return board
+
+    def packed(i):
+        return boards[i % len(boards)].pack()
+
+    for name, make in (('board', board), ('packed', packed)):
+        used = allocated(make, count)
+        print('{:7}: {:8.0f} bytes/position {:8.2f} MB per 10k'.format(
+            name, used / count, used / count * 10000 / 1e6))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
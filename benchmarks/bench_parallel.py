@@ -0,0 +1,88 @@
+"""
+Measures how the parallel search scales with the number of worker
+processes, by timing a fixed depth search of some fixed positions with each
+pool size and reporting the speedup over one worker. First checks the
+parallel search finds the same score as the serial one at that depth.
+
+Usage (from the repository root):
+    python benchmarks/bench_parallel.py [workers ...] [--depth N]
+"""
+
+import os
+import sys
+
+import bench
+
+import chess
+import engine
+import perft
+
+WORKERS = (1, 2, 4, 8, 16)
+
+POSITIONS = (
+    perft.START,
+    perft.POSITIONS[1][1],
+    perft.POSITIONS[5][1],
+    'r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 8',
+    # A move that fails high with a null window must still be searched
+    # again after another raises alpha, b1c3 being the best here.
+    'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+)
+
+def check(depth, workers):
+    """
+    The positions where the parallel and serial searches disagree on the
+    score at depth, each searched by a new pool so the workers' tables
+    hold nothing from the other positions.
+    """
+    wrong = []
+    for fen in POSITIONS:
+        serial = engine.bestmove(chess.Squares.fromfen(fen), depth=depth)
+        parallel = engine.ParallelSearch(workers)
+        try:
+            found = parallel.search(chess.Squares.fromfen(fen), depth=depth)
+        finally:
+            parallel.close()
+        if found.score != serial.score:
+            wrong.append((fen, serial, found))
+    return wrong
+
+def timesearch(workers, depth):
+    """Search every position to depth, returning (seconds, nodes)."""
+    parallel = engine.ParallelSearch(workers)
+    try:
+        # Get the processes started before the clock does.
+        parallel.search(chess.Squares.fromfen(perft.START), depth=1)
+        nodes, elapsed = bench.timed(lambda: sum(
+            parallel.search(chess.Squares.fromfen(fen), depth=depth).nodes
+            for fen in POSITIONS))
+        return elapsed, nodes
+    finally:
+        parallel.close()
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('workers', type=int, nargs='*', default=list(WORKERS))
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args(argv)
+    depth, workers = args.depth, args.workers
+    print('{} CPUs, depth {}, {} positions'.format(
+        os.cpu_count(), depth, len(POSITIONS)))
+    wrong = check(depth, max(workers[0], 2))
+    for fen, serial, parallel in wrong:
+        print('Parallel search scores {} ({}) but serial {} ({}) for {}'.format(
+            parallel.score, chess.movename(*parallel.best),
+            serial.score, chess.movename(*serial.best), fen))
+    if wrong:
+        return 1
+    base = None
+    for count in workers:
+        elapsed, nodes = timesearch(count, depth)
+        if base is None:
+            base = elapsed
+        print('{:2} workers: {:6.2f}s {:8} nodes {:7.0f} nodes/s  speedup {:.2f}x'.format(
+            count, elapsed, nodes, nodes / elapsed, base / elapsed))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
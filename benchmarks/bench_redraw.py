@@ -0,0 +1,47 @@
+"""
+Measures the bytes written per move by the full frame renderer and by the
+diff renderer over a short scripted game.
+
+Usage (from the repository root):
+    python benchmarks/bench_redraw.py
+"""
+
+import sys
+
+import bench
+
+import chess
+
+# Includes a capture and castling, which repaint more than two squares.
+MOVES = [
+    'e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6', 'e1g1', 'f6e4',
+    'f1e1', 'd7d5', 'c4d5', 'd8d5', 'b1c3', 'e4c3', 'd2c3', 'c8g4',
+]
+
+def main(argv):
+    bench.parser(__doc__).parse_args(argv)
+    full = chess.Renderer(chess.art)
+    diff = chess.DiffRenderer(chess.art)
+    board = chess.Board()
+    full.draw(board.board)
+    diff.draw(board.board)
+    print('first frame: {} bytes full, {} bytes diff'.format(
+        full.lastbytes, diff.lastbytes))
+
+    print('{:6} {:>10} {:>10}'.format('move', 'full', 'diff'))
+    fulltotal = difftotal = 0
+    for move in MOVES:
+        board.game.move(move)
+        full.draw(board.board)
+        diff.draw(board.board)
+        fulltotal += full.lastbytes
+        difftotal += diff.lastbytes
+        print('{:6} {:10} {:10}'.format(move, full.lastbytes, diff.lastbytes))
+
+    print('{:6} {:10.0f} {:10.0f}  ({:.1f}x less output)'.format(
+        'mean', fulltotal / len(MOVES), difftotal / len(MOVES),
+        fulltotal / difftotal))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
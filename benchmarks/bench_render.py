@@ -0,0 +1,50 @@
+"""
+Compares frames per second of the old character by character renderer
+against the frame buffered one.
+
+Usage (from the repository root):
+    python benchmarks/bench_render.py [--seconds S]
+"""
+
+import contextlib
+import io
+import os
+import sys
+
+import bench
+
+import chess
+
+def capture(render):
+    """Get everything that render() writes to stdout."""
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        render()
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+def framespersecond(render, seconds):
+    """Call render() with stdout going to /dev/null for about seconds."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return bench.rate(render, seconds)
+
+def main(argv):
+    seconds = bench.parser(__doc__, seconds=2.0).parse_args(argv).seconds
+    chess.PRINT_DELAY = 0
+    board = chess.Board()
+
+    if capture(board.displayboardslow) != capture(board.displayboard):
+        print('Renderers produce different frames!')
+        return 1
+
+    slow = framespersecond(board.displayboardslow, seconds)
+    fast = framespersecond(board.displayboard, seconds)
+    print('per character : {:10.1f} frames/s'.format(slow))
+    print('frame buffered: {:10.1f} frames/s'.format(fast))
+    print('speedup       : {:10.1f}x'.format(fast / slow))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
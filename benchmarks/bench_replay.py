@@ -0,0 +1,62 @@
+"""
+Writes a PGN file of random games and measures how fast replay.py checks it,
+in games/s for each number of worker processes.
+
+Usage (from the repository root):
+    python benchmarks/bench_replay.py [games] [--workers 1 2 4] [--chunk N]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import bench
+
+import chess
+import pgn
+import replay
+
+# Random games are slow to play, so a few are written over and over.
+SAMPLES = 20
+
+def randomgame(rng, plies=150):
+    """The movetext of a random game, in SAN."""
+    game = chess.Game()
+    words = []
+    while game.outcome is None and len(game.moves) < plies:
+        move = rng.choice(game.legalmoves())
+        if not game.board.blackturn:
+            words.append('{}.'.format(game.board.fullmove))
+        words.append(pgn.sanname(game, *move))
+        game.play(*move)
+    words.append(game.result())
+    return ' '.join(words)
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('games', type=int, nargs='?', default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--chunk', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    samples = [randomgame(rng) for _ in range(SAMPLES)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.pgn')
+        with open(path, 'w') as file:
+            for number in range(args.games):
+                file.write('[Event "bench {}"]\n\n{}\n\n'.format(
+                    number, samples[number % SAMPLES]))
+
+        for workers in sorted(set(args.workers)):
+            valid, elapsed = bench.timed(lambda: sum(
+                ok for ok, _ in replay.replay([path], workers, args.chunk)))
+            print('{:3} workers: {:8.1f} games/s'.format(workers, args.games / elapsed))
+            if valid != args.games:
+                print('{} games failed to replay!'.format(args.games - valid))
+                return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,165 @@
+"""
+Load generator for server.py: plays many games at once over the network,
+reporting moves/s and the latency of moves (from sending one to hearing it
+was played).
+
+The games replay a few random games chosen beforehand, so the clients do
+no move generation of their own and the server's work is what's measured.
+Unless --port is given it starts a server of its own.
+
+Usage (from the repository root):
+    python benchmarks/bench_server.py [games ...] [--plies N] [--shards N]
+        [--spectators N] [--host HOST --port PORT]
+"""
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import bench
+
+import chess
+import server
+
+SAMPLES = 20
+
+def randomgames(count, plies, rng):
+    """Move names of random games that are still going after plies moves."""
+    games = []
+    while len(games) < count:
+        game = chess.Game()
+        while game.outcome is None and len(game.moves) < plies:
+            game.play(*rng.choice(game.legalmoves()))
+        if game.outcome is None:
+            games.append([chess.movename(*chess.decodemove(code)) for code in game.moves])
+    return games
+
+async def expect(reader, word):
+    """Read lines until one starting with word."""
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError('server hung up')
+        if line.startswith(word):
+            return line
+
+class Load:
+    def __init__(self, host, port, games, spectators):
+        self.host = host
+        self.port = port
+        self.games = games
+        self.spectators = spectators
+        self.latencies = []
+        self.started = 0
+        # Made by run(), in the event loop they're used in.
+        self.ready = self.go = self.connecting = None
+
+    async def connect(self):
+        async with self.connecting:
+            return await asyncio.open_connection(self.host, self.port)
+
+    async def play(self, number, moves):
+        name = 'bench{}'.format(number)
+        players = [await self.connect(), await self.connect()]
+        watchers = [await self.connect() for _ in range(self.spectators)]
+        for _, writer in players:
+            writer.write('play {}\n'.format(name).encode())
+        # The two joins can reach the server in either order, so which
+        # connection plays white is only known from the replies.
+        colours = [(await expect(reader, b'joined')).split()[2] for reader, _ in players]
+        if colours[0] == b'black':
+            players.reverse()
+        for reader, _ in players:
+            await expect(reader, b'start')
+        for reader, writer in watchers:
+            writer.write('watch {}\n'.format(name).encode())
+            await expect(reader, b'start')
+        self.started += 1
+        if self.started == self.games:
+            self.ready.set()
+        await self.go.wait()
+
+        for ply, move in enumerate(moves):
+            (reader, writer), (other, _) = players[ply % 2], players[1 - ply % 2]
+            start = time.perf_counter()
+            writer.write('move {}\n'.format(move).encode())
+            await expect(reader, b'moved')
+            self.latencies.append(time.perf_counter() - start)
+            await expect(other, b'moved')
+        for reader, _ in watchers:
+            for _ in moves:
+                await expect(reader, b'moved')
+        for _, writer in players + watchers:
+            writer.close()
+        return len(moves)
+
+    async def run(self, samples):
+        self.ready = asyncio.Event()
+        self.go = asyncio.Event()
+        self.connecting = asyncio.Semaphore(256)
+        tasks = [
+            asyncio.ensure_future(self.play(number, samples[number % len(samples)]))
+            for number in range(self.games)
+        ]
+        start = time.perf_counter()
+        waiting = asyncio.ensure_future(self.ready.wait())
+        await asyncio.wait([waiting] + tasks, return_when=asyncio.FIRST_COMPLETED)
+        if not self.ready.is_set():
+            for task in tasks:
+                if task.done():
+                    task.result()
+        connected = time.perf_counter() - start
+        self.go.set()
+        start = time.perf_counter()
+        moves = sum(await asyncio.gather(*tasks))
+        return connected, moves, time.perf_counter() - start
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def startserver(shards):
+    """Start a server on any free port, returning (process, port)."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(bench.ROOT, 'chess.py'), 'serve', '--port', '0',
+         '--shards', str(shards)],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    return process, int(line.rsplit(':', 1)[1])
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('games', type=int, nargs='*', default=[1000])
+    parser.add_argument('--plies', type=int, default=40)
+    parser.add_argument('--shards', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--spectators', type=int, default=0, help='per game')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='use the server already running here')
+    args = parser.parse_args(argv)
+
+    server.raiselimit()
+    samples = randomgames(SAMPLES, args.plies, random.Random(1))
+    process = None
+    port = args.port
+    if port is None:
+        process, port = startserver(args.shards)
+    try:
+        for games in args.games:
+            load = Load(args.host, port, games, args.spectators)
+            connected, moves, elapsed = asyncio.run(load.run(samples))
+            print('{:6} games: connected in {:5.1f}s, {:7.0f} moves/s, '
+                  'latency p50 {:6.1f}ms p99 {:6.1f}ms'.format(
+                      games, connected, moves / elapsed,
+                      percentile(load.latencies, 0.5) * 1000,
+                      percentile(load.latencies, 0.99) * 1000))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,50 @@
+"""
+Times loading each style in styles/ by compiling it and from the cache, and
+drawing frames with it, against the built in art.
+
+Usage (from the repository root):
+    python benchmarks/bench_styles.py [--seconds S]
+"""
+
+import sys
+import tempfile
+
+import bench
+
+import chess
+import styles
+
+def framespersecond(renderer, board, seconds):
+    return bench.rate(lambda: renderer.frame(board), seconds)
+
+def compiletime(name, times=20):
+    """Seconds to read and compile a style without the cache."""
+    def readandcompile():
+        for _ in range(times):
+            with open(styles.stylepath(name)) as file:
+                styles.Style.fromart(*styles.parse(file.read()))
+    return bench.timed(readandcompile)[1] / times
+
+def loadtime(name, cache, times=20):
+    return bench.timed(lambda: [styles.load(name, cache) for _ in range(times)])[1] / times
+
+def main(argv):
+    seconds = bench.parser(__doc__, seconds=1.0).parse_args(argv).seconds
+    board = chess.Board().board
+    print('{:10} {:>6} {:>12} {:>12} {:>12}'.format(
+        'style', 'tile', 'compile us', 'cached us', 'frames/s'))
+    print('{:10} {:>6} {:>12} {:>12} {:12.0f}'.format(
+        'built in', '{}x{}'.format(chess.WIDTH, chess.HEIGHT), '', '',
+        framespersecond(chess.Renderer(chess.art), board, seconds)))
+    with tempfile.TemporaryDirectory() as cache:
+        for name in styles.available():
+            compiled = compiletime(name)
+            style = styles.load(name, cache)
+            cached = loadtime(name, cache)
+            print('{:10} {:>6} {:12.0f} {:12.0f} {:12.0f}'.format(
+                name, '{}x{}'.format(style.width, style.height), compiled * 1e6,
+                cached * 1e6, framespersecond(chess.Renderer(style), board, seconds)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,60 @@
+"""
+Generates endgame tablebases with tablebase.py, timing each, then measures
+probes/s of random positions in them.
+
+Usage (from the repository root):
+    python benchmarks/bench_tablebase.py [tables, default KQK KRK KPK] [--workers N]
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+import bench
+
+import chess
+import tablebase
+
+def positions(name, count, rng):
+    """Random positions of a table that can happen, as Squares."""
+    table = tablebase.material(name)
+    found = []
+    while len(found) < count:
+        squares = [rng.randrange(64) for _ in table.pieces]
+        black = rng.random() < 0.5
+        if not tablebase.legal(table, squares, black):
+            continue
+        board = chess.Squares([None] * 64)
+        for (letter, side), square in zip(table.pieces, squares):
+            board[square] = chess.pieceview(chess.PIECES[letter], side)
+        board.blackturn = black
+        found.append(board)
+    return found
+
+def main(argv):
+    parser = bench.parser(__doc__)
+    parser.add_argument('tables', nargs='*', default=['KQK', 'KRK', 'KPK'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    print('NumPy' if tablebase.numpy is not None else 'No NumPy, {} workers'.format(args.workers))
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        tablebase.setdirectory(directory)
+        for name in args.tables:
+            made, elapsed = bench.timed(tablebase.generate, name, directory, args.workers)
+            size = sum(os.path.getsize(tablebase.tablepath(table, directory)) for table in made)
+            print('{:6}: {:8.1f}s, {:.1f} MB ({})'.format(
+                name, elapsed, size / 1e6, ' '.join(made)))
+
+        for name in args.tables:
+            boards = positions(name, 1000, rng)
+            longest, elapsed = bench.timed(
+                lambda: max(tablebase.probe(board)[1] or 0 for board in boards))
+            print('{:6}: {:8.0f} probes/s, longest mate found {} plies'.format(
+                name, len(boards) / elapsed, longest))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,418 @@
+"""
+Bitboard position backend.
+
+A Position holds the same game state as a Board, but as twelve integer
+bitboards (one per colour and piece type) plus the side to move, castling
+rights and en passant square. Bit n of every bitboard is Board.board[n], so
+bit 0 is a8 and bit 63 is h1, and moves are worked out with shifts and masks
+instead of walking the board a square at a time.
+
+Running this file plays random games and checks that both backends agree on
+the legal moves in every position reached:
+    python bitboard.py [games] [seed]
+"""
+
+import random
+import sys
+import time
+
+import attacks
+import chess
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+# Matches Piece.name, indexed by piece type.
+NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+WHITE, BLACK = 0, 1
+
+FULL = (1 << 64) - 1
+FILE_A = sum(1 << square for square in range(0, 64, 8))
+FILE_H = FILE_A << 7
+NOT_A = FULL ^ FILE_A
+NOT_H = FULL ^ FILE_H
+# Ranks as seen on the board, rank 8 is the top row (bits 0-7).
+RANK_8 = 0xFF
+RANK_6 = 0xFF << 16
+RANK_3 = 0xFF << 40
+RANK_1 = 0xFF << 56
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+KNIGHT_ATTACKS = attacks.ATTACKS['n', False]
+KING_ATTACKS = attacks.ATTACKS['k', False]
+# The squares a pawn of each colour attacks. White moves up the board.
+PAWN_ATTACKS = (attacks.ATTACKS['p', False], attacks.ATTACKS['p', True])
+
+def _slides(letter):
+    """
+    (rays, increasing) per direction of a slider, where increasing is True
+    when the ray goes to higher square numbers so its nearest blocker is its
+    lowest bit.
+    """
+    return tuple(
+        (
+            [sum(1 << to for to in attacks.RAYS[letter][square][direction])
+             for square in range(64)],
+            stepy * 8 + stepx > 0,
+        )
+        for direction, (stepx, stepy) in enumerate(attacks.DIRECTIONS[letter])
+    )
+
+ROOK_RAYS = _slides('r')
+BISHOP_RAYS = _slides('b')
+
+# right: (king from, king to, rook from, rook to, must be empty, must be safe),
+# the castling rights bits and the rights kept by each move being chess.py's
+# CASTLING and CASTLING_KEEP.
+CASTLES = (
+    (chess.WHITE_KINGSIDE, 60, 62, 63, 61, (1 << 61) | (1 << 62), (60, 61, 62)),
+    (chess.WHITE_QUEENSIDE, 60, 58, 56, 59,
+        (1 << 57) | (1 << 58) | (1 << 59), (60, 59, 58)),
+    (chess.BLACK_KINGSIDE, 4, 6, 7, 5, (1 << 5) | (1 << 6), (4, 5, 6)),
+    (chess.BLACK_QUEENSIDE, 4, 2, 0, 3, (1 << 1) | (1 << 2) | (1 << 3), (4, 3, 2)),
+)
+
+def lowest(bits):
+    """Index of the lowest set bit."""
+    return (bits & -bits).bit_length() - 1
+
+def squares(bits):
+    """Iterate the indexes of the set bits."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def slide(square, occupied, rays):
+    """Squares attacked along rays from square, stopping at the first piece."""
+    attacks = 0
+    for table, increasing in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            if increasing:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+class Position:
+    """
+    A game position as bitboards.
+    Moves are (from, to, promotion) tuples where promotion is a piece type or
+    None.
+    """
+
+    def __init__(self):
+        # Indexed by colour * 6 + piece type.
+        self.bitboards = [0] * 12
+        # Everything of each colour.
+        self.occupied = [0, 0]
+        # False for whites turn, true for blacks turn.
+        self.black = False
+        self.castling = 0
+        self.ep = None
+
+    @classmethod
+    def fromboard(cls, board):
+        """Build a position from a Board (its pieces and blackturn)."""
+        position = cls()
+        for index, piece in enumerate(board.board):
+            if piece is not None:
+                position.put(int(piece.black), NAMES.index(piece.name), index)
+        position.black = board.blackturn
+        position.castling = board.board.castling
+        position.ep = board.board.ep
+        return position
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.bitboards = self.bitboards[:]
+        position.occupied = self.occupied[:]
+        position.black = self.black
+        position.castling = self.castling
+        position.ep = self.ep
+        return position
+
+    def put(self, colour, piecetype, square):
+        bit = 1 << square
+        self.bitboards[colour * 6 + piecetype] |= bit
+        self.occupied[colour] |= bit
+
+    def remove(self, colour, piecetype, square):
+        bit = 1 << square
+        self.bitboards[colour * 6 + piecetype] &= ~bit
+        self.occupied[colour] &= ~bit
+
+    def pieceat(self, square):
+        """Get (colour, piece type) at square, or None if it's empty."""
+        bit = 1 << square
+        for index, bits in enumerate(self.bitboards):
+            if bits & bit:
+                return divmod(index, 6)
+        return None
+
+    def attackers(self, square, colour, occupied=None):
+        """Bitboard of colour's pieces attacking square."""
+        if occupied is None:
+            occupied = self.occupied[0] | self.occupied[1]
+        bitboards = self.bitboards
+        base = colour * 6
+        queens = bitboards[base + QUEEN]
+        return (
+            (PAWN_ATTACKS[1 - colour][square] & bitboards[base + PAWN]) |
+            (KNIGHT_ATTACKS[square] & bitboards[base + KNIGHT]) |
+            (KING_ATTACKS[square] & bitboards[base + KING]) |
+            (slide(square, occupied, BISHOP_RAYS) &
+                (bitboards[base + BISHOP] | queens)) |
+            (slide(square, occupied, ROOK_RAYS) &
+                (bitboards[base + ROOK] | queens))
+        )
+
+    def attacked(self, square, colour):
+        """Decide if square is attacked by any of colour's pieces."""
+        return self.attackers(square, colour) != 0
+
+    def kingsquare(self, colour):
+        return lowest(self.bitboards[colour * 6 + KING])
+
+    def kingchecked(self, black=None):
+        """Decide if the king (of the side to move by default) is checked."""
+        colour = int(self.black if black is None else black)
+        return self.attacked(self.kingsquare(colour), 1 - colour)
+
+    def pseudomoves(self):
+        """Moves that follow the piece rules but may leave the king checked."""
+        us = int(self.black)
+        them = 1 - us
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        empty = FULL ^ occupied
+        bitboards = self.bitboards
+        base = us * 6
+        moves = []
+
+        # Pawns, all at once per direction.
+        pawns = bitboards[base + PAWN]
+        targets = enemy
+        if self.ep is not None:
+            targets |= 1 << self.ep
+        if us == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_3) >> 8) & empty
+            left = ((pawns & NOT_A) >> 9) & targets
+            right = ((pawns & NOT_H) >> 7) & targets
+            step, promotionrank = -8, RANK_8
+            leftstep, rightstep = -9, -7
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & RANK_6) << 8) & empty
+            left = ((pawns & NOT_A) << 7) & targets
+            right = ((pawns & NOT_H) << 9) & targets
+            step, promotionrank = 8, RANK_1
+            leftstep, rightstep = 7, 9
+        for bits, delta in (
+            (single, step), (left, leftstep), (right, rightstep)
+        ):
+            for to in squares(bits & ~promotionrank):
+                moves.append((to - delta, to, None))
+            for to in squares(bits & promotionrank):
+                for promotion in PROMOTIONS:
+                    moves.append((to - delta, to, promotion))
+        for to in squares(double):
+            moves.append((to - 2 * step, to, None))
+
+        notown = FULL ^ own
+        for curr in squares(bitboards[base + KNIGHT]):
+            for to in squares(KNIGHT_ATTACKS[curr] & notown):
+                moves.append((curr, to, None))
+        diagonal = bitboards[base + BISHOP] | bitboards[base + QUEEN]
+        for curr in squares(diagonal):
+            for to in squares(slide(curr, occupied, BISHOP_RAYS) & notown):
+                moves.append((curr, to, None))
+        straight = bitboards[base + ROOK] | bitboards[base + QUEEN]
+        for curr in squares(straight):
+            for to in squares(slide(curr, occupied, ROOK_RAYS) & notown):
+                moves.append((curr, to, None))
+
+        king = self.kingsquare(us)
+        for to in squares(KING_ATTACKS[king] & notown):
+            moves.append((king, to, None))
+        for right, curr, to, _, _, between, safe in CASTLES:
+            if (
+                self.castling & right and curr == king and
+                not occupied & between and
+                not any(self.attacked(square, them) for square in safe)
+            ):
+                moves.append((curr, to, None))
+
+        return moves
+
+    def makemove(self, move):
+        """Get the position after move, leaving this one unchanged."""
+        curr, to, promotion = move
+        position = self.copy()
+        us = int(self.black)
+        them = 1 - us
+        colour, piecetype = self.pieceat(curr)
+        captured = self.pieceat(to)
+        if captured is not None:
+            position.remove(them, captured[1], to)
+
+        position.remove(us, piecetype, curr)
+        position.put(us, piecetype if promotion is None else promotion, to)
+
+        position.ep = None
+        if piecetype == PAWN:
+            if to == self.ep:
+                # En passant, the taken pawn is beside where we started.
+                position.remove(them, PAWN, curr - curr % 8 + to % 8)
+            elif abs(curr - to) == 16:
+                position.ep = (curr + to) // 2
+        elif piecetype == KING and abs(curr - to) == 2:
+            for _, kingfrom, kingto, rookfrom, rookto, _, _ in CASTLES:
+                if kingfrom == curr and kingto == to:
+                    position.remove(us, ROOK, rookfrom)
+                    position.put(us, ROOK, rookto)
+
+        position.castling &= chess.CASTLING_KEEP[curr] & chess.CASTLING_KEEP[to]
+        position.black = not self.black
+        return position
+
+    def legal(self, move):
+        """
+        Decide if a pseudo legal move keeps our king safe, by looking for
+        attackers of the king with the occupancy as it would be after the
+        move rather than making it.
+        """
+        curr, to, _ = move
+        us = int(self.black)
+        start, end = 1 << curr, 1 << to
+        occupied = (self.occupied[0] | self.occupied[1]) & ~start | end
+        # Whatever is taken can't attack any more.
+        taken = end
+        if to == self.ep and self.bitboards[us * 6 + PAWN] & start:
+            passed = 1 << (curr - curr % 8 + to % 8)
+            occupied &= ~passed
+            taken |= passed
+        king = self.kingsquare(us)
+        square = to if curr == king else king
+        return not self.attackers(square, 1 - us, occupied) & ~taken
+
+    def pinned(self):
+        """
+        Bitboard of the side to moves pieces pinned to its king, found by
+        sliding from the king through only the enemy's pieces to its
+        sliders and seeing which have one of ours alone in the way.
+        """
+        us = int(self.black)
+        base = (1 - us) * 6
+        own, enemy = self.occupied[us], self.occupied[1 - us]
+        king = self.kingsquare(us)
+        queens = self.bitboards[base + QUEEN]
+        pinned = 0
+        for rays, sliders in (
+            (BISHOP_RAYS, self.bitboards[base + BISHOP] | queens),
+            (ROOK_RAYS, self.bitboards[base + ROOK] | queens),
+        ):
+            for sniper in squares(slide(king, enemy, rays) & sliders):
+                between = slide(king, 1 << sniper, rays) & slide(sniper, 1 << king, rays)
+                blockers = between & (own | enemy)
+                if blockers & own and not blockers & (blockers - 1):
+                    pinned |= blockers
+        return pinned
+
+    def legalmoves(self):
+        """
+        The legal moves. Out of check only king moves, en passant captures
+        and moves of pinned pieces can leave the king attacked, so only
+        those are tested with legal().
+        """
+        if self.kingchecked():
+            return [move for move in self.pseudomoves() if self.legal(move)]
+        king = self.kingsquare(int(self.black))
+        pinned = self.pinned()
+        ep = self.ep
+        return [
+            move for move in self.pseudomoves()
+            if not (move[0] == king or pinned >> move[0] & 1 or move[1] == ep)
+            or self.legal(move)
+        ]
+
+    def checkmate(self):
+        """Decide if the side to move has been checkmated."""
+        return self.kingchecked() and not self.legalmoves()
+
+    def stalemate(self):
+        """Decide if the side to move has no moves but isn't checked."""
+        return not self.kingchecked() and not self.legalmoves()
+
+def listlegalmoves(board):
+    """(from, to) of every legal move at a Board, using the Piece classes."""
+    king = board.board[board.board.kings[board.blackturn]]
+    return set(king.legalmoves(board.board, board.blackturn))
+
+def crosscheck(board):
+    """
+    Compare the legal moves of both backends at a Board.
+    Returns the (from, to) moves only the list backend and only the bitboard
+    backend allow.
+    """
+    listmoves = listlegalmoves(board)
+    bitmoves = {
+        (curr, to) for curr, to, _ in Position.fromboard(board).legalmoves()}
+    return listmoves - bitmoves, bitmoves - listmoves
+
+def same(position, other):
+    """Decide if two positions hold the same game state."""
+    return (
+        position.bitboards == other.bitboards and position.black == other.black
+        and position.castling == other.castling and position.ep == other.ep)
+
+def main(argv):
+    games = int(argv[0]) if argv else 20
+    rng = random.Random(int(argv[1]) if len(argv) > 1 else 0)
+    promotions = (chess.Queen, chess.Rook, chess.Bishop, chess.Knight)
+    positions = mismatches = 0
+    listtime = bittime = 0.0
+
+    for number in range(games):
+        # The game keeps its Position up to date move by move.
+        game = chess.Game(backend='bitboard')
+        for ply in range(200):
+            start = time.perf_counter()
+            listmoves = listlegalmoves(game)
+            listtime += time.perf_counter() - start
+            start = time.perf_counter()
+            bitmoves = {(curr, to) for curr, to, _ in game.position.legalmoves()}
+            bittime += time.perf_counter() - start
+            positions += 1
+
+            if listmoves != bitmoves:
+                mismatches += 1
+                print('game {} ply {}: list only {}, bitboard only {}'.format(
+                    number, ply, sorted(listmoves - bitmoves),
+                    sorted(bitmoves - listmoves)))
+            if not same(game.position, Position.fromboard(game)):
+                mismatches += 1
+                print('game {} ply {}: position out of step with the board'.format(
+                    number, ply))
+            if not listmoves:
+                break
+
+            curr, to = rng.choice(sorted(listmoves))
+            promotion = None
+            if game.board[curr].name == 'pawn' and (to < 8 or to > 55):
+                promotion = rng.choice(promotions)
+            game.play(curr, to, promotion)
+            if game.outcome is not None:
+                break
+
+    print('{} positions, {} mismatches'.format(positions, mismatches))
+    print('list backend    : {:8.1f} positions/s'.format(positions / listtime))
+    print('bitboard backend: {:8.1f} positions/s'.format(positions / bittime))
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,202 @@
+"""
+Opening book, for playing the first moves of a game without searching.
+
+A book is a file of 16 byte entries laid out as in Polyglot books:
+    8 bytes   position hash (Squares.zobrist())
+    2 bytes   move (encodemove())
+    2 bytes   weight, how good the move is thought to be
+    4 bytes   unused (Polyglot's learn field), always 0
+big endian and sorted by hash, then best move first. The hash and move codes
+are this program's own rather than Polyglot's, so Polyglot books can't be
+read, but a book is memory mapped and looked up by binary search the same
+way, so only the few entries asked for are read.
+
+buildbook() compiles one from PGN games. Each move played from a position
+scores 2 for a win and 1 for a draw for the side that played it.
+
+Usage:
+    python chess.py book build <book> <pgn files> [--plies N] [--min N]
+    python chess.py book query <book> [fen]
+"""
+
+import argparse
+import os
+import random
+import struct
+
+import chess
+import gamefile
+import pgn
+import replay
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+# Moves from the start of each game put in the book.
+PLIES = 20
+
+def scores(tags, movetext, plies=PLIES):
+    """
+    Yield the (hash, move code, score) of the first plies moves of a PGN
+    game, stopping at the first move that can't be played.
+    """
+    points = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}.get(
+        tags.get('Result'), (0, 0))
+    try:
+        game = chess.Game(fen=tags.get('FEN'))
+    except ValueError:
+        return
+    for token in pgn.tokens(movetext):
+        if token in pgn.RESULTS or len(game.moves) >= plies:
+            return
+        key = game.board.zobrist()
+        black = game.board.blackturn
+        try:
+            move = pgn.parsesan(game, token)
+        except ValueError:
+            return
+        if not game.play(*move).legal:
+            return
+        yield key, game.moves[-1], points[black]
+
+def buildbook(path, pgnpaths, plies=PLIES, minimum=1, progress=None):
+    """
+    Compile the games of PGN files into a book at path.
+    minimum: leave out moves played fewer times than this.
+    progress: called with the number of games read so far, now and then.
+    Returns (games, entries).
+    """
+    # key << 16 | move -> [times played, score]
+    counts = {}
+    games = 0
+    for _, tags, movetext in replay.readgames(pgnpaths):
+        for key, code, score in scores(tags, movetext, plies):
+            count = counts.setdefault(key << 16 | code, [0, 0])
+            count[0] += 1
+            count[1] += score
+        games += 1
+        if progress is not None and games % 1000 == 0:
+            progress(games)
+
+    kept = [(entry, score) for entry, (played, score) in counts.items() if played >= minimum]
+    # Weights have to fit in 16 bits, scale them all down if any don't.
+    top = max((score for _, score in kept), default=0)
+    scale = 0xFFFF / top if top > 0xFFFF else 1
+    kept.sort(key=lambda item: (item[0] >> 16, -item[1], item[0] & 0xFFFF))
+    with open(path + '.tmp', 'wb') as file:
+        file.write(b''.join(
+            ENTRY.pack(entry >> 16, entry & 0xFFFF, int(score * scale), 0)
+            for entry, score in kept))
+    os.replace(path + '.tmp', path)
+    return games, len(kept)
+
+class OpeningBook:
+    """A book file, opened for lookups."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = gamefile.mapfile(self.file)
+        if len(self.data) % ENTRY.size:
+            self.close()
+            raise ValueError('{} is not a book'.format(path))
+        self.count = len(self.data) // ENTRY.size
+
+    def close(self):
+        for name in ('data', 'file'):
+            thing = getattr(self, name, None)
+            if thing:
+                thing.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lowerbound(self, key):
+        """The number of the first entry with a hash of at least key."""
+        unpack, data, size = KEY.unpack_from, self.data, ENTRY.size
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if unpack(data, middle * size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def moves(self, position):
+        """
+        The ((from, to, promotion class or None), weight) book moves of
+        position, a Squares, FEN string or hash, best first.
+        """
+        key = position
+        if isinstance(position, str):
+            key = chess.Squares.fromfen(position).zobrist()
+        elif isinstance(position, chess.Squares):
+            key = position.zobrist()
+        found = []
+        number = self.lowerbound(key)
+        while number < self.count:
+            entry, code, weight, _ = ENTRY.unpack_from(self.data, number * ENTRY.size)
+            if entry != key:
+                break
+            found.append((chess.decodemove(code), weight))
+            number += 1
+        return found
+
+    def choose(self, position, rng=random):
+        """
+        A book move for position picked at random, better moves more often,
+        or None if it isn't in the book.
+        """
+        found = [(move, weight) for move, weight in self.moves(position) if weight]
+        if not found:
+            return None
+        return rng.choices(
+            [move for move, _ in found], [weight for _, weight in found])[0]
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py book', description='Build and look in opening books.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='compile a book from PGN games')
+    build.add_argument('book')
+    build.add_argument('pgn', nargs='+', help='PGN files, - for stdin')
+    build.add_argument(
+        '--plies', type=int, default=PLIES,
+        help='moves of each game to put in (default: %(default)s)')
+    build.add_argument(
+        '--min', type=int, default=1, dest='minimum',
+        help='leave out moves played fewer times (default: %(default)s)')
+    query = commands.add_parser('query', help='look up a position')
+    query.add_argument('book')
+    query.add_argument('fen', nargs='*', help='position (default: start)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        def progress(games):
+            print('{} games...'.format(games), end='\r', flush=True)
+
+        try:
+            games, count = buildbook(
+                args.book, args.pgn, args.plies, args.minimum, progress)
+        except OSError as e:
+            parser.error(str(e))
+        print('Put {} moves from {} games in the book.'.format(count, games))
+        return 0
+
+    try:
+        book = OpeningBook(args.book)
+        position = chess.Squares.fromfen(
+            ' '.join(args.fen) if args.fen else chess.START_FEN)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    with book:
+        found = book.moves(position)
+        print('{} book moves for {}'.format(len(found), position.fen()))
+        total = sum(weight for _, weight in found) or 1
+        for move, weight in found:
+            print('  {:6} {:6} {:5.1f}%'.format(
+                chess.movename(*move), weight, weight * 100 / total))
+    return 0
@@ -3,23 +3,16 @@ This is a simple command line chess application.
 Please feel free to use, modify, or redistribute it however you wish. Although
 some credit would be nice, it's not necessary.
 
-Some of the more esoteric rules such as en-passent, or draw by 3x repetition 
+Some of the more esoteric rules such as draw by insufficient material
 are yet to be implemented and I cannot guarantee that I will implement them
 in future.
 
 Some cool features which would be nice to implement if you are so inclined are:
-    [Sane]
-    - Game store and load functionality
     - Draw/resign functionality
-    - Removing the old board from the screen before redrawing
     - Missing rules (some listed above)
     - History of moves played displayed on screen
     - A game timer
     - Nicer art :)
-    - Ability to load in various art styles
-    [Insane/complex]
-    - Playing against the computer
-    - Networking functionality to play against other players
 
 p.s. at time of writing this has only been tested on python 3.8.5 and likely
     contains several bugs.
@@ -33,11 +26,18 @@ __license__ = None
 __version__ = "1.0.0"
 __date__ = "Sat 12 Sep 2020"
 
+from collections import namedtuple
 from math import floor, ceil
+import argparse
+import random
 import time
 import os
 import sys
 
+import attacks
+from evaluation import ENDGAME, MIDGAME, PHASE
+import styles
+
 # Set to 0.001 or even 0.01 to get that retro feel.
 PRINT_DELAY = 0
 
@@ -46,56 +46,424 @@ PRINT_DELAY = 0
 WIDTH = 10
 HEIGHT = 5
 
-class Board:
+# Zobrist hashing keys. Seeded so every process (and every run) uses the
+# same keys and hashes can be stored.
+_zobrist = random.Random(20200912)
+# (black, piece letter) -> a key for each square.
+ZOBRIST_PIECES = {
+    (black, letter): [_zobrist.getrandbits(64) for _ in range(64)]
+    for black in (False, True) for letter in 'pnbrqk'
+}
+ZOBRIST_BLACK = _zobrist.getrandbits(64)
+# Indexed by castling rights bitmask and en passant file.
+ZOBRIST_CASTLING = [_zobrist.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_zobrist.getrandbits(64) for _ in range(8)]
+
+# Castling rights bits and the (king, rook) squares each needs unmoved.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING = (
+    (WHITE_KINGSIDE, 60, 63),
+    (WHITE_QUEENSIDE, 60, 56),
+    (BLACK_KINGSIDE, 4, 7),
+    (BLACK_QUEENSIDE, 4, 0),
+)
+# The castling rights kept by a move from or to each square, as moving a
+# king or rook (or taking a rook) loses them for good.
+CASTLING_KEEP = [15] * 64
+for _right, _king, _rook in CASTLING:
+    CASTLING_KEEP[_king] &= ~_right
+    CASTLING_KEEP[_rook] &= ~_right
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Pieces as small integers, for Squares.codes: the position of the letter in
+# PIECE_LETTERS plus one, or'd with BLACK_PIECE for black. 0 is no piece.
+PIECE_LETTERS = 'pnbrqk'
+BLACK_PIECE = 8
+
+def squarename(index):
+    """Board array index to the name of the square, e.g. 52 -> 'e2'."""
+    return 'abcdefgh'[index % 8] + str(8 - index // 8)
+
+def squareindex(name):
+    """Name of a square to its board array index, e.g. 'e2' -> 52, or None."""
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        return None
+    return 'abcdefgh'.index(name[0]) + (8 - int(name[1])) * 8
+
+def movename(curr, to, promotion=None):
     """
-    The board/game class.
-    Handles displaying the board as well as user input.
+    Name a move by its squares, e.g. 'e2e4', with the letter of the piece
+    class promoted to on the end, e.g. 'e7e8q'.
     """
+    name = squarename(curr) + squarename(to)
+    if promotion is not None:
+        name += promotion.letter
+    return name
 
-    def __init__(self):
-        self.board = [None] * 64
-        self.setupboard()
-        # False for whites turn, true for blacks turn
-        self.blackturn = False
+def parsemove(name):
+    """
+    The (from, to, promotion class or None) of a move named like movename()
+    names them, or None if name isn't a move.
+    """
+    name = name.strip().lower()
+    if len(name) not in (4, 5):
+        return None
+    curr = squareindex(name[:2])
+    to = squareindex(name[2:4])
+    if curr is None or to is None:
+        return None
+    promotion = None
+    if len(name) == 5:
+        if name[4] not in 'nbrq':
+            return None
+        promotion = PIECES[name[4]]
+    return curr, to, promotion
+
+def encodemove(curr, to, promotion=None):
+    """
+    Pack a move into 16 bits: 6 bits each for the from and to indexes and
+    the promotion (0 for none, 1-4 for a knight, bishop, rook or queen).
+    """
+    code = curr | (to << 6)
+    if promotion is not None:
+        code |= ('nbrq'.index(promotion.letter) + 1) << 12
+    return code
+
+def decodemove(code):
+    """Unpack an encodemove() move to (from, to, promotion class or None)."""
+    promotion = code >> 12
+    return (
+        code & 63, (code >> 6) & 63,
+        PIECES['nbrq'[promotion - 1]] if promotion else None
+    )
+
+# What Game.play() says about a move.
+MoveResult = namedtuple('MoveResult', (
+    # False if the move wasn't played, and the reason why not.
+    'legal', 'reason',
+    # The move's name, e.g. 'e2e4', and the piece it took, if any.
+    'move', 'captured',
+    # How things stand for the other side after the move.
+    'check', 'checkmate', 'stalemate',
+    # 'threefold repetition' or 'fifty move rule' if the move drew the game.
+    'draw',
+    # What tablebase.probe() says about the position after the move, None
+    # if it isn't in a table or the game is over.
+    'tablebase',
+))
+
+class Game:
+    """
+    A game of chess played by other code, without any input or output.
+    Board is the command line front end to one.
+    fen: the position to start from, the usual one if not given.
+    backend: 'list' or 'bitboard', how moves are validated.
+    board: a Squares to start from instead of a FEN.
+    """
 
-    def run(self):
-        os.system('clear')
-        while True:
-            self.displayboard()
-            try:
-                self.doinput()
-            except SystemExit:
-                self.displayboard()
-                break
+    def __init__(self, fen=None, backend='list', board=None):
+        self.backend = backend
+        # With the bitboard backend moves are validated against a Position
+        # which is kept in step with the board, and the Positions before
+        # each move played are kept for takeback().
+        self.position = None
+        self.positions = []
+        if board is None:
+            self.setfen(fen or START_FEN)
+        else:
+            self.setboard(board)
 
-    def setupboard(self):
-        """Setup pieces in the board array."""
-        for i in range(8, 16):
-            self.board[i] = Pawn(True)
-            self.board[i + 40] = Pawn(False)
+    @property
+    def blackturn(self):
+        """False for whites turn, true for blacks turn."""
+        return self.board.blackturn
 
-        self.board[0] = Rook(True)
-        self.board[7] = Rook(True)
-        self.board[56] = Rook(False)
-        self.board[63] = Rook(False)
+    def setfen(self, fen):
+        """
+        Start again from the position of a FEN string.
+        Raises ValueError if the FEN can't be read.
+        """
+        self.setboard(Squares.fromfen(fen))
+
+    def setboard(self, board):
+        """Start again from the position of a Squares."""
+        self.board = board
+        # The packed starting position and move counters, and the
+        # encodemove() codes of the moves played since, to save the game.
+        self.start = (board.pack(), board.halfmove, board.fullmove)
+        self.moves = []
+        self.sync()
+        # How the game ended: 'checkmate', 'stalemate', 'threefold
+        # repetition' or 'fifty move rule', or None while it's being played.
+        self.outcome = None
+        self.status()
+
+    def fen(self):
+        """The FEN string of the current position."""
+        return self.board.fen()
+
+    def sync(self):
+        """Build the bitboard backend's Position from the board."""
+        if self.backend == 'bitboard':
+            import bitboard
+
+            self.position = bitboard.Position.fromboard(self)
+            self.positions = []
+
+    def advance(self, fromindex, toindex, promotion):
+        """Play a move on the bitboard backend's Position too."""
+        if self.position is not None:
+            self.positions.append(self.position)
+            self.position = self.position.makemove((
+                fromindex, toindex,
+                None if promotion is None else PIECE_LETTERS.index(promotion.letter)))
+
+    def validmove(self, piece, fromindex, toindex):
+        """Decide if moving piece is valid using the selected backend."""
+        position = self.position
+        if position is None:
+            return piece.validmove(self.board, fromindex, toindex)
+        return any(
+            move[0] == fromindex and move[1] == toindex and position.legal(move)
+            for move in position.pseudomoves()
+        )
 
-        self.board[1] = Knight(True)
-        self.board[6] = Knight(True)
-        self.board[57] = Knight(False)
-        self.board[62] = Knight(False)
+    def legalmoves(self):
+        """The (from, to, promotion class or None) moves of the side to move."""
+        if self.position is not None:
+            return [
+                (curr, to, None if promotion is None else PIECES[PIECE_LETTERS[promotion]])
+                for curr, to, promotion in self.position.legalmoves()
+            ]
+        board = self.board
+        black = board.blackturn
+        king = board[board.kings[black]]
+        moves = []
+        for curr, to in king.iterlegalmoves(board, black):
+            if board[curr].name == 'pawn' and (to < 8 or to > 55):
+                moves.extend((curr, to, promotion) for promotion in PROMOTIONS)
+            else:
+                moves.append((curr, to, None))
+        return moves
 
-        self.board[2] = Bishop(True)
-        self.board[5] = Bishop(True)
-        self.board[58] = Bishop(False)
-        self.board[61] = Bishop(False)
+    def move(self, name):
+        """Play a move named like 'e2e4' or 'e7e8q', returning a MoveResult."""
+        move = parsemove(name)
+        if move is None:
+            return self.illegal(name, 'not a move')
+        return self.play(*move)
 
-        self.board[3] = Queen(True)
-        self.board[59] = Queen(False)
+    def play(self, fromindex, toindex, promotion=None):
+        """
+        Play a move if it's legal, returning a MoveResult.
+        promotion: the piece class a pawn reaching the last rank becomes.
+        """
+        name = movename(fromindex, toindex, promotion)
+        if self.outcome is not None:
+            return self.illegal(name, 'the game is over')
+        board = self.board
+        piece = board[fromindex]
+        if piece is None or piece.black != board.blackturn:
+            return self.illegal(name, 'no piece to move on ' + squarename(fromindex))
+        if not self.validmove(piece, fromindex, toindex):
+            return self.illegal(name, 'illegal move')
+        promotes = piece.name == 'pawn' and (toindex < 8 or toindex > 55)
+        if promotes and promotion not in PROMOTIONS:
+            return self.illegal(name, 'a promotion piece is needed')
+        if not promotes and promotion is not None:
+            return self.illegal(name, 'not a promotion')
+
+        captured = board[toindex]
+        if piece.name == 'pawn' and toindex == board.ep and (fromindex - toindex) % 8 != 0:
+            captured = board[piece.passedpawnindex(fromindex, toindex)]
+        # Captures and pawn moves can never be undone, which restarts the
+        # fifty move count.
+        irreversible = piece.name == 'pawn' or captured is not None
+        board.makemove(fromindex, toindex, promotion)
+        board.record(irreversible)
+        self.moves.append(encodemove(fromindex, toindex, promotion))
+        self.advance(fromindex, toindex, promotion)
+        check, checkmate, stalemate, draw = self.status()
+        found = None
+        if self.outcome is None:
+            import tablebase
+
+            found = tablebase.probe(board)
+        return MoveResult(
+            True, None, name, captured, check, checkmate, stalemate, draw, found)
+
+    def replay(self, codes):
+        """
+        Play the encodemove() codes of moves already known to be legal, such
+        as those of a saved game, without checking them.
+        """
+        board = self.board
+        for code in codes:
+            curr, to, promotion = decodemove(code)
+            piece = board[curr]
+            irreversible = piece.name == 'pawn' or board[to] is not None
+            board.makemove(curr, to, promotion)
+            board.record(irreversible)
+        self.moves.extend(codes)
+        self.sync()
+        self.status()
+
+    def illegal(self, name, reason):
+        return MoveResult(False, reason, name, None, False, False, False, None, None)
+
+    def status(self):
+        """
+        (check, checkmate, stalemate, draw) for the side to move, setting
+        outcome if the game is over.
+        """
+        board = self.board
+        if self.position is None:
+            black = board.blackturn
+            king = board[board.kings[black]]
+            check = king.kingchecked(board, black)
+            nomoves = not king.haslegalmove(board, black)
+        else:
+            check = self.position.kingchecked()
+            nomoves = not self.position.legalmoves()
+        draw = None
+        if not nomoves:
+            if board.repetitions() >= 3:
+                draw = 'threefold repetition'
+            elif board.halfmove >= 100:
+                draw = 'fifty move rule'
+        if nomoves:
+            self.outcome = 'checkmate' if check else 'stalemate'
+        else:
+            self.outcome = draw
+        return check, nomoves and check, nomoves and not check, draw
+
+    def result(self):
+        """The result as PGN writes it, '1-0', '0-1', '1/2-1/2' or '*'."""
+        if self.outcome is None:
+            return '*'
+        if self.outcome == 'checkmate':
+            return '1-0' if self.board.blackturn else '0-1'
+        return '1/2-1/2'
+
+    def takeback(self):
+        """Take back the last move played, False if there isn't one."""
+        if not self.moves:
+            return False
+        self.board.unmakemove()
+        self.board.history.pop()
+        self.moves.pop()
+        if self.positions:
+            self.position = self.positions.pop()
+        else:
+            self.sync()
+        self.outcome = None
+        return True
+
+class Board:
+    """
+    The command line front end to a Game.
+    Handles displaying the board as well as user input.
+    """
 
-        self.board[4] = King(True)
-        self.board[60] = King(False)
+    def __init__(
+        self, diff=False, backend='list', computer=None, movetime=5,
+        nodes=None, hashsize=16, threads=1, book=None, style=None,
+    ):
+        self.game = Game(backend=backend)
+        # Only repaint the squares that changed instead of the whole board.
+        self.diff = diff
+        # Built on the first call to displayboard().
+        self.renderer = None
+        # The Style the board is drawn in (see styles.py), the built in art
+        # if None.
+        self.style = style
+        # The side the engine plays (True for black, False for white, None
+        # for neither) and the seconds and/or nodes it may use per move.
+        self.computer = computer
+        self.movetime = movetime
+        self.nodes = nodes
+        # Megabytes for the engine's transposition table, which is made on
+        # its first move and kept for the rest of the game.
+        self.hashsize = hashsize
+        self.table = None
+        # With more than one thread the engine searches with a pool of that
+        # many processes, started on its first move.
+        self.threads = threads
+        self.parallel = None
+        # An OpeningBook the engine plays from while the position is in it.
+        self.book = book
+        # An instrument.Recorder reporting on each move with --stats.
+        self.stats = None
+
+    @property
+    def board(self):
+        """The game's Squares."""
+        return self.game.board
+
+    @property
+    def blackturn(self):
+        """False for whites turn, true for blacks turn."""
+        return self.game.blackturn
+
+    def run(self):
+        if not self.diff:
+            os.system('clear')
+        try:
+            while self.game.outcome is None:
+                self.displayboard()
+                if self.blackturn == self.computer:
+                    self.computermove()
+                else:
+                    self.doinput()
+            self.displayboard()
+        finally:
+            if self.parallel is not None:
+                self.parallel.close()
+            if self.book is not None:
+                self.book.close()
+            if self.stats is not None:
+                self.stats.finish()
+            if self.diff and self.renderer is not None:
+                sys.stdout.write(self.renderer.reset())
+                print('Redrawing used {} bytes, {:.0f} per redraw.'.format(
+                    self.renderer.totalbytes,
+                    self.renderer.totalbytes / self.renderer.frames))
+
+    def setfen(self, fen):
+        """
+        Setup the board from a FEN string.
+        Raises ValueError if the FEN can't be read.
+        """
+        self.game.setfen(fen)
+
+    def getfen(self):
+        """The FEN string of the current position."""
+        return self.game.fen()
 
     def displayboard(self):
+        """
+        Renders the board as a single frame written in one call.
+        In diff mode only the squares that changed since the last call are
+        repainted in place.
+        If PRINT_DELAY is set (and not in diff mode or drawing a style) the
+        old character by character renderer is used instead so the retro
+        feel is kept.
+        """
+        if PRINT_DELAY and not self.diff and self.style is None:
+            self.displayboardslow()
+            return
+
+        if self.renderer is None:
+            drawing = art if self.style is None else self.style
+            self.renderer = DiffRenderer(drawing) if self.diff else Renderer(drawing)
+        sys.stdout.write(self.renderer.draw(self.board))
+        sys.stdout.flush()
+
+    def displayboardslow(self):
         """Renders the board line by line."""
         squareindex = 0
         for y in range(HEIGHT * 8):
@@ -159,6 +527,19 @@ class Board:
         print('\n')
         pieceinput = input('Piece->').strip().lower()
 
+        if pieceinput == 'undo':
+            # Against the computer its reply is taken back too.
+            count = 1 if self.computer is None else 2
+            if len(self.game.moves) < count:
+                print('Nothing to take back!')
+                return
+            for _ in range(count):
+                self.takeback()
+            return
+        if pieceinput == 'save':
+            self.savegame(input('File->').strip())
+            return
+
         fromcoords = self.validateposition(pieceinput)
 
         if not fromcoords:
@@ -181,15 +562,99 @@ class Board:
         fromindex = self.coordstoindex(fromcoords)
         toindex = self.coordstoindex(tocoords)
         
-        if not piece.validmove(self.board,fromindex,toindex):
+        if not self.validmove(piece, fromindex, toindex):
             print('Invalid move!')
             return
-        piece.move(self.board, fromindex, toindex)
+        self.play(piece, fromindex, toindex)
+
+    def computermove(self):
+        """Let the engine choose and play a move."""
+        import engine
+        from transposition import TranspositionTable
+
+        print('\n')
+        if self.book is not None:
+            move = self.book.choose(self.board)
+            # Hashes can collide, so make sure it's really a move here.
+            if move in self.game.legalmoves():
+                print('Book move.')
+                curr, to, promotion = move
+                self.play(self.board[curr], curr, to, promotion)
+                return
+        print('Thinking...')
+        if self.threads > 1:
+            if self.parallel is None:
+                self.parallel = engine.ParallelSearch(self.threads, self.hashsize)
+            search = self.parallel.search(self.board, self.movetime, self.nodes)
+        else:
+            if self.table is None:
+                self.table = TranspositionTable(self.hashsize)
+            search = engine.bestmove(
+                self.board, self.movetime, self.nodes, table=self.table)
+        curr, to, promotion = search.best
+        print('Depth {}, {} nodes, {} nodes/s, score {}.'.format(
+            search.depth, search.nodes, search.nps(), search.score))
+        if self.table is not None:
+            stats = self.table.stats()
+            print('Hash {:.0f}% full, {:.0f}% hits, {} collisions.'.format(
+                stats['fillrate'] * 100, stats['hitrate'] * 100,
+                stats['collisions']))
+        self.play(self.board[curr], curr, to, promotion)
+
+    def play(self, piece, fromindex, toindex, promotion=None):
+        """
+        Play a valid move and say how it went, returning the MoveResult.
+        promotion: the piece class a pawn promotes to, asked for if needed
+        and not given.
+        """
+        if promotion is None and piece.name == 'pawn' and (toindex < 8 or toindex > 55):
+            promotion = piece.getpromotion()
+        result = self.game.play(fromindex, toindex, promotion)
+        if not result.legal:
+            print('Invalid move!')
+            return result
         print(
-            ('Black' if self.blackturn else 'White') +\
-            ' moves ' + pieceinput + ' to ' + position + '. ' + \
-            ('White' if self.blackturn else 'Black') + ' to play.')
-        self.blackturn = not self.blackturn
+            ('Black' if piece.black else 'White') +\
+            ' moves ' + squarename(fromindex) + ' to ' + squarename(toindex) + '. ' + \
+            ('White' if piece.black else 'Black') + ' to play.')
+        if result.checkmate:
+            print('Checkmate!')
+            print(('Black' if piece.black else 'White') + ' Wins!')
+        elif result.stalemate:
+            print('Stalemate!')
+            print('Draw!')
+        elif result.draw is not None:
+            print('Draw by {}!'.format(result.draw))
+        else:
+            if result.check:
+                print('Check!')
+            if result.tablebase is not None and result.tablebase[0]:
+                # The side to move is the winner if it mates.
+                winner = self.blackturn == (result.tablebase[0] > 0)
+                print('{} mates in {}.'.format(
+                    'Black' if winner else 'White', (result.tablebase[1] + 1) // 2))
+        if self.stats is not None:
+            print(self.stats.move(result.move))
+        return result
+
+    def takeback(self):
+        """Take back the last move played, False if there isn't one."""
+        return self.game.takeback()
+
+    def savegame(self, path):
+        """Add the game so far to the game file at path."""
+        import gamefile
+
+        try:
+            gamefile.save(path, self.game)
+        except OSError as e:
+            print('Could not save: {}'.format(e))
+            return
+        print('Saved to {}.'.format(path))
+
+    def validmove(self, piece, fromindex, toindex):
+        """Decide if moving piece is valid using the selected backend."""
+        return self.game.validmove(piece, fromindex, toindex)
 
     def validateposition(self, position):
         """
@@ -215,6 +680,393 @@ class Board:
         # XXX This is possibly a bug, watch out.
         return coords[0] + ((8 - coords[1]) * 8)
 
+class Squares(list):
+    """
+    The 64 entry board array.
+    Behaves exactly like a list of pieces, but also keeps an index of which
+    squares each side's pieces are on (and where the kings are) so that
+    nothing needs to scan the board to find a piece.
+    It also holds the side to move, castling rights and en passant square,
+    and keeps a Zobrist hash of the position up to date as any of them
+    change, as well as the evaluation scores of the pieces (see
+    evaluation.py).
+    The pieces are the shared views in PIECE_VIEWS, which hold nothing about
+    the game, and their codes are kept in a bytearray for pack().
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        # The piece code on each square.
+        self.codes = bytearray(64)
+        # Square index -> piece, for white (index 0) and black (index 1).
+        self.pieces = ({}, {})
+        # The square of the white and black kings.
+        self.kings = [None, None]
+        # Zobrist hash of the pieces, side to move and en passant file.
+        # Castling rights are added by zobrist().
+        self.key = 0
+        # Castling rights bitmask, see CASTLING.
+        self.castling = 0
+        # Whites midgame and endgame scores, and the game phase.
+        self.midgame = 0
+        self.endgame = 0
+        self.phase = 0
+        self._blackturn = False
+        self._ep = None
+        # zobrist() after every move of the game, and the number of moves
+        # since the last capture or pawn move.
+        self.history = []
+        self.halfmove = 0
+        # Starts at 1 and goes up after each of black's moves.
+        self.fullmove = 1
+        # What unmakemove() needs to take back each move made by makemove(),
+        # last move last.
+        self.undos = []
+        for index, piece in enumerate(self):
+            if piece is not None:
+                self.place(index, piece)
+
+    def __setitem__(self, index, piece):
+        old = list.__getitem__(self, index)
+        if old is not None:
+            del self.pieces[old.black][index]
+            self.key ^= ZOBRIST_PIECES[old.black, old.letter][index]
+            self.midgame -= MIDGAME[old.black, old.letter][index]
+            self.endgame -= ENDGAME[old.black, old.letter][index]
+            self.phase -= PHASE[old.letter]
+            if self.kings[old.black] == index and old.name == 'king':
+                self.kings[old.black] = None
+        if piece is not None:
+            self.place(index, piece)
+        else:
+            self.codes[index] = 0
+        list.__setitem__(self, index, piece)
+
+    def place(self, index, piece):
+        """Record piece as being on the square index."""
+        self.pieces[piece.black][index] = piece
+        self.codes[index] = piece.code
+        self.key ^= ZOBRIST_PIECES[piece.black, piece.letter][index]
+        self.midgame += MIDGAME[piece.black, piece.letter][index]
+        self.endgame += ENDGAME[piece.black, piece.letter][index]
+        self.phase += PHASE[piece.letter]
+        if piece.name == 'king':
+            self.kings[piece.black] = index
+
+    @property
+    def blackturn(self):
+        """False for whites turn, true for blacks turn."""
+        return self._blackturn
+
+    @blackturn.setter
+    def blackturn(self, black):
+        if black != self._blackturn:
+            self.key ^= ZOBRIST_BLACK
+        self._blackturn = black
+
+    @property
+    def ep(self):
+        """
+        The square a pawn skipped over with its last move, if any, so it can
+        be taken en passant.
+        """
+        return self._ep
+
+    @ep.setter
+    def ep(self, index):
+        if self._ep is not None:
+            self.key ^= ZOBRIST_EP[self._ep % 8]
+        if index is not None:
+            self.key ^= ZOBRIST_EP[index % 8]
+        self._ep = index
+
+    def makemove(self, curr, to, promotion=None):
+        """
+        Play a legal move and hand the turn to the other side, remembering
+        what's needed to take it back with unmakemove().
+        promotion: the piece class a pawn reaching the last rank becomes.
+        """
+        piece = self[curr]
+        # (from, to, piece, captured piece, castling rights, en passant
+        # square, side to move, halfmove and fullmove counts, extra), extra
+        # being (pawn index, pawn, None) for en passant, (rook from, rook,
+        # rook to) for castling or None.
+        extra = None
+        if piece.name == 'pawn' and to == self._ep and (curr - to) % 8 != 0:
+            passed = piece.passedpawnindex(curr, to)
+            extra = (passed, self[passed], None)
+            self[passed] = None
+        elif piece.name == 'king' and abs(curr - to) == 2:
+            rookfrom, rookto = (to - 2, to + 1) if curr > to else (to + 1, to - 1)
+            rook = self[rookfrom]
+            extra = (rookfrom, rook, rookto)
+            self[rookfrom] = None
+            self[rookto] = rook
+        self.undos.append((
+            curr, to, piece, self[to], self.castling, self._ep,
+            self._blackturn, self.halfmove, self.fullmove, extra
+        ))
+
+        self[curr] = None
+        self[to] = piece if promotion is None else pieceview(promotion, piece.black)
+        self.castling &= CASTLING_KEEP[curr] & CASTLING_KEEP[to]
+        # Only a pawn which has just moved two squares can be taken en passant.
+        if piece.name == 'pawn' and abs(curr - to) == 16:
+            self.ep = (curr + to) // 2
+        else:
+            self.ep = None
+        self.blackturn = not self._blackturn
+
+    def unmakemove(self):
+        """Take back the last move played by makemove()."""
+        (
+            curr, to, piece, captured, castling, ep, blackturn, halfmove,
+            fullmove, extra
+        ) = self.undos.pop()
+        self[to] = captured
+        self[curr] = piece
+        self.castling = castling
+        self.ep = ep
+        self.blackturn = blackturn
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        if extra is not None:
+            index, other, moveto = extra
+            if moveto is not None:
+                self[moveto] = None
+            self[index] = other
+
+    @classmethod
+    def fromfen(cls, fen):
+        """
+        Make the board of a FEN string.
+        Raises ValueError if the FEN can't be read.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError('Invalid FEN: ' + fen)
+        placement, turn, castling, passant = fields[:4]
+
+        rows = placement.split('/')
+        if len(rows) != 8 or turn not in ('w', 'b'):
+            raise ValueError('Invalid FEN: ' + fen)
+        board = cls([None] * 64)
+        for y, row in enumerate(rows):
+            x = 0
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                if char.lower() not in PIECES or x > 7:
+                    raise ValueError('Invalid FEN: ' + fen)
+                board[y * 8 + x] = pieceview(PIECES[char.lower()], char.islower())
+                x += 1
+            if x != 8:
+                raise ValueError('Invalid FEN: ' + fen)
+        if None in board.kings:
+            raise ValueError('Both sides need a king: ' + fen)
+
+        for char, (right, king, rook) in zip('KQkq', CASTLING):
+            if char not in castling:
+                continue
+            black = char.islower()
+            for index, name in ((king, 'king'), (rook, 'rook')):
+                piece = board[index]
+                if piece is None or piece.name != name or piece.black != black:
+                    raise ValueError('Invalid castling rights: ' + fen)
+            board.castling |= right
+
+        if passant != '-':
+            if squareindex(passant) is None or passant[1] not in '36':
+                raise ValueError('Invalid en passant square: ' + fen)
+            board.ep = squareindex(passant)
+
+        board.blackturn = turn == 'b'
+        board.record(True)
+        for index, name in ((4, 'halfmove'), (5, 'fullmove')):
+            if len(fields) > index:
+                if not fields[index].isdigit():
+                    raise ValueError('Invalid {} number: {}'.format(name, fen))
+                setattr(board, name, int(fields[index]))
+        return board
+
+    def fen(self):
+        """The FEN string of the position."""
+        rows = []
+        for y in range(8):
+            row = ''
+            empty = 0
+            for piece in self[y * 8:y * 8 + 8]:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += piece.letter if piece.black else piece.letter.upper()
+            rows.append(row + (str(empty) if empty else ''))
+        castling = ''.join(
+            char for char, (right, _, _) in zip('KQkq', CASTLING) if self.castling & right)
+        return '{} {} {} {} {} {}'.format(
+            '/'.join(rows), 'b' if self.blackturn else 'w', castling or '-',
+            '-' if self.ep is None else squarename(self.ep),
+            self.halfmove, self.fullmove)
+
+    def zobrist(self):
+        """The 64 bit Zobrist hash of the whole position."""
+        return self.key ^ ZOBRIST_CASTLING[self.castling]
+
+    def pack(self):
+        """
+        The position in 66 bytes: the piece code of each square, the
+        castling rights with 16 added if black is to move, then the en
+        passant square (64 if there isn't one).
+        """
+        return bytes(self.codes) + bytes((
+            self.castling | (16 if self._blackturn else 0),
+            64 if self._ep is None else self._ep,
+        ))
+
+    @classmethod
+    def unpack(cls, data):
+        """Make the board of a position packed by pack()."""
+        board = cls(PIECE_VIEWS[code] for code in data[:64])
+        board.castling = data[64] & 15
+        board.blackturn = bool(data[64] & 16)
+        if data[65] != 64:
+            board.ep = data[65]
+        board.record(True)
+        return board
+
+    def record(self, irreversible):
+        """
+        Add the position after a move to the history.
+        irreversible: if the move was a capture or pawn move.
+        """
+        self.halfmove = 0 if irreversible else self.halfmove + 1
+        if not self.blackturn and self.history:
+            self.fullmove += 1
+        self.history.append(self.zobrist())
+
+    def repetitions(self):
+        """How many times the current position has occurred."""
+        key = self.history[-1]
+        # Positions can only repeat since the last irreversible move, and
+        # only with the same side to move.
+        start = max(len(self.history) - 1 - self.halfmove, 0)
+        return self.history[-1:start - 1 if start else None:-2].count(key)
+
+class Renderer:
+    """
+    Frame buffered board renderer.
+    Every piece is pre-rendered onto both square colours once, so drawing the
+    board is just joining ready made tile rows into one string.
+    """
+
+    # Square backgrounds, indexed by 1 for the dark (odd) squares.
+    BACKGROUNDS = (' ', ':')
+
+    def __init__(self, art, width=WIDTH, height=HEIGHT):
+        # art is a compiled Style, or a dict like art to compile here.
+        style = art if isinstance(art, styles.Style) else styles.Style.fromart(
+            art, width, height, self.BACKGROUNDS)
+        width, height = style.width, style.height
+        self.width = width
+        self.height = height
+        # (black, name, dark) -> tuple of row strings.
+        self.tiles = style.tiles
+        self.blanks = style.blanks
+        # Bytes of output produced by the last and all calls to draw().
+        self.lastbytes = 0
+        self.totalbytes = 0
+        self.frames = 0
+        self.letters = ''.join(
+            (' ' * (width // 2)) + letter + (' ' * (width - width // 2 - 1))
+            for letter in 'ABCDEFGH'
+        ).rstrip()
+
+    def tile(self, piece, dark):
+        """Get the rows of the tile for piece (or None) on a square."""
+        if piece is None:
+            return self.blanks[dark]
+        return self.tiles[piece.black, piece.name, dark]
+
+    def frame(self, board):
+        """Build the whole board, numbers and letters as one string."""
+        lines = []
+        for row in range(8):
+            tiles = [
+                self.tile(board[row * 8 + col], (row + col) % 2)
+                for col in range(8)
+            ]
+            for y in range(self.height):
+                # Display the numbers on the right hand side of the board.
+                num = str(8 - row) if y == self.height // 2 else ''
+                lines.append(''.join(tile[y] for tile in tiles) + '   ' + num)
+        # Display letters at bottom of board.
+        lines.append('')
+        lines.append(self.letters)
+        return '\n'.join(lines) + '\n'
+
+    def draw(self, board):
+        """Get the output needed to show the board, counting its size."""
+        output = self.render(board)
+        self.lastbytes = len(output.encode())
+        self.totalbytes += self.lastbytes
+        self.frames += 1
+        return output
+
+    def render(self, board):
+        return self.frame(board)
+
+class DiffRenderer(Renderer):
+    """
+    Renderer which keeps the board in a fixed place on the screen and, after
+    the first frame, only repaints the squares whose piece changed using ANSI
+    cursor addressing.
+    Everything printed after the board scrolls in the region below it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # What was last drawn on each square, None until the first frame.
+        self.shown = None
+
+    def key(self, piece):
+        """What a square's tile depends on."""
+        return None if piece is None else (piece.black, piece.name)
+
+    def render(self, board):
+        keys = [self.key(piece) for piece in board]
+        if self.shown is None:
+            self.shown = keys
+            # Height of the board plus the blank line and the letters.
+            below = self.height * 8 + 3
+            return (
+                '\x1b[H\x1b[2J' + self.frame(board) +
+                # Only scroll the lines below the board from now on.
+                '\x1b[{0}r\x1b[{0};1H'.format(below)
+            )
+
+        output = []
+        for index, key in enumerate(keys):
+            if key == self.shown[index]:
+                continue
+            row, col = divmod(index, 8)
+            tile = self.tile(board[index], (row + col) % 2)
+            for y, line in enumerate(tile):
+                output.append('\x1b[{};{}H{}'.format(
+                    row * self.height + y + 1, col * self.width + 1, line))
+        self.shown = keys
+        if not output:
+            return ''
+        # Save and restore the cursor so input carries on where it was.
+        return '\x1b7' + ''.join(output) + '\x1b8'
+
+    def reset(self):
+        """Output to give the whole screen back to scrolling."""
+        return '\x1b[r'
+
 class Piece:
     """
     The base piece class.
@@ -222,11 +1074,21 @@ class Piece:
     as well as basic implementations of functions such as move and validmove.
     """
 
+    # Pieces only say what they are, anything about where they've been is
+    # kept by the board. PIECE_VIEWS holds one of each to share.
+    __slots__ = ('black', 'name', 'code')
+
+    # Letter for the piece in FEN and move names.
+    letter = ''
+    # (stepx, stepy) of each line the piece walks along, and how far.
+    directions = ()
+    reach = 8
+
     def __init__(self, black, name=''):
         # False for white, True for black.
         self.black = black
         self.name = name
-        self.moved = False
+        self.code = (PIECE_LETTERS.find(self.letter) + 1) | (BLACK_PIECE if black else 0)
 
     def getpiecechar(self, index):
         """
@@ -235,38 +1097,35 @@ class Piece:
         """
         return art['black' if self.black else 'white'][self.name][index]
 
-    def move(self, board, curr, to):
-        """Basic movement. Move piece from 'curr' index to 'to' index."""
-        board[curr] = None
-        board[to] = self
-        self.moved = True
-        self.checkforchecks(board)
+    def moves(self, board, curr, allowspecial=True):
+        """The valid moves that this piece can make."""
+        return self.walks(board, curr)
 
-    def checkforchecks(self, board):
+    def attacks(self, board, curr):
         """
-        Decide if either check or checkmate conditions are at current
-        board state.
-        If checkmate then raises SystemExit which can/is caught upstream.
+        The squares this piece attacks, including ones holding pieces of its
+        own side (which it defends).
         """
-        if self.checkmate(board):
-            print('Checkmate!')
-            print(('Black' if self.black else 'White') + ' Wins!')
-            sys.exit(1)
-        if self.kingchecked(board, not self.black):
-            print('Check!')
+        return self.walks(board, curr, defends=True)
 
-    def moves(self, board, curr, allowspecial=True):
-        """The valid moves that this piece can make."""
-        return []
+    def walks(self, board, curr, defends=False):
+        """walk() from curr along each of the piece's directions."""
+        coords = self.indextocoords(curr)
+        moves = []
+        for stepx, stepy in self.directions:
+            moves += self.walk(board, coords, stepx, stepy, self.reach, defends)
+        return moves
 
     def validmove(self, board, curr, to):
-        """Decides if given move is a valid move using the moves() function."""
-        if not self.notsame(curr, to) or self.movewillcheckownking(board, curr, to):
+        """Decides if given move is a valid move using legalmoves()."""
+        if not self.notsame(curr, to):
             return False
 
-        moves = self.moves(board, curr)
+        # Cheap test first, most squares can't be reached at all.
+        if self.indextocoords(to) not in self.moves(board, curr):
+            return False
 
-        return self.indextocoords(to) in moves
+        return (curr, to) in self.legalmoves(board, self.black, only=curr)
 
     def indextocoords(self, index):
         """Convert a board array index to coordinate 2 tuple."""
@@ -292,12 +1151,13 @@ class Piece:
         """Check if from and to are not the same square."""
         return _from != to
 
-    def walk(self, board, curr, stepx, stepy, limit=8):
+    def walk(self, board, curr, stepx, stepy, limit=8, defends=False):
         """
         Get list of moves from (not including) current board array index 
         to either edge of board, friendly piece (not including piece), or enemy 
         piece (including piece).
         Moves by (stepx, stepy) for every move up to limit.
+        If defends, a friendly piece which is walked into is included too.
         """
         moves = []
         coords = curr[0] + stepx, curr[1] + stepy
@@ -306,7 +1166,7 @@ class Piece:
                 break
 
             if not self.emptysquare(board, coords):
-                if self.pieceat(board, coords).black is not self.black:
+                if defends or self.pieceat(board, coords).black is not self.black:
                     moves.append(coords)
                 break
             moves.append(coords)
@@ -318,57 +1178,182 @@ class Piece:
 
     def allofcolor(self, board, black):
         """"Get all the pieces of either black if black == true or white."""
-        pieces = []
-        for piece in board:
-            if piece is not None and piece.black is black:
-                pieces.append(piece)
-        return pieces
+        return list(board.pieces[black].values())
 
     def kingchecked(self, board, black):
-        """Decied if the king is checked at the given board position."""
-        enemy = self.allofcolor(board, not black)
-        king = [piece for piece in self.allofcolor(board, black) if piece.name=='king'][0]
-        kingcoords = self.indextocoords(board.index(king))
-        enemyMoves = [
-            move for piece in enemy
-            for move in piece.moves(board, board.index(piece), allowspecial=False)
-        ]
-        return kingcoords in enemyMoves
+        """
+        Decied if the king is checked at the given board position, by
+        looking outwards from it for each kind of piece that could attack it.
+        """
+        king = board.kings[black]
+        codes = board.codes
+        enemy = 0 if black else BLACK_PIECE
+        # An enemy pawn attacks the king from where one of ours would take.
+        for squares, code in (
+            (KNIGHT_REACH[king], KNIGHT_CODE), (attacks.PAWN_TAKES[black][king], PAWN_CODE),
+            (KING_REACH[king], KING_CODE),
+        ):
+            for square in squares:
+                if codes[square] == code | enemy:
+                    return True
+        for lines, code in (
+            (attacks.RAYS['r'][king], ROOK_CODE), (attacks.RAYS['b'][king], BISHOP_CODE),
+        ):
+            for line in lines:
+                for square in line:
+                    found = codes[square]
+                    if found:
+                        if found == code | enemy or found == QUEEN_CODE | enemy:
+                            return True
+                        break
+        return False
+
+    def threats(self, board, black):
+        """
+        Work out what threatens the king of the given side.
+        Returns (attacked, checkers, pins):
+            attacked: set of coordinates the enemy attacks, looking through
+                the king so it can't step back along a checking line.
+            checkers: board array indexes of the pieces giving check.
+            pins: pinned piece index -> coordinates it may still move to
+                (between the king and the pinning piece, inclusive).
+        """
+        kingindex = board.kings[black]
+        kingcoords = self.indextocoords(kingindex)
+        king = board[kingindex]
+
+        attacked = set()
+        checkers = []
+        board[kingindex] = None
+        try:
+            for square, piece in board.pieces[not black].items():
+                attacks = piece.attacks(board, square)
+                attacked.update(attacks)
+                if kingcoords in attacks:
+                    checkers.append(square)
+        finally:
+            board[kingindex] = king
+
+        pins = {}
+        for stepx, stepy in King.directions:
+            # Diagonals can be pinned by bishops, straight lines by rooks.
+            slider = 'bishop' if stepx and stepy else 'rook'
+            line = []
+            pinned = None
+            coords = kingcoords[0] + stepx, kingcoords[1] + stepy
+            while self.validsquare(coords):
+                line.append(coords)
+                piece = self.pieceat(board, coords)
+                if piece is not None:
+                    if piece.black is black:
+                        if pinned is not None:
+                            break
+                        pinned = self.coordstoindex(coords)
+                    else:
+                        if pinned is not None and piece.name in (slider, 'queen'):
+                            pins[pinned] = set(line)
+                        break
+                coords = coords[0] + stepx, coords[1] + stepy
+
+        return attacked, checkers, pins
+
+    def legalmoves(self, board, black, only=None):
+        """
+        Get every legal (from, to) board array index move for a side.
+        only: just get the moves of the piece at this index.
+        """
+        return list(self.iterlegalmoves(board, black, only))
+
+    def haslegalmove(self, board, black):
+        """Decide if a side has any legal move, stopping at the first."""
+        return next(self.iterlegalmoves(board, black), None) is not None
+
+    def iterlegalmoves(self, board, black, only=None):
+        """
+        Generate the legal (from, to) board array index moves for a side.
+        Checks and pins are worked out once with threats() so, apart from en
+        passant captures, no move needs to be tried out on the board.
+        only: just get the moves of the piece at this index.
+        """
+        attacked, checkers, pins = self.threats(board, black)
+        kingindex = board.kings[black]
+        kingcoords = self.indextocoords(kingindex)
+
+        # In check the other pieces must take the checker or block it.
+        blocks = None
+        if len(checkers) == 1:
+            checker = board[checkers[0]]
+            checkercoords = self.indextocoords(checkers[0])
+            blocks = {checkercoords}
+            if checker.directions:
+                stepx = (checkercoords[0] > kingcoords[0]) - (checkercoords[0] < kingcoords[0])
+                stepy = (checkercoords[1] > kingcoords[1]) - (checkercoords[1] < kingcoords[1])
+                coords = kingcoords[0] + stepx, kingcoords[1] + stepy
+                while coords != checkercoords:
+                    blocks.add(coords)
+                    coords = coords[0] + stepx, coords[1] + stepy
+
+        if only is None or only == kingindex:
+            king = board[kingindex]
+            for coords in king.walks(board, kingindex):
+                if coords not in attacked:
+                    yield kingindex, self.coordstoindex(coords)
+            if not checkers:
+                for coords in king.castles(board, kingindex, attacked):
+                    yield kingindex, self.coordstoindex(coords)
+
+        # Only the king can get out of double check.
+        if len(checkers) > 1:
+            return
+
+        for square, piece in list(board.pieces[black].items()):
+            if square == kingindex or (only is not None and square != only):
+                continue
+
+            for coords in piece.moves(board, square):
+                to = self.coordstoindex(coords)
+                if piece.name == 'pawn' and to == board.ep and (square - to) % 8 != 0:
+                    # En passant takes a pawn off a third square which can
+                    # uncover a check along the rank, so try it out instead.
+                    if not piece.movewillcheckownking(board, square, to):
+                        yield square, to
+                    continue
+                if square in pins and coords not in pins[square]:
+                    continue
+                if blocks is not None and coords not in blocks:
+                    continue
+                yield square, to
 
     def movewillcheckownking(self, board, curr, to):
         """Decide if the given move will check this sides king."""
-        toPositionOrig = board[to]
-        board[curr] = None
-        board[to] = self
+        board.makemove(curr, to)
         kingchecked = self.kingchecked(board, self.black)
-        board[curr] = self
-        board[to] = toPositionOrig
+        board.unmakemove()
         return kingchecked
 
     def checkmate(self, board):
         """Decide if checkmate conditions have been reached."""
-        for piece in self.allofcolor(board, not self.black):
-            for move in piece.moves(board, board.index(piece)):
-                if not piece.movewillcheckownking(board, board.index(piece), self.coordstoindex(move)):
-                    return False
-        return True
+        return (
+            self.kingchecked(board, not self.black) and
+            not self.haslegalmove(board, not self.black)
+        )
+
+    def stalemate(self, board):
+        """Decide if the other side has no moves but isn't checked."""
+        return (
+            not self.kingchecked(board, not self.black) and
+            not self.haslegalmove(board, not self.black)
+        )
 
 class Pawn(Piece):
     """Defines the mightiest piece on the board."""
 
+    letter = 'p'
+    __slots__ = ()
+
     def __init__(self, *args):
         super().__init__(name='pawn', *args)
 
-    def move(self, board, curr, to):
-        promote = (not self.black and to < 8) or (self.black and to > 54)
-
-        if promote:
-            board[curr] = None
-            board[to] = self.getpromotion()
-            self.checkforchecks(board)
-        else:
-            super().move(board, curr, to)
-
     def getpromotion(self):
         while True:
             prompt = 'Promotion (1) Rook, (2) Knight, (3) Bishop, (4) Queen ->'
@@ -377,19 +1362,29 @@ class Pawn(Piece):
             try:
                 value = int(value)
                 if value == 1:
-                    return Rook(self.black)
+                    return Rook
                 elif value == 2:
-                    return Knight(self.black)
+                    return Knight
                 elif value == 3:
-                    return Bishop(self.black)
+                    return Bishop
                 elif value == 4:
-                    return Queen(self.black)
+                    return Queen
                 else:
                     raise ValueError
             except ValueError:
                 print('Invalid promotion.')
                 continue
 
+    def attacks(self, board, curr):
+        mul = 1 if self.black else -1
+        coords = self.indextocoords(curr)
+        takes = (coords[0] + 1, coords[1] + mul), (coords[0] - 1, coords[1] + mul)
+        return [take for take in takes if self.validsquare(take)]
+
+    def passedpawnindex(self, curr, to):
+        """The index of the pawn taken by an en passant move."""
+        return (curr - curr % 8) + to % 8
+
     def moves(self, board, curr, allowspecial=True):
         moves = []
         mul = 1 if self.black else -1
@@ -402,38 +1397,55 @@ class Pawn(Piece):
 
         if self.validsquare(forwards1) and self.emptysquare(board, forwards1):
             moves.append(forwards1)
-            if self.validsquare(forwards2) and self.emptysquare(board, forwards2) and not self.moved:
+            if self.validsquare(forwards2) and self.emptysquare(board, forwards2) and curr // 8 == (1 if self.black else 6):
                 moves.append(forwards2)
         if self.validsquare(takeleft) and not self.emptysquare(board, takeleft) and self.pieceat(board, takeleft).black is not self.black:
             moves.append(takeleft)
         if self.validsquare(takeright) and not self.emptysquare(board, takeright) and self.pieceat(board, takeright).black is not self.black:
             moves.append(takeright)
-        
+        if allowspecial and board.ep is not None:
+            passant = self.indextocoords(board.ep)
+            if passant in (takeleft, takeright):
+                passed = board[self.passedpawnindex(curr, board.ep)]
+                if passed is not None and passed.black is not self.black:
+                    moves.append(passant)
+
         return moves
 
 class Rook(Piece):
 
+    letter = 'r'
+    __slots__ = ()
+    directions = ((0, -1), (-1, 0), (0, 1), (1, 0))
+
     def __init__(self, *args):
         super().__init__(name='rook', *args)
 
-    def moves(self, board, curr, allowspecial=True):
-        coords = self.indextocoords(curr)
-        up = self.walk(board, coords, 0, -1)
-        right = self.walk(board, coords, -1, 0)
-        down = self.walk(board, coords, 0, 1)
-        left = self.walk(board, coords, 1, 0)
-
-        return up + right + down + left
-
 class Knight(Piece):
 
+    letter = 'n'
+    __slots__ = ()
+
     def __init__(self, *args):
         super().__init__(name='knight', *args)
 
     def moves(self, board, curr, allowspecial=True):
-        coords = self.indextocoords(curr)
         moves = []
-        
+        for move in self.jumps(curr):
+            if not self.emptysquare(board, move):
+                if self.pieceat(board, move).black is self.black:
+                    continue
+            moves.append(move)
+
+        return moves
+
+    def attacks(self, board, curr):
+        return self.jumps(curr)
+
+    def jumps(self, curr):
+        """The squares on the board a knight at curr could jump to."""
+        coords = self.indextocoords(curr)
+
         upleft = coords[0] - 1, coords[1] - 2
         upright = coords[0] + 1, coords[1] - 2
         rightup = coords[0] + 2, coords[1] - 1
@@ -445,105 +1457,112 @@ class Knight(Piece):
 
         potential = [upleft, upright, rightup, rightdown, downright, downleft, leftdown, leftup]
 
-        for move in potential:
-            if not self.validsquare(move):
-                continue
-            if not self.emptysquare(board, move):
-                if self.pieceat(board, move).black is self.black:
-                    continue
-            moves.append(move)
-
-        return moves
+        return [move for move in potential if self.validsquare(move)]
 
 class Bishop(Piece):
 
+    letter = 'b'
+    __slots__ = ()
+    directions = ((-1, -1), (1, -1), (-1, 1), (1, 1))
+
     def __init__(self, *args):
         super().__init__(name='bishop', *args)
 
-    def moves(self, board, curr, allowspecial=True):
-        coords = self.indextocoords(curr)
-        upleft = self.walk(board, coords, -1, -1)
-        upright = self.walk(board, coords, 1, -1)
-        downleft = self.walk(board, coords, -1, 1)
-        downright = self.walk(board, coords, 1, 1)
-
-        return upleft + upright + downleft + downright
-
 class Queen(Piece):
 
+    letter = 'q'
+    __slots__ = ()
+    directions = Rook.directions + Bishop.directions
+
     def __init__(self, *args):
         super().__init__(name='queen', *args)
 
-    def moves(self, board, curr, allowspecial=True):
-        coords = self.indextocoords(curr)
-
-        up = self.walk(board, coords, 0, -1)
-        upright = self.walk(board, coords, 1, -1)
-        right = self.walk(board, coords, -1, 0)
-        downright = self.walk(board, coords, 1, 1)
-        down = self.walk(board, coords, 0, 1)
-        downleft = self.walk(board, coords, -1, 1)
-        left = self.walk(board, coords, 1, 0)
-        upleft = self.walk(board, coords, -1, -1)
-
-        return up + upright + right + downright + down + downleft + left + upleft
-
 class King(Piece):
 
+    letter = 'k'
+    __slots__ = ()
+    directions = Queen.directions
+    reach = 1
+
     def __init__(self, *args):
         super().__init__(name='king', *args)
 
-    def move(self, board, curr, to):
-        # Castle if king moves 2. Move is already validated by moves().
-        if abs(curr - to) == 2:
-            leftcastle = curr > to
-            if leftcastle:
-                rook = board[to - 2]
-                board[to - 2] = None
-                board[to + 1] = rook
-            else:
-                rook = board[to + 1]
-                board[to + 1] = None
-                board[to - 1] = rook
-        super().move(board, curr, to)
-
     def moves(self, board, curr, allowspecial=True):
-        coords = self.indextocoords(curr)
+        castles = []
+        if allowspecial and board.castling & self.rights():
+            attacked = set()
+            for square, piece in board.pieces[not self.black].items():
+                attacked.update(piece.attacks(board, square))
+            castles = self.castles(board, curr, attacked)
+
+        return self.walks(board, curr) + castles
 
+    def castles(self, board, curr, attacked):
+        """
+        The squares the king can castle to.
+        attacked: set of coordinates attacked by the other side.
+        """
+        rights = board.castling & self.rights()
+        if not rights:
+            return []
+
+        coords = self.indextocoords(curr)
         castles = []
-        if not self.moved and allowspecial:
-            left = self.walk(board, coords, -1, 0)
-            right = self.walk(board, coords, 1, 0)
-
-            leftrook = self.pieceat(board, [0, coords[1]])
-            rightrook = self.pieceat(board, [7, coords[1]])
-
-            if len(left) == 3 and self.cancastlesafely(board, coords, left, leftrook):
-                castles.append(left[1])
-            if len(right) == 2 and self.cancastlesafely(board, coords, right, rightrook):
-                castles.append(right[1])
-
-        up = self.walk(board, coords, 0, -1, 1)
-        upright = self.walk(board, coords, 1, -1, 1)
-        right = self.walk(board, coords, -1, 0, 1)
-        downright = self.walk(board, coords, 1, 1, 1)
-        down = self.walk(board, coords, 0, 1, 1)
-        downleft = self.walk(board, coords, -1, 1, 1)
-        left = self.walk(board, coords, 1, 0, 1)
-        upleft = self.walk(board, coords, -1, -1, 1)
-
-        return up + upright + right + downright + down + downleft + left + upleft + castles
-
-    def cancastlesafely(self, board, coords, moves, rook):
-        if rook is None or rook.name != 'rook' or rook.moved:
+        left = self.walk(board, coords, -1, 0)
+        right = self.walk(board, coords, 1, 0)
+
+        leftrook = self.pieceat(board, [0, coords[1]])
+        rightrook = self.pieceat(board, [7, coords[1]])
+
+        # Walks end on an enemy piece, so check the last square is empty.
+        queenside = BLACK_QUEENSIDE if self.black else WHITE_QUEENSIDE
+        kingside = BLACK_KINGSIDE if self.black else WHITE_KINGSIDE
+        if rights & queenside and len(left) == 3 and self.emptysquare(board, left[2]) and self.cancastlesafely(coords, left, leftrook, attacked):
+            castles.append(left[1])
+        if rights & kingside and len(right) == 2 and self.emptysquare(board, right[1]) and self.cancastlesafely(coords, right, rightrook, attacked):
+            castles.append(right[1])
+
+        return castles
+
+    def rights(self):
+        """The castling rights bits of this king's side."""
+        if self.black:
+            return BLACK_KINGSIDE | BLACK_QUEENSIDE
+        return WHITE_KINGSIDE | WHITE_QUEENSIDE
+
+    def cancastlesafely(self, coords, moves, rook, attacked):
+        if rook is None or rook.name != 'rook' or rook.black != self.black:
             return False
 
-        if self.movewillcheckownking(board, self.coordstoindex(coords), self.coordstoindex(moves[0])):
-            return False
-        if self.movewillcheckownking(board, self.coordstoindex(coords), self.coordstoindex(moves[1])):
-            return False
+        # Can't castle out of, through or into check.
+        return (
+            coords not in attacked and
+            moves[0] not in attacked and
+            moves[1] not in attacked
+        )
 
-        return True
+# Piece classes by their letter.
+PIECES = {piece.letter: piece for piece in (Pawn, Rook, Knight, Bishop, Queen, King)}
+# What a pawn can promote to, best first.
+PROMOTIONS = (Queen, Rook, Bishop, Knight)
+
+PAWN_CODE, KNIGHT_CODE, BISHOP_CODE, ROOK_CODE, QUEEN_CODE, KING_CODE = range(1, 7)
+# For each square, the squares a knight or king there reaches, for
+# kingchecked().
+KNIGHT_REACH = [sum(rays, ()) for rays in attacks.RAYS['n']]
+KING_REACH = [sum(rays, ()) for rays in attacks.RAYS['k']]
+
+# The shared instance of every piece, by code.
+PIECE_VIEWS = [None] * 16
+for _piece in PIECES.values():
+    for _black in (False, True):
+        _view = _piece(_black)
+        PIECE_VIEWS[_view.code] = _view
+
+def pieceview(piece, black):
+    """The shared instance of a piece class for white or black."""
+    return PIECE_VIEWS[
+        (PIECE_LETTERS.index(piece.letter) + 1) | (BLACK_PIECE if black else 0)]
 
 art = {
     'black': {
@@ -636,5 +1655,107 @@ art = {
     }
 }
 
+# Sub commands, run as 'python chess.py <command> ...', and their modules.
+COMMANDS = {
+    'perft': 'perft',
+    'db': 'gamedb',
+    'replay': 'replay',
+    'book': 'book',
+    'tablebase': 'tablebase',
+    'serve': 'server',
+    'uci': 'uci',
+    'match': 'match',
+    'batch': 'batch',
+}
+
+def main(argv):
+    stats = None
+    if os.environ.get('CHESS_STATS'):
+        import instrument
+        stats = instrument.fromenv()
+    if argv and argv[0] in COMMANDS:
+        module = __import__(COMMANDS[argv[0]])
+        try:
+            return module.main(argv[1:])
+        finally:
+            if stats is not None:
+                stats.finish(sys.stderr)
+
+    parser = argparse.ArgumentParser(
+        description='Command line chess.',
+        epilog='Other commands: ' + ', '.join(sorted(COMMANDS)) + '.')
+    parser.add_argument(
+        '--diff', action='store_true',
+        help='only redraw the squares that changed after each move')
+    parser.add_argument(
+        '--backend', choices=('list', 'bitboard'), default='list',
+        help='how moves are validated (default: %(default)s)')
+    parser.add_argument(
+        '--computer', choices=('white', 'black'),
+        help='side to be played by the computer')
+    parser.add_argument(
+        '--movetime', type=float, default=5,
+        help='seconds the computer may think per move (default: %(default)s)')
+    parser.add_argument(
+        '--nodes', type=int,
+        help='positions the computer may search per move')
+    parser.add_argument(
+        '--hash', type=int, default=16,
+        help='megabytes for the computer\'s transposition table (default: %(default)s)')
+    parser.add_argument(
+        '--threads', type=int, default=1,
+        help='processes the computer searches with (default: %(default)s)')
+    parser.add_argument('--fen', help='position to start from')
+    parser.add_argument(
+        '--load', metavar='FILE',
+        help='carry on with the last game saved to a game file')
+    parser.add_argument(
+        '--book', metavar='FILE',
+        help='opening book for the computer to play from')
+    parser.add_argument(
+        '--tablebases', metavar='DIR',
+        help='where the endgame tablebases are (default: tablebases/)')
+    parser.add_argument(
+        '--style', metavar='NAME',
+        help='art style to draw the pieces in, the name of one in styles/ '
+        '(' + ', '.join(styles.available()) + ') or a style file')
+    parser.add_argument(
+        '--stats', nargs='?', const='', metavar='FILE',
+        help='count and time move generation, legality checks, mate detection '
+        'and drawing after each move, saving them to FILE as JSON if given '
+        '(or set CHESS_STATS to 1 or FILE)')
+    args = parser.parse_args(argv)
+    if args.threads < 1:
+        parser.error('--threads must be at least 1')
+    computer = None if args.computer is None else args.computer == 'black'
+    board = Board(
+        diff=args.diff, backend=args.backend, computer=computer,
+        movetime=args.movetime, nodes=args.nodes, hashsize=args.hash,
+        threads=args.threads)
+    if args.stats is not None:
+        import instrument
+        stats = instrument.Recorder(args.stats or None)
+    board.stats = stats
+    try:
+        if args.style is not None:
+            board.style = styles.load(args.style)
+        if args.tablebases is not None:
+            import tablebase
+            tablebase.setdirectory(args.tablebases)
+        if args.book is not None:
+            import book
+            board.book = book.OpeningBook(args.book)
+        if args.fen is not None:
+            board.setfen(args.fen)
+        if args.load is not None:
+            import gamefile
+            board.game = gamefile.loadgame(args.load, backend=args.backend)
+    except (OSError, ValueError, IndexError) as e:
+        parser.error(str(e))
+    board.run()
+
 if __name__ == '__main__':
-    Board().run()
\ No newline at end of file
+    # The sub command modules import this one as chess, make sure they get
+    # this copy rather than loading it a second time.
+    sys.modules.setdefault('chess', sys.modules[__name__])
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,481 @@
+"""
+Computer opponent.
+
+Searches the moves from Piece.legalmoves with negamax alpha-beta, going one
+ply deeper at a time until its time or node budget runs out. The leaves are
+extended with a quiescence search of captures so it doesn't stop counting
+material halfway through an exchange. Positions with few enough pieces are
+looked up in the endgame tablebases (tablebase.py) if they've been made.
+
+ParallelSearch spreads the root moves of each iteration over a pool of
+processes, each with a transposition table of its own that it keeps between
+the moves it is given.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import time
+
+import chess
+import evaluation
+import perft
+import tablebase
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+# Piece values in centipawns by piece letter, for ordering captures.
+VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+MATE = 100000
+INFINITY = MATE + 1
+# Scores this close to MATE are mates, and are stored in the transposition
+# table relative to the position rather than the root.
+MATE_BOUND = MATE - 1000
+# How many nodes are searched between looking at the clock.
+CHECK_EVERY = 1024
+
+class Search:
+    """
+    One search of a position.
+    board: the Squares to search. It's played on during the search but is
+        left as it was found.
+    movetime: seconds the search may take.
+    nodes: how many nodes it may search.
+    depth: the deepest iteration to search.
+    info: called with the search after every completed iteration.
+    table: TranspositionTable to use, kept between searches to reuse what
+        was found before. A small one is made if not given.
+    The first iteration is always finished whatever the budget.
+    """
+
+    def __init__(
+        self, board, movetime=None, nodes=None, depth=None, info=None,
+        table=None,
+    ):
+        self.board = board
+        self.table = table if table is not None else TranspositionTable(1)
+        self.movetime = movetime
+        self.maxnodes = nodes
+        self.maxdepth = depth or 64
+        self.info = info
+        # Results of the last completed iteration.
+        self.depth = 0
+        self.score = 0
+        self.best = None
+        self.nodes = 0
+        self.stopped = False
+        self.start = None
+        # Keys of the root and the positions on the line being searched, any
+        # of which coming again is scored as a draw.
+        self.path = set()
+        # Keys of positions played twice already since the last capture or
+        # pawn move, a third time being a draw by repetition.
+        self.repeated = set()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def nps(self):
+        """Nodes searched per second."""
+        elapsed = self.elapsed()
+        return int(self.nodes / elapsed) if elapsed else 0
+
+    def run(self):
+        """Search until the budget runs out, returning the best move."""
+        self.start = time.perf_counter()
+        self.startpath()
+        self.table.newsearch()
+        if not self.moves():
+            # Checkmated or stalemated already, there's nothing to search.
+            self.score = -MATE if self.checked() else 0
+            return None
+        for depth in range(1, self.maxdepth + 1):
+            score, best = self.root(depth)
+            if self.stopped:
+                break
+            self.depth, self.score, self.best = depth, score, best
+            if self.info is not None:
+                self.info(self)
+            if abs(score) >= MATE - depth:
+                # A forced mate has been found.
+                break
+            # The next iteration takes several times longer than this one so
+            # won't finish in the time left.
+            if self.movetime is not None and self.elapsed() > self.movetime / 2:
+                break
+        return self.best
+
+    def startpath(self):
+        """Set path and repeated up for a search from the board's position."""
+        board = self.board
+        history = board.history
+        # Positions from before the last capture or pawn move can't come again.
+        start = max(len(history) - 1 - board.halfmove, 0)
+        counts = {}
+        for key in history[start:]:
+            counts[key] = counts.get(key, 0) + 1
+        self.repeated = {key for key, count in counts.items() if count >= 2}
+        self.path = {board.zobrist()}
+
+    def stop(self):
+        """
+        Stop the search as soon as it can, from another thread. The last
+        completed iteration's results stand.
+        """
+        self.stopped = True
+
+    def pv(self):
+        """
+        The moves the search expects to be played from the position, its
+        best move then the best moves stored in the transposition table.
+        """
+        if self.best is None:
+            return []
+        board = self.board
+        line = [self.best]
+        seen = {board.zobrist()}
+        board.makemove(*self.best)
+        while len(line) < self.depth:
+            key = board.zobrist()
+            # peek(), following the line isn't part of the search's probes.
+            entry = self.table.peek(key)
+            if entry is None or not entry[3] or key in seen:
+                break
+            move = chess.decodemove(entry[3])
+            # The entry could be another position's with the same bucket key.
+            if move not in self.moves():
+                break
+            seen.add(key)
+            board.makemove(*move)
+            line.append(move)
+        for _ in line:
+            board.unmakemove()
+        return line
+
+    def checklimits(self):
+        """Stop the search once it's over budget, after the first iteration."""
+        if self.depth == 0:
+            return
+        if self.maxnodes is not None and self.nodes >= self.maxnodes:
+            self.stopped = True
+        if self.movetime is not None and self.elapsed() >= self.movetime:
+            self.stopped = True
+
+    def root(self, depth):
+        """Search every root move, returning (score, best move)."""
+        alpha, beta = -INFINITY, INFINITY
+        best = None
+        for move in self.ordered(self.moves(), self.best):
+            self.board.makemove(*move)
+            score = -self.negamax(depth - 1, -beta, -alpha, 1)
+            self.board.unmakemove()
+            if self.stopped:
+                break
+            if score > alpha or best is None:
+                alpha, best = score, move
+        if best is not None and not self.stopped:
+            self.table.store(
+                self.board.zobrist(), depth, EXACT, alpha,
+                chess.encodemove(*best))
+        return alpha, best
+
+    def negamax(self, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            self.checklimits()
+        if self.stopped:
+            return 0
+
+        key = self.board.zobrist()
+        if key in self.path or key in self.repeated:
+            return 0
+        score = self.probe(ply)
+        if score is not None:
+            return score
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply)
+
+        hashmove = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            storeddepth, bound, score, move = entry
+            hashmove = chess.decodemove(move) if move else None
+            if storeddepth >= depth:
+                score = self.fromtable(score, ply)
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score > alpha:
+                    alpha = score
+                elif bound == UPPER and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+
+        moves = self.moves()
+        if not moves:
+            return -MATE + ply if self.checked() else 0
+
+        self.path.add(key)
+        original = alpha
+        best = None
+        for move in self.ordered(moves, hashmove):
+            self.board.makemove(*move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            self.board.unmakemove()
+            if self.stopped:
+                break
+            if score >= beta:
+                alpha = beta
+                best = move
+                break
+            if score > alpha:
+                alpha = score
+                best = move
+        self.path.discard(key)
+
+        if not self.stopped:
+            if alpha >= beta:
+                bound = LOWER
+            elif alpha > original:
+                bound = EXACT
+            else:
+                bound = UPPER
+            self.table.store(
+                key, depth, bound, self.totable(alpha, ply),
+                chess.encodemove(*best) if best is not None else 0)
+        return alpha
+
+    def totable(self, score, ply):
+        """Make a mate score relative to this position to store it."""
+        if score > MATE_BOUND:
+            return score + ply
+        if score < -MATE_BOUND:
+            return score - ply
+        return score
+
+    def fromtable(self, score, ply):
+        """Make a stored mate score relative to the root again."""
+        if score > MATE_BOUND:
+            return score - ply
+        if score < -MATE_BOUND:
+            return score + ply
+        return score
+
+    def probe(self, ply):
+        """The exact score of the position from the tablebases, or None."""
+        board = self.board
+        if len(board.pieces[0]) + len(board.pieces[1]) > tablebase.PIECES:
+            return None
+        found = tablebase.probe(board)
+        if found is None:
+            return None
+        result, plies = found
+        return result * (MATE - ply - plies) if result else 0
+
+    def quiesce(self, alpha, beta, ply):
+        """
+        Search only captures and promotions until the position is quiet, or
+        every move out of check.
+        """
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            self.checklimits()
+        if self.stopped:
+            return 0
+        score = self.probe(ply)
+        if score is not None:
+            return score
+
+        board = self.board
+        if self.checked():
+            # Doing nothing isn't an option in check, so every way out of it
+            # is searched.
+            moves = self.moves()
+            if not moves:
+                return -MATE + ply
+        else:
+            # The side to move can usually do at least as well as doing
+            # nothing.
+            standpat = self.evaluate()
+            if standpat >= beta:
+                return beta
+            if standpat > alpha:
+                alpha = standpat
+            moves = [
+                move for move in self.moves()
+                if board[move[1]] is not None or move[2] is not None or
+                (move[1] == board.ep and board[move[0]].name == 'pawn')
+            ]
+        for move in self.ordered(moves):
+            board.makemove(*move)
+            score = -self.quiesce(-beta, -alpha, ply + 1)
+            board.unmakemove()
+            if self.stopped:
+                break
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def moves(self):
+        """Legal (from, to, promotion class or None) moves to search."""
+        board = self.board
+        black = board.blackturn
+        king = board[board.kings[black]]
+        return [
+            (curr, to, promotion)
+            for curr, to in king.iterlegalmoves(board, black)
+            for promotion in perft.promotions(board, curr, to)
+        ]
+
+    def ordered(self, moves, first=None):
+        """
+        Sort moves to search the likely best first: first (the best move of
+        the last iteration), then promotions and captures of the most
+        valuable piece by the least valuable one, then the rest.
+        """
+        board = self.board
+
+        def order(move):
+            if move == first:
+                return -INFINITY
+            curr, to, promotion = move
+            score = 0
+            if promotion is not None:
+                score += VALUES[promotion.letter]
+            victim = board[to]
+            if victim is not None:
+                score += VALUES[victim.letter] * 10 - VALUES[board[curr].letter] // 10
+            return -score
+
+        return sorted(moves, key=order)
+
+    def checked(self):
+        board = self.board
+        king = board[board.kings[board.blackturn]]
+        return king.kingchecked(board, board.blackturn)
+
+    def evaluate(self):
+        """Score in centipawns from the side to move's view."""
+        return evaluation.evaluate(self.board)
+
+def bestmove(
+    board, movetime=None, nodes=None, depth=None, info=None, table=None,
+):
+    """
+    Search board (a Squares) and return the Search, its best move is
+    search.best.
+    """
+    search = Search(board, movetime, nodes, depth, info, table)
+    search.run()
+    return search
+
+# The transposition table of a ParallelSearch worker process.
+_workertable = None
+
+def _startworker(hashsize):
+    global _workertable
+    _workertable = TranspositionTable(hashsize)
+
+def _searchmove(fen, history, move, depth, alpha, beta, deadline, nodes):
+    """
+    Search one root move (an encodemove() code) of the position in a worker.
+    Returns (score or None if it ran out of budget, nodes searched).
+    """
+    board = chess.Squares.fromfen(fen)
+    board.history = history
+    movetime = None if deadline is None else deadline - time.time()
+    search = Search(board, movetime, nodes, table=_workertable)
+    search.start = time.perf_counter()
+    search.startpath()
+    # Only the first iteration has to finish, the one before this is already
+    # done by the main process.
+    search.depth = depth - 1
+    board.makemove(*chess.decodemove(move))
+    score = -search.negamax(depth - 1, -beta, -alpha, 1)
+    board.unmakemove()
+    return (None if search.stopped else score), search.nodes
+
+class ParallelSearch:
+    """
+    Searches with a pool of worker processes by splitting up the root moves.
+    Each iteration the best move so far is searched first, then the rest are
+    shared out between the workers to check they aren't better with null
+    window searches. Any that are get searched again for their score.
+    workers: how many processes to search with.
+    hashsize: megabytes of transposition table for each worker.
+    The pool is kept between searches, close() shuts it down.
+    """
+
+    def __init__(self, workers, hashsize=16):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(
+            workers, initializer=_startworker, initargs=(hashsize,))
+
+    def close(self):
+        self.pool.shutdown()
+
+    def search(self, board, movetime=None, nodes=None, depth=None, info=None):
+        """
+        Search board (a Squares) like bestmove(), returning a Search holding
+        the results.
+        """
+        result = Search(board, movetime, nodes, depth, info)
+        result.start = time.perf_counter()
+        deadline = None if movetime is None else time.time() + movetime
+        fen = board.fen()
+        history = list(board.history)
+        moves = result.ordered(result.moves())
+        if not moves:
+            return result
+
+        def submit(move, alpha, beta):
+            return self.pool.submit(
+                _searchmove, fen, history, chess.encodemove(*move), depth,
+                alpha, beta, deadline if depth > 1 else None, budget)
+
+        def collect(future):
+            score, searched = future.result()
+            result.nodes += searched
+            return score
+
+        for depth in range(1, result.maxdepth + 1):
+            budget = None
+            if nodes is not None and depth > 1:
+                # Shared out between the moves, the first iteration always
+                # finishes.
+                budget = max((nodes - result.nodes) // len(moves), 1)
+
+            best = moves[0]
+            alpha = collect(submit(best, -INFINITY, INFINITY))
+            if alpha is None:
+                break
+            futures = [(move, submit(move, alpha, alpha + 1)) for move in moves[1:]]
+            scores = [(move, collect(future)) for move, future in futures]
+            if any(score is None for _, score in scores):
+                break
+            # A move that failed high only scored a lower bound, which says
+            # nothing about how it compares with a better alpha found since,
+            # so every one is searched again against the alpha of the time.
+            failedhigh = [move for move, score in scores if score > alpha]
+            stopped = False
+            for move in failedhigh:
+                score = collect(submit(move, alpha, INFINITY))
+                if score is None:
+                    stopped = True
+                    break
+                if score > alpha:
+                    alpha, best = score, move
+            if stopped:
+                break
+
+            moves.remove(best)
+            moves.insert(0, best)
+            result.depth, result.score, result.best = depth, alpha, best
+            if info is not None:
+                info(result)
+            if abs(alpha) >= MATE - depth:
+                break
+            if movetime is not None and result.elapsed() > movetime / 2:
+                break
+            if nodes is not None and result.nodes >= nodes:
+                break
+        return result
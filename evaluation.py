@@ -0,0 +1,157 @@
+"""
+Position evaluation.
+
+Material plus piece-square tables, with a midgame and an endgame score that
+are blended by how much material is left (a tapered evaluation). Squares
+keeps both scores and the game phase up to date as pieces are put on and
+taken off it, so moving, capturing, castling, promoting and taking a move
+back all update them as they happen and nothing has to scan the board to
+score a position.
+
+The tables are from whites point of view, laid out like the board array
+(a8 first, h1 last). Black uses them flipped top to bottom.
+"""
+
+# Piece values in centipawns, (midgame, endgame).
+MATERIAL = {
+    'p': (100, 120), 'n': (320, 300), 'b': (330, 320), 'r': (500, 520),
+    'q': (900, 920), 'k': (0, 0),
+}
+
+# How much each piece counts towards it being the midgame, all of them
+# together make PHASE_TOTAL.
+PHASE = {'p': 0, 'n': 1, 'b': 1, 'r': 2, 'q': 4, 'k': 0}
+PHASE_TOTAL = 24
+
+# (midgame, endgame) bonuses by square.
+_PAWN = (
+    (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ), (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        80, 80, 80, 80, 80, 80, 80, 80,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        30, 30, 30, 30, 30, 30, 30, 30,
+        15, 15, 15, 15, 15, 15, 15, 15,
+        5, 5, 5, 5, 5, 5, 5, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+)
+_KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+_QUEEN = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+# The king hides behind its pawns in the midgame and comes out to the
+# middle in the endgame.
+_KING = (
+    (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ), (
+        -50, -40, -30, -20, -20, -30, -40, -50,
+        -30, -20, -10, 0, 0, -10, -20, -30,
+        -30, -10, 20, 30, 30, 20, -10, -30,
+        -30, -10, 30, 40, 40, 30, -10, -30,
+        -30, -10, 30, 40, 40, 30, -10, -30,
+        -30, -10, 20, 30, 30, 20, -10, -30,
+        -30, -30, 0, 0, 0, 0, -30, -30,
+        -50, -30, -30, -30, -30, -30, -30, -50,
+    ),
+)
+_TABLES = {
+    'p': _PAWN, 'n': (_KNIGHT, _KNIGHT), 'b': (_BISHOP, _BISHOP),
+    'r': (_ROOK, _ROOK), 'q': (_QUEEN, _QUEEN), 'k': _KING,
+}
+
+def _build(stage):
+    """
+    (black, letter) -> what a piece adds to whites score on each square,
+    with its material, for the midgame (stage 0) or endgame (stage 1).
+    """
+    scores = {}
+    for letter, tables in _TABLES.items():
+        value = MATERIAL[letter][stage]
+        table = tables[stage]
+        scores[False, letter] = [value + table[index] for index in range(64)]
+        scores[True, letter] = [-value - table[index ^ 56] for index in range(64)]
+    return scores
+
+MIDGAME = _build(0)
+ENDGAME = _build(1)
+
+def taper(midgame, endgame, phase):
+    """Blend the midgame and endgame scores by the game phase."""
+    phase = min(phase, PHASE_TOTAL)
+    return (midgame * phase + endgame * (PHASE_TOTAL - phase)) // PHASE_TOTAL
+
+def evaluate(board):
+    """
+    Score of board (a Squares) in centipawns from the side to move's point of
+    view, from the scores it keeps up to date.
+    """
+    score = taper(board.midgame, board.endgame, board.phase)
+    return -score if board.blackturn else score
+
+def fullevaluate(board):
+    """
+    The same as evaluate() but adding up every piece, to check the kept
+    scores against.
+    """
+    midgame = endgame = phase = 0
+    for black in (False, True):
+        for index, piece in board.pieces[black].items():
+            midgame += MIDGAME[black, piece.letter][index]
+            endgame += ENDGAME[black, piece.letter][index]
+            phase += PHASE[piece.letter]
+    score = taper(midgame, endgame, phase)
+    return -score if board.blackturn else score
@@ -0,0 +1,271 @@
+"""
+Game database, for finding the games in a game file (see gamefile.py) that
+reach a position and what was played from it.
+
+The index is a file of fixed size entries sorted by the Zobrist hash of
+every position of every game:
+    8 bytes   position hash (Squares.zobrist())
+    8 bytes   game offset in the game file << 16 | the move played next
+              (encodemove(), 0 if the game ended there)
+after a 16 byte header of INDEX_MAGIC and the size of the game file when it
+was indexed. Both files are memory mapped and looked up by binary search,
+so nothing is loaded into memory but the entries asked for.
+
+buildindex() sorts the entries in chunks written to temporary files which
+are then merged, so archives bigger than memory can be indexed.
+
+Usage:
+    python chess.py db index <games> [--plies N]
+    python chess.py db query <games> [fen] [--list N]
+"""
+
+import argparse
+import heapq
+import os
+import struct
+import tempfile
+
+import chess
+import gamefile
+
+INDEX_MAGIC = b'GIDX0001'
+INDEX_HEADER = struct.Struct('<8sQ')
+ENTRY = struct.Struct('<QQ')
+KEY = struct.Struct('<Q')
+# Entries sorted in memory at once while indexing, about 50MB.
+CHUNK = 1000000
+
+def indexpath(path):
+    """Where the index of the game file at path goes."""
+    return path + '.idx'
+
+def entries(record, plies=None):
+    """
+    The index entries of a game file record for its first plies moves (all
+    of them if None), each as one int, key << 64 | offset << 16 | next move,
+    which takes much less memory than a tuple and sorts the same.
+    """
+    offset, position, _, _, _, moves = record
+    board = chess.Squares.unpack(position)
+    if plies is not None:
+        moves = moves[:plies]
+    offset <<= 16
+    found = []
+    for code in moves:
+        found.append(board.zobrist() << 64 | offset | code)
+        board.makemove(*chess.decodemove(code))
+    found.append(board.zobrist() << 64 | offset)
+    return found
+
+def writeentries(file, sortedentries):
+    """Write sorted entries, leaving out repeats of the same one."""
+    pack = ENTRY.pack
+    last = None
+    block = []
+    for entry in sortedentries:
+        if entry == last:
+            # A game that comes back to a position with the same move next.
+            continue
+        last = entry
+        block.append(pack(entry >> 64, entry & 0xFFFFFFFFFFFFFFFF))
+        if len(block) >= 65536:
+            file.write(b''.join(block))
+            block = []
+    file.write(b''.join(block))
+
+def readentries(path):
+    """Yield the entries of a run file written by writeentries()."""
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(ENTRY.size * 65536)
+            if not block:
+                return
+            for key, value in ENTRY.iter_unpack(block):
+                yield key << 64 | value
+
+def buildindex(path, plies=None, chunk=CHUNK, progress=None):
+    """
+    Index the game file at path, writing indexpath(path).
+    plies: only index this many moves of each game, e.g. for an opening
+        index, all of them if None.
+    progress: called with the number of games indexed so far, now and then.
+    Returns (games, entries) indexed.
+    """
+    with open(path, 'rb') as file:
+        data = gamefile.mapfile(file)
+        size = len(data)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+            runs = []
+            pending = []
+            games = 0
+            for record in gamefile.records(data):
+                pending.extend(entries(record, plies))
+                games += 1
+                if len(pending) >= chunk:
+                    runs.append(writerun(directory, len(runs), pending))
+                    pending = []
+                if progress is not None and games % 10000 == 0:
+                    progress(games)
+            if data:
+                data.close()
+
+            output = indexpath(path)
+            with open(output + '.tmp', 'wb') as index:
+                index.write(INDEX_HEADER.pack(INDEX_MAGIC, size))
+                pending.sort()
+                if runs:
+                    runs.append(writerun(directory, len(runs), pending))
+                    merged = heapq.merge(*(readentries(run) for run in runs))
+                    writeentries(index, merged)
+                else:
+                    writeentries(index, pending)
+            os.replace(output + '.tmp', output)
+    count = (os.path.getsize(output) - INDEX_HEADER.size) // ENTRY.size
+    return games, count
+
+def writerun(directory, number, pending):
+    """Sort some entries and write them to a run file, returning its path."""
+    pending.sort()
+    path = os.path.join(directory, 'run{}'.format(number))
+    with open(path, 'wb') as file:
+        writeentries(file, pending)
+    return path
+
+class GameDatabase:
+    """
+    A game file and its index, opened for lookups.
+    Raises ValueError if the index is missing or older than the game file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.gamesfile = open(path, 'rb')
+        self.games = gamefile.mapfile(self.gamesfile)
+        try:
+            self.indexfile = open(indexpath(path), 'rb')
+        except FileNotFoundError:
+            self.close()
+            raise ValueError('{} has no index, build it first'.format(path))
+        self.index = gamefile.mapfile(self.indexfile)
+        magic, size = INDEX_HEADER.unpack_from(self.index, 0) \
+            if len(self.index) >= INDEX_HEADER.size else (None, None)
+        if magic != INDEX_MAGIC or size != len(self.games):
+            self.close()
+            raise ValueError('The index of {} is out of date'.format(path))
+        self.count = (len(self.index) - INDEX_HEADER.size) // ENTRY.size
+
+    def close(self):
+        for name in ('index', 'indexfile', 'games', 'gamesfile'):
+            thing = getattr(self, name, None)
+            if thing:
+                thing.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def key(self, number):
+        """The position hash of the entry number."""
+        return KEY.unpack_from(self.index, INDEX_HEADER.size + number * ENTRY.size)[0]
+
+    def lowerbound(self, key):
+        """The number of the first entry with a hash of at least key."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, position):
+        """
+        Yield the (game offset, next move code or 0) of every time a game
+        reached position, a Squares, FEN string or hash.
+        """
+        key = position
+        if isinstance(position, str):
+            key = chess.Squares.fromfen(position).zobrist()
+        elif isinstance(position, chess.Squares):
+            key = position.zobrist()
+        number = self.lowerbound(key)
+        start = INDEX_HEADER.size
+        while number < self.count:
+            found, value = ENTRY.unpack_from(self.index, start + number * ENTRY.size)
+            if found != key:
+                return
+            yield value >> 16, value & 0xFFFF
+            number += 1
+
+    def gamesreaching(self, position):
+        """The offsets of the games that reached position, in file order."""
+        return sorted({offset for offset, _ in self.lookup(position)})
+
+    def result(self, offset):
+        """The result of the game at offset, without loading it."""
+        return gamefile.RESULTS[self.games[offset + gamefile.HEADER.size - 3]]
+
+    def game(self, offset):
+        """Load the Game at offset."""
+        return gamefile.unpack(next(gamefile.records(self.games, offset)))
+
+    def movestats(self, position):
+        """
+        What was played from position: move name -> [games, white wins,
+        draws, black wins], most played first.
+        """
+        stats = {}
+        for offset, code in self.lookup(position):
+            if not code:
+                continue
+            counts = stats.setdefault(chess.movename(*chess.decodemove(code)), [0, 0, 0, 0])
+            counts[0] += 1
+            result = self.result(offset)
+            if result in ('1-0', '1/2-1/2', '0-1'):
+                counts[('1-0', '1/2-1/2', '0-1').index(result) + 1] += 1
+        return dict(sorted(stats.items(), key=lambda item: -item[1][0]))
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py db', description='Index and search game files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    index = commands.add_parser('index', help='build the index of a game file')
+    index.add_argument('games')
+    index.add_argument(
+        '--plies', type=int, help='only index the first moves of each game')
+    query = commands.add_parser('query', help='look up a position')
+    query.add_argument('games')
+    query.add_argument('fen', nargs='*', help='position (default: start)')
+    query.add_argument(
+        '--list', type=int, default=10, metavar='N',
+        help='show the first N games reaching it (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'index':
+        def progress(games):
+            print('{} games...'.format(games), end='\r', flush=True)
+
+        try:
+            games, count = buildindex(args.games, args.plies, progress=progress)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print('Indexed {} positions of {} games.'.format(count, games))
+        return 0
+
+    try:
+        database = GameDatabase(args.games)
+        position = chess.Squares.fromfen(
+            ' '.join(args.fen) if args.fen else chess.START_FEN)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    with database:
+        offsets = database.gamesreaching(position)
+        print('{} games reach {}'.format(len(offsets), position.fen()))
+        for name, (games, white, draws, black) in database.movestats(position).items():
+            print('  {:6} {:8} games  +{} ={} -{}'.format(name, games, white, draws, black))
+        for offset in offsets[:args.list]:
+            print('  game at {}: {}'.format(offset, database.result(offset)))
+    return 0
@@ -0,0 +1,117 @@
+"""
+Saving and loading games.
+
+Games are kept one after another in a binary file, so saving a game is just
+appending it. Each game is a fixed size header of
+    2 bytes   MAGIC
+    66 bytes  the starting position (Squares.pack())
+    2 bytes   halfmove clock at the start
+    2 bytes   fullmove number at the start
+    1 byte    result, its index in RESULTS
+    2 bytes   number of moves
+then 2 bytes for each move (chess.encodemove()), all little endian.
+
+Loading plays the moves straight onto the board (Game.replay()) without
+checking them again, which is much faster than playing them.
+"""
+
+from array import array
+import mmap
+import struct
+import sys
+
+import chess
+
+MAGIC = b'G1'
+HEADER = struct.Struct('<2s66sHHBH')
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+
+def pack(game):
+    """A Game as bytes."""
+    position, halfmove, fullmove = game.start
+    moves = array('H', game.moves)
+    if sys.byteorder == 'big':
+        moves.byteswap()
+    return HEADER.pack(
+        MAGIC, position, min(halfmove, 0xFFFF), min(fullmove, 0xFFFF),
+        RESULTS.index(game.result()), len(moves)) + moves.tobytes()
+
+def records(data, offset=0):
+    """
+    Read the games in data (bytes or an mmap of a game file) from offset,
+    without loading them. Yields (offset, position, halfmove, fullmove,
+    result, moves) for each, with the moves an array of encodemove() codes.
+    Raises ValueError if data isn't a run of games.
+    """
+    size = len(data)
+    while offset < size:
+        try:
+            magic, position, halfmove, fullmove, result, count = \
+                HEADER.unpack_from(data, offset)
+        except struct.error:
+            raise ValueError('Truncated game at offset {}'.format(offset))
+        start = offset + HEADER.size
+        end = start + count * 2
+        if magic != MAGIC or result >= len(RESULTS) or end > size:
+            raise ValueError('No game at offset {}'.format(offset))
+        moves = array('H')
+        moves.frombytes(data[start:end])
+        if sys.byteorder == 'big':
+            moves.byteswap()
+        yield offset, position, halfmove, fullmove, RESULTS[result], moves
+        offset = end
+
+def unpack(record, backend='list'):
+    """Make the Game of a record from records()."""
+    _, position, halfmove, fullmove, _, moves = record
+    board = chess.Squares.unpack(position)
+    board.halfmove = halfmove
+    board.fullmove = fullmove
+    game = chess.Game(backend=backend, board=board)
+    game.replay(moves)
+    return game
+
+def save(path, *games):
+    """Append games to the file at path."""
+    with open(path, 'ab') as file:
+        for game in games:
+            file.write(pack(game))
+
+def mapfile(file):
+    """A read only mmap of a whole open file, or b'' if it's empty."""
+    file.seek(0, 2)
+    if not file.tell():
+        return b''
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def load(path, backend='list'):
+    """Yield every Game in the file at path, in the order they were saved."""
+    with open(path, 'rb') as file:
+        data = mapfile(file)
+        try:
+            for record in records(data):
+                yield unpack(record, backend)
+        finally:
+            if data:
+                data.close()
+
+def loadgame(path, index=-1, backend='list'):
+    """
+    Load one Game from the file at path, by its position in the file
+    (-1 for the last). Raises IndexError if there's no such game.
+    """
+    with open(path, 'rb') as file:
+        data = mapfile(file)
+        try:
+            found = None
+            for number, record in enumerate(records(data)):
+                if number == index or index == -1:
+                    found = record
+                    if index != -1:
+                        break
+            if found is None:
+                raise IndexError('No game {} in {}'.format(index, path))
+            return unpack(found, backend)
+        finally:
+            if data:
+                data.close()
@@ -0,0 +1,197 @@
+"""
+Counting calls to the slow parts of playing a move and how long they take,
+to see where the time goes.
+
+Turned on by 'python chess.py --stats [FILE]', or by setting the CHESS_STATS
+environment variable (to 1, or to a FILE) for any command. When on, the
+methods in CATEGORIES are replaced by wrappers that count and time them;
+when off nothing is replaced, so it costs nothing.
+
+The time of a category is inclusive: it's the wall time from entering its
+first method to leaving it, so calls it makes to others of the same
+category are counted but not timed twice, while time spent in other
+categories is part of it too (checking legality generates moves, for
+instance). Only calls made in this process on its main thread are reliable.
+
+The game prints what happened since the last move after each move and a
+summary of the game at the end, and with a FILE everything is also saved
+there as JSON:
+    {"seconds": wall time, "total": {category: {"calls": n, "seconds": s}},
+     "moves": [{"move": "e2e4", "categories": {...}}, ...]}
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+
+import bitboard
+import chess
+
+# category -> (description, the (class, method name)s counted for it)
+CATEGORIES = {
+    'movegen': ('move generation', (
+        (chess.Piece, 'moves'), (chess.Piece, 'attacks'), (chess.Piece, 'walks'),
+        (chess.Pawn, 'moves'), (chess.Pawn, 'attacks'), (chess.Knight, 'moves'),
+        (chess.Knight, 'attacks'), (chess.King, 'moves'), (chess.King, 'castles'),
+        (bitboard.Position, 'pseudomoves'),
+    )),
+    'legality': ('legality checks', (
+        (chess.Piece, 'validmove'), (chess.Piece, 'kingchecked'), (chess.Piece, 'threats'),
+        (chess.Piece, 'legalmoves'), (chess.Piece, 'haslegalmove'),
+        (chess.Piece, 'movewillcheckownking'), (chess.Game, 'validmove'),
+        (chess.Game, 'legalmoves'), (bitboard.Position, 'legal'),
+        (bitboard.Position, 'legalmoves'),
+    )),
+    'mate': ('mate detection', (
+        (chess.Game, 'status'), (chess.Piece, 'checkmate'), (chess.Piece, 'stalemate'),
+        (bitboard.Position, 'checkmate'), (bitboard.Position, 'stalemate'),
+    )),
+    'display': ('displayboard', (
+        (chess.Board, 'displayboard'), (chess.Board, 'displayboardslow'),
+    )),
+}
+
+class Counter:
+    """The calls to a category, and the seconds spent in it."""
+
+    __slots__ = ('calls', 'seconds', 'depth')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # How many of the category's methods are running, to time only the
+        # outermost.
+        self.depth = 0
+
+COUNTERS = {category: Counter() for category in CATEGORIES}
+# (class, name, original method) of each method replaced.
+_replaced = []
+
+def _wrap(function, counter):
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def counted(*args, **kwargs):
+        counter.calls += 1
+        if counter.depth:
+            return function(*args, **kwargs)
+        counter.depth = 1
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter.seconds += perf_counter() - start
+            counter.depth = 0
+    return counted
+
+def enable():
+    """Start counting, if not already."""
+    if _replaced:
+        return
+    for category, (_, methods) in CATEGORIES.items():
+        for cls, name in methods:
+            # Only the classes that define the method, subclasses that
+            # inherit it get the wrapped one.
+            function = cls.__dict__.get(name)
+            if function is None:
+                continue
+            _replaced.append((cls, name, function))
+            setattr(cls, name, _wrap(function, COUNTERS[category]))
+
+def disable():
+    """Put the methods back as they were."""
+    while _replaced:
+        cls, name, function = _replaced.pop()
+        setattr(cls, name, function)
+
+def enabled():
+    return bool(_replaced)
+
+def snapshot():
+    """category -> (calls, seconds) so far."""
+    return {
+        category: (counter.calls, counter.seconds)
+        for category, counter in COUNTERS.items()
+    }
+
+def difference(after, before):
+    """What happened between two snapshots, as a JSON ready dict."""
+    return {
+        category: {
+            'calls': after[category][0] - before[category][0],
+            'seconds': after[category][1] - before[category][1],
+        }
+        for category in after
+    }
+
+def describe(counts):
+    """One line for a difference()."""
+    return ', '.join(
+        '{} {} calls {:.1f}ms'.format(
+            CATEGORIES[category][0], count['calls'], count['seconds'] * 1000)
+        for category, count in counts.items())
+
+class Recorder:
+    """
+    Turns counting on and keeps what happened in each move of a game.
+    path: where to save it as JSON, if anywhere.
+    """
+
+    def __init__(self, path=None):
+        enable()
+        self.path = path
+        self.start = self.last = snapshot()
+        self.started = time.perf_counter()
+        self.moves = []
+
+    def move(self, name):
+        """Note the end of a move, returning a line about it."""
+        now = snapshot()
+        counts = difference(now, self.last)
+        self.last = now
+        self.moves.append({'move': name, 'categories': counts})
+        return 'Stats {}: {}'.format(name, describe(counts))
+
+    def data(self):
+        return {
+            'seconds': time.perf_counter() - self.started,
+            'total': difference(snapshot(), self.start),
+            'moves': self.moves,
+        }
+
+    def summary(self):
+        """Lines about the game so far."""
+        data = self.data()
+        lines = ['Stats for {:.1f}s{}:'.format(
+            data['seconds'], ', {} moves'.format(len(self.moves)) if self.moves else '')]
+        for category, count in data['total'].items():
+            calls = count['calls']
+            lines.append('  {:16} {:10} calls {:10.1f}ms {:8.2f}us/call {:7.1f}%'.format(
+                CATEGORIES[category][0], calls, count['seconds'] * 1000,
+                count['seconds'] * 1e6 / calls if calls else 0,
+                count['seconds'] * 100 / data['seconds'] if data['seconds'] else 0))
+        return '\n'.join(lines)
+
+    def save(self):
+        """Write the JSON to path, if there is one."""
+        if not self.path:
+            return
+        with open(self.path, 'w') as file:
+            json.dump(self.data(), file, indent=1)
+
+    def finish(self, file=None):
+        """Print the summary and save the JSON."""
+        print(self.summary(), file=file or sys.stdout)
+        try:
+            self.save()
+        except OSError as e:
+            print('Could not save stats: {}'.format(e), file=sys.stderr)
+
+def fromenv(variable='CHESS_STATS'):
+    """A Recorder if the environment variable asks for one, else None."""
+    value = os.environ.get(variable, '')
+    if value in ('', '0'):
+        return None
+    return Recorder(None if value == '1' else value)
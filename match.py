@@ -0,0 +1,312 @@
+"""
+Self-play matches between two engine settings, for testing changes to the
+engine.
+
+Games start from a list of openings, each played twice with the colours
+swapped, and are shared out over a pool of processes. Each side has a
+clock (--tc seconds+increment) and loses if it runs out. Games end by the
+Game rules (checkmate, stalemate, threefold repetition, fifty moves), by an
+endgame tablebase result if one has been made, or as a draw at --maxplies.
+
+Every game is appended to a PGN file as soon as it's done, and after each
+one the running score, Elo difference and sequential probability ratio test
+(SPRT) are printed. Once the SPRT decides between the two Elo hypotheses
+(--elo0 and --elo1), the match stops.
+
+An engine is given as options separated by commas, e.g.
+    depth=3            search this deep a move (default: by the clock)
+    nodes=20000        search this many nodes a move
+    hash=16            transposition table megabytes
+    module=engine      the module to search with, which must have a bestmove()
+                       like engine.py's, e.g. a copy of engine.py being changed
+
+Usage:
+    python chess.py match [--first SPEC] [--second SPEC] [--openings FILE]
+        [--games N] [--tc 10+0.1] [--workers N] [--pgn FILE]
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import importlib
+import math
+import os
+import time
+
+import chess
+import pgn
+import tablebase
+import uci
+from transposition import TranspositionTable
+
+MAXPLIES = 400
+
+def parsespec(spec):
+    """Engine options from a spec like 'depth=3,hash=8', see the module docs."""
+    options = {'module': 'engine', 'hash': 16, 'depth': None, 'nodes': None}
+    for item in filter(None, spec.split(',')):
+        key, _, value = item.partition('=')
+        if key not in options:
+            raise ValueError('Unknown engine option ' + key)
+        options[key] = value if key == 'module' else int(value)
+    return options
+
+def parseclock(text):
+    """(seconds, increment) of a time control like '10+0.1', or None for 'none'."""
+    if text == 'none':
+        return None
+    seconds, _, increment = text.partition('+')
+    return float(seconds), float(increment or 0)
+
+def readopenings(path):
+    """
+    The FENs of the positions in a file: a PGN file's games played through,
+    or an EPD/FEN file with one position a line.
+    """
+    with open(path, encoding='utf-8', errors='replace') as file:
+        if path.lower().endswith('.pgn'):
+            openings = []
+            for tags, movetext in pgn.games(file):
+                game = chess.Game(fen=tags.get('FEN'))
+                for token in pgn.tokens(movetext):
+                    if token in pgn.RESULTS or not game.play(*pgn.parsesan(game, token)).legal:
+                        break
+                openings.append(game.fen())
+            return openings
+        openings = []
+        for line in file:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) < 6 or not (fields[4].isdigit() and fields[5].isdigit()):
+                fields = fields[:4] + ['0', '1']
+            fen = ' '.join(fields[:6])
+            chess.Squares.fromfen(fen)
+            openings.append(fen)
+        return openings
+
+def playgame(number, fen, white, black, clock, maxplies, tablebases):
+    """
+    Play one game between two engines, each a (name, options) pair.
+    Returns (number, PGN of the game, result for white).
+    """
+    tablebase.setdirectory(tablebases)
+    game = chess.Game(fen=fen)
+    blackfirst, fullmove = int(game.blackturn), game.board.fullmove
+    players = (white, black)
+    modules = [importlib.import_module(options['module']) for _, options in players]
+    tables = [TranspositionTable(options['hash']) for _, options in players]
+    left = [clock[0], clock[0]] if clock is not None else None
+    sans = []
+    termination = None
+    result = None
+    while game.outcome is None:
+        board = game.board
+        side = board.blackturn
+        found = tablebase.probe(board)
+        if found is not None:
+            winner, _ = found
+            result = '1/2-1/2' if not winner else ('1-0' if (winner > 0) != side else '0-1')
+            termination = 'tablebase'
+            break
+        if len(game.moves) >= maxplies:
+            result, termination = '1/2-1/2', 'move limit'
+            break
+        _, options = players[side]
+        movetime = None
+        if left is not None:
+            movetime = uci.budget({
+                'wtime': left[0] * 1000, 'btime': left[1] * 1000,
+                'winc': clock[1] * 1000, 'binc': clock[1] * 1000,
+            }, side)
+        start = time.perf_counter()
+        search = modules[side].bestmove(
+            board, movetime, options['nodes'], options['depth'], table=tables[side])
+        if left is not None:
+            left[side] -= time.perf_counter() - start
+            if left[side] < 0:
+                result = '0-1' if not side else '1-0'
+                termination = 'time forfeit'
+                break
+            left[side] += clock[1]
+        san = pgn.sanname(game, *search.best)
+        played = game.play(*search.best)
+        sans.append(san + ('#' if played.checkmate else '+' if played.check else ''))
+    if result is None:
+        result, termination = game.result(), game.outcome
+
+    # Number the moves from the opening's counters, '12...' for black first.
+    words = []
+    for ply, san in enumerate(sans, blackfirst):
+        if ply % 2 == 0:
+            words.append('{}.'.format(fullmove + ply // 2))
+        elif ply == blackfirst:
+            words.append('{}...'.format(fullmove))
+        words.append(san)
+    words.append(result)
+    tags = (
+        ('Event', 'match'), ('Round', str(number)), ('White', white[0]), ('Black', black[0]),
+        ('Result', result), ('FEN', fen), ('SetUp', '1'), ('Termination', termination),
+        ('PlyCount', str(len(sans))),
+    )
+    text = ''.join('[{} "{}"]\n'.format(key, value) for key, value in tags)
+    return number, text + '\n' + ' '.join(words) + '\n\n', result
+
+def elo(score):
+    """The Elo difference giving an expected score."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def expected(difference):
+    """The expected score of an Elo difference."""
+    return 1 / (1 + 10 ** (-difference / 400))
+
+class Stats:
+    """The first engine's wins, draws and losses, and what they say."""
+
+    def __init__(self, elo0=0, elo1=5, alpha=0.05, beta=0.05):
+        self.wins = self.draws = self.losses = 0
+        self.elo0, self.elo1 = elo0, elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def add(self, score):
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.5
+
+    def variance(self):
+        """The variance of the score of one game."""
+        games = self.games
+        if not games:
+            return 0
+        score = self.score()
+        return (self.wins + self.draws / 4) / games - score * score
+
+    def elo(self):
+        """(Elo difference, its 95% error margin)."""
+        score = self.score()
+        margin = 1.96 * math.sqrt(self.variance() / self.games) if self.games else 0
+        return elo(score), (elo(score + margin) - elo(score - margin)) / 2
+
+    def llr(self):
+        """
+        The log likelihood ratio of elo1 against elo0, approximated by a
+        normal distribution of the score as in the generalised SPRT.
+        """
+        variance = self.variance()
+        if not self.wins + self.losses or variance <= 0:
+            return 0.0
+        score0, score1 = expected(self.elo0), expected(self.elo1)
+        return (score1 - score0) * (2 * self.score() - score0 - score1) / (
+            2 * variance / self.games)
+
+    def verdict(self):
+        """'H1' if the first engine is at least elo1 stronger, 'H0' if not, None for undecided."""
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def line(self, elapsed):
+        difference, margin = self.elo()
+        return (
+            'Games {} +{} ={} -{} score {:.1f}% Elo {:.1f} +/- {:.1f} '
+            'LLR {:.2f} [{:.2f}, {:.2f}] {:.1f} games/min'.format(
+                self.games, self.wins, self.draws, self.losses, self.score() * 100,
+                difference, margin, self.llr(), self.lower, self.upper,
+                self.games * 60 / elapsed if elapsed else 0))
+
+def match(
+    first, second, openings, games, clock, workers, output, stats,
+    maxplies=MAXPLIES, report=print,
+):
+    """
+    Play games games between first and second, (name, options) pairs,
+    writing each to the open file output, until the games are done or
+    stats gives a verdict. Returns the verdict.
+    """
+    tablebases = tablebase.DIRECTORY
+
+    def task(number):
+        fen = openings[(number // 2) % len(openings)]
+        white, black = (first, second) if number % 2 == 0 else (second, first)
+        return number, fen, white, black, clock, maxplies, tablebases
+
+    start = time.perf_counter()
+    pending = set()
+    submitted = 0
+    verdict = None
+    with ProcessPoolExecutor(workers) as pool:
+        while pending or (submitted < games and verdict is None):
+            while submitted < games and verdict is None and len(pending) < workers * 2:
+                pending.add(pool.submit(playgame, *task(submitted)))
+                submitted += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, text, result = future.result()
+                output.write(text)
+                output.flush()
+                score = {'1-0': 1, '0-1': 0}.get(result, 0.5)
+                stats.add(score if number % 2 == 0 else 1 - score)
+                verdict = verdict or stats.verdict()
+                report(stats.line(time.perf_counter() - start))
+            if verdict is not None:
+                for future in pending:
+                    future.cancel()
+    return verdict
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py match', description='Play two engine settings against each other.')
+    parser.add_argument('--first', default='', help='engine options, e.g. depth=3,hash=8')
+    parser.add_argument('--second', default='', help='engine options')
+    parser.add_argument('--openings', help='EPD/FEN or PGN file (default: the start position)')
+    parser.add_argument('--games', type=int, default=1000, help='(default: %(default)s)')
+    parser.add_argument(
+        '--tc', default='10+0.1',
+        help="clock seconds+increment per game, 'none' for none (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pgn', default='match.pgn', help='where games go (default: %(default)s)')
+    parser.add_argument('--maxplies', type=int, default=MAXPLIES)
+    parser.add_argument('--elo0', type=float, default=0)
+    parser.add_argument('--elo1', type=float, default=5)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    try:
+        first = ('first ' + args.first).strip(), parsespec(args.first)
+        second = ('second ' + args.second).strip(), parsespec(args.second)
+        clock = parseclock(args.tc)
+        openings = readopenings(args.openings) if args.openings else [chess.START_FEN]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if clock is None and not any(options['depth'] or options['nodes'] for _, options in (first, second)):
+        parser.error('without a clock the engines need a depth or nodes limit')
+    if not openings:
+        parser.error('no openings in ' + args.openings)
+
+    stats = Stats(args.elo0, args.elo1, args.alpha, args.beta)
+    with open(args.pgn, 'a') as output:
+        verdict = match(
+            first, second, openings, args.games, clock, args.workers, output, stats,
+            args.maxplies)
+    if verdict == 'H1':
+        print('H1 accepted: {} is at least {} Elo stronger.'.format(first[0], args.elo1))
+    elif verdict == 'H0':
+        print('H0 accepted: {} is not {} Elo stronger.'.format(first[0], args.elo1))
+    else:
+        print('No verdict after {} games.'.format(stats.games))
+    return 0
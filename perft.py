@@ -0,0 +1,147 @@
+"""
+Perft, counting the leaf nodes of the move tree to a given depth.
+
+The moves come from the Piece classes (Piece.legalmoves) and are played
+with Squares.makemove() and unmakemove(), so comparing the counts against
+the known ones for some standard positions checks the move generator, and
+the nodes/second it reports tracks how fast it is.
+
+Usage:
+    python chess.py perft <depth> [fen] [--divide]
+    python chess.py perft --suite [--max-nodes N]
+"""
+
+import argparse
+import time
+
+import chess
+
+START = chess.START_FEN
+
+# (name, fen, node counts from depth 1), see
+# https://www.chessprogramming.org/Perft_Results
+POSITIONS = (
+    ('start', START, (20, 400, 8902, 197281, 4865609)),
+    ('kiwipete',
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        (48, 2039, 97862, 4085603)),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        (14, 191, 2812, 43238, 674624)),
+    ('position 4',
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        (6, 264, 9467, 422333)),
+    ('position 5',
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        (44, 1486, 62379, 2103487)),
+    ('position 6',
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        (46, 2079, 89890, 3894594)),
+)
+
+def promotions(board, curr, to):
+    """What the move can promote to, (None,) if it isn't a promotion."""
+    piece = board[curr]
+    if piece.name == 'pawn' and (to < 8 or to > 55):
+        return chess.PROMOTIONS
+    return (None,)
+
+def perft(board, black, depth):
+    """Count the leaf nodes depth moves on from board, black to move."""
+    if depth == 0:
+        return 1
+
+    king = board[board.kings[black]]
+    nodes = 0
+    for curr, to in king.legalmoves(board, black):
+        for promotion in promotions(board, curr, to):
+            if depth == 1:
+                nodes += 1
+                continue
+            board.makemove(curr, to, promotion)
+            nodes += perft(board, not black, depth - 1)
+            board.unmakemove()
+    return nodes
+
+def divide(board, black, depth):
+    """Get (move name, leaf nodes) for every move at the root."""
+    king = board[board.kings[black]]
+    counts = []
+    for curr, to in king.legalmoves(board, black):
+        for promotion in promotions(board, curr, to):
+            board.makemove(curr, to, promotion)
+            nodes = perft(board, not black, depth - 1)
+            board.unmakemove()
+            counts.append((chess.movename(curr, to, promotion), nodes))
+    return counts
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def rate(nodes, elapsed):
+    return '{} nodes in {:.2f}s, {:.0f} nodes/s'.format(
+        nodes, elapsed, nodes / elapsed if elapsed else 0)
+
+def suite(maxnodes):
+    """
+    Check every reference position to the deepest depth with at most
+    maxnodes nodes. Returns the number of wrong counts.
+    """
+    failures = 0
+    totalnodes = 0
+    totaltime = 0.0
+    for name, fen, counts in POSITIONS:
+        board = chess.Board()
+        board.setfen(fen)
+        for depth, expected in enumerate(counts, 1):
+            if expected > maxnodes:
+                break
+            nodes, elapsed = timed(perft, board.board, board.blackturn, depth)
+            totalnodes += nodes
+            totaltime += elapsed
+            status = 'ok' if nodes == expected else 'FAIL, expected {}'.format(expected)
+            if nodes != expected:
+                failures += 1
+            print('{:12} depth {}: {:9} {:.2f}s {}'.format(
+                name, depth, nodes, elapsed, status))
+    print('Total: ' + rate(totalnodes, totaltime))
+    print('{} failures'.format(failures))
+    return failures
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py perft', description='Count move tree leaf nodes.')
+    parser.add_argument('depth', type=int, nargs='?')
+    parser.add_argument('fen', nargs='*', help='position (default: start)')
+    parser.add_argument(
+        '--divide', action='store_true', help='show the count for each move')
+    parser.add_argument(
+        '--suite', action='store_true',
+        help='check the counts of the reference positions')
+    parser.add_argument(
+        '--max-nodes', type=int, default=100000,
+        help='deepest suite depth to run, by node count (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 1 if suite(args.max_nodes) else 0
+    if args.depth is None:
+        parser.error('a depth or --suite is needed')
+
+    board = chess.Board()
+    try:
+        board.setfen(' '.join(args.fen) if args.fen else START)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.divide:
+        counts, elapsed = timed(divide, board.board, board.blackturn, args.depth)
+        for name, nodes in counts:
+            print('{}: {}'.format(name, nodes))
+        print('Moves: {}'.format(len(counts)))
+        nodes = sum(nodes for _, nodes in counts)
+    else:
+        nodes, elapsed = timed(perft, board.board, board.blackturn, args.depth)
+    print(rate(nodes, elapsed))
+    return 0
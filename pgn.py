@@ -0,0 +1,132 @@
+"""
+Reading games in PGN (Portable Game Notation).
+
+games() reads a file a game at a time, so files of any size can be read in
+constant memory. tokens() picks the moves out of a game's movetext and
+parsesan() finds the move of a Game that one names in standard algebraic
+notation (SAN), e.g. 'Nbd7', 'exd6', 'O-O' or 'e8=Q+'. sanname() names a move
+in SAN.
+"""
+
+import re
+
+import chess
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variations are taken out separately as they nest.
+COMMENT = re.compile(r'\{[^}]*\}|;[^\n]*')
+MOVENUMBER = re.compile(r'^\d+\.+')
+SAN = re.compile(
+    r'^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+
+def games(file):
+    """
+    Yield (tags, movetext) for each game in an open PGN file, tags being a
+    dict of the tag pairs.
+    """
+    tags = {}
+    movetext = []
+    for line in file:
+        line = line.strip()
+        if line.startswith('%'):
+            continue
+        if line.startswith('['):
+            if movetext:
+                yield tags, ' '.join(movetext)
+                tags, movetext = {}, []
+            match = TAG.match(line)
+            if match:
+                tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif line:
+            movetext.append(line)
+    if tags or movetext:
+        yield tags, ' '.join(movetext)
+
+def tokens(movetext):
+    """The SAN moves and result of movetext, without comments or variations."""
+    movetext = COMMENT.sub(' ', movetext)
+    # Take out variations, innermost first.
+    depth = 0
+    kept = []
+    for char in movetext:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif not depth:
+            kept.append(char)
+    for token in ''.join(kept).split():
+        token = MOVENUMBER.sub('', token)
+        if token and not token.startswith('$'):
+            yield token
+
+def parsesan(game, san):
+    """
+    The (from, to, promotion class or None) a SAN move in a Game names.
+    Raises ValueError saying why if it can't be found. The move is only
+    checked to be legal when that's needed to tell two pieces apart, as
+    Game.play() checks it anyway.
+    """
+    text = san.rstrip('+#!?')
+    board = game.board
+    black = board.blackturn
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        curr = board.kings[black]
+        return curr, curr + (2 if len(text) == 3 else -2), None
+
+    match = SAN.match(text)
+    if match is None:
+        raise ValueError('not a move')
+    letter, fromfile, fromrank, _, square, promotion = match.groups()
+    letter = (letter or 'p').lower()
+    to = chess.squareindex(square)
+    coords = to % 8, to // 8
+    found = [
+        curr for curr, piece in board.pieces[black].items()
+        if piece.letter == letter and
+        (fromfile is None or chess.squarename(curr)[0] == fromfile) and
+        (fromrank is None or chess.squarename(curr)[1] == fromrank) and
+        coords in piece.moves(board, curr)
+    ]
+    if len(found) > 1:
+        # SAN only tells apart pieces which can legally move there.
+        found = [curr for curr in found if board[curr].validmove(board, curr, to)]
+    if not found:
+        raise ValueError('illegal move')
+    if len(found) > 1:
+        raise ValueError('ambiguous move')
+    promotes = letter == 'p' and (to < 8 or to > 55)
+    if promotes != (promotion is not None):
+        raise ValueError('promotion needed' if promotes else 'not a promotion')
+    return found[0], to, promotion and chess.PIECES[promotion.lower()]
+
+def sanname(game, curr, to, promotion=None):
+    """The SAN of a legal move in a Game, without any check sign."""
+    board = game.board
+    piece = board[curr]
+    if piece.name == 'king' and abs(curr - to) == 2:
+        return 'O-O' if to > curr else 'O-O-O'
+    capture = board[to] is not None or (piece.name == 'pawn' and curr % 8 != to % 8)
+    if piece.name == 'pawn':
+        name = chess.squarename(curr)[0] + 'x' if capture else ''
+        name += chess.squarename(to)
+        if promotion is not None:
+            name += '=' + promotion.letter.upper()
+        return name
+
+    others = [
+        move[0] for move in game.legalmoves()
+        if move[1] == to and move[0] != curr and board[move[0]].letter == piece.letter
+    ]
+    name = piece.letter.upper()
+    square = chess.squarename(curr)
+    if others:
+        if all(chess.squarename(other)[0] != square[0] for other in others):
+            name += square[0]
+        elif all(chess.squarename(other)[1] != square[1] for other in others):
+            name += square[1]
+        else:
+            name += square
+    return name + ('x' if capture else '') + chess.squarename(to)
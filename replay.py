@@ -0,0 +1,128 @@
+"""
+Replaying PGN files, checking every move of every game.
+
+Games are read one at a time (pgn.games()) and handed out in chunks to a
+pool of processes which replay them. The line for each game is written as
+soon as its chunk is done, in the order of the file. Only a few chunks are
+out at once, so memory use stays flat however big the files are.
+
+Each game gets one line, either
+    <number> ok <plies> <result> <final FEN>
+or
+    <number> invalid ply <ply> <move>: <reason>, <FEN before the move>
+
+Usage:
+    python chess.py replay <pgn files, - for stdin> [--workers N] [--chunk N]
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import time
+
+import chess
+import pgn
+
+def replaygame(number, tags, movetext):
+    """Replay one game, returning (valid, its line)."""
+    try:
+        game = chess.Game(fen=tags.get('FEN'))
+    except ValueError as e:
+        return False, '{} invalid ply 0 -: {}'.format(number, e)
+    for token in pgn.tokens(movetext):
+        if token in pgn.RESULTS:
+            break
+        ply = len(game.moves) + 1
+        try:
+            result = game.play(*pgn.parsesan(game, token))
+            reason = result.reason
+        except ValueError as e:
+            reason = str(e)
+        if reason is not None:
+            return False, '{} invalid ply {} {}: {}, {}'.format(
+                number, ply, token, reason, game.fen())
+    return True, '{} ok {} {} {}'.format(
+        number, len(game.moves), tags.get('Result', game.result()), game.fen())
+
+def replaychunk(chunk):
+    """Replay a list of (number, tags, movetext) games."""
+    return [replaygame(*game) for game in chunk]
+
+def readgames(paths):
+    """Yield (number, tags, movetext) for the games in every file."""
+    number = 0
+    for path in paths:
+        if path == '-':
+            file = sys.stdin
+        else:
+            file = open(path, encoding='utf-8', errors='replace')
+        try:
+            for tags, movetext in pgn.games(file):
+                number += 1
+                yield number, tags, movetext
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+def chunks(games, size):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def replay(paths, workers=1, size=100):
+    """
+    Yield (valid, line) for every game of the PGN files at paths, in order.
+    workers: processes to replay with, or 1 to replay in this one.
+    size: games to a chunk.
+    """
+    games = chunks(readgames(paths), size)
+    if workers == 1:
+        for chunk in games:
+            yield from replaychunk(chunk)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in games:
+            pending.append(pool.submit(replaychunk, chunk))
+            # Keep every worker busy with one chunk waiting, but no more.
+            if len(pending) > workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py replay', description='Check every move of PGN games.')
+    parser.add_argument('pgn', nargs='+', help='PGN files, - for stdin')
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='processes to replay with (default: %(default)s)')
+    parser.add_argument(
+        '--chunk', type=int, default=100,
+        help='games handed to a process at once (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunk < 1:
+        parser.error('--workers and --chunk must be at least 1')
+
+    counts = [0, 0]
+    start = time.perf_counter()
+    try:
+        for valid, line in replay(args.pgn, args.workers, args.chunk):
+            counts[valid] += 1
+            print(line)
+    except OSError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    games = sum(counts)
+    print('{} games, {} valid, {} invalid, {:.0f} games/s'.format(
+        games, counts[True], counts[False], games / elapsed if elapsed else 0),
+        file=sys.stderr)
+    return 1 if counts[False] else 0
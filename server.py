@@ -0,0 +1,399 @@
+"""
+Network play: an asyncio server for many games at once, speaking a line
+protocol over TCP (try it with telnet or nc).
+
+A client sends one command a line:
+    play [name]     join the game called name, or start it and wait for an
+                    opponent. The first to join plays white. Without a name
+                    the client is paired with the next to do the same, in a
+                    game named like game1 (names kept for such games).
+    watch name      follow a game without playing in it
+    move <move>     play a move named like 'e2e4' or 'e7e8q'
+    quit
+and is sent
+    joined <name> white|black|spectator
+    start <fen>             the game has both players (or the position so
+                            far, for a spectator joining late)
+    moved <move> <fen>      a move was played, to the players and spectators
+    illegal <move> <reason> the move sent wasn't played, to its player only
+    over <result> <outcome> and the game is finished
+    error <message>
+
+The games are Game objects held by a few shard processes, each game living
+in one, so checking moves (the slow part) never holds up the event loop and
+is spread over the processor's cores. The server and the shards talk over
+socket pairs with length prefixed pickles.
+
+Usage:
+    python chess.py serve [--host HOST] [--port PORT] [--shards N]
+"""
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import struct
+import sys
+import threading
+
+import chess
+
+PORT = 8765
+FRAME = struct.Struct('<I')
+# Bytes waiting to be sent to a spectator before it's dropped for being
+# too slow to keep up.
+BACKLOG = 1 << 20
+# 'play' without a name pairs clients into games named this and a number,
+# which can't be played by name so they never clash with named games.
+AUTONAME = 'game'
+
+def autonamed(name):
+    return name.startswith(AUTONAME) and name[len(AUTONAME):].isdigit()
+
+def _shardcommand(games, command, name, *args):
+    """Carry out one request on a shard's games, returning the reply."""
+    if command == 'new':
+        games[name] = chess.Game(fen=args[0])
+        return games[name].fen(),
+    if command == 'drop':
+        games.pop(name, None)
+        return ()
+    movename, black = args
+    game = games[name]
+    if game.outcome is None and game.blackturn != black:
+        return False, 'not your turn'
+    result = game.move(movename)
+    if not result.legal:
+        return False, result.reason
+    outcome = game.outcome
+    if outcome is not None:
+        del games[name]
+    return True, result.move, game.fen(), outcome, game.result()
+
+def _orphaned():
+    """Exit once the server process has gone, however it went."""
+    multiprocessing.parent_process().join()
+    os._exit(0)
+
+def _shard(sock):
+    """A shard process, answering requests until the server goes away."""
+    threading.Thread(target=_orphaned, daemon=True).start()
+    games = {}
+    file = sock.makefile('rb')
+    while True:
+        header = file.read(FRAME.size)
+        if len(header) < FRAME.size:
+            return
+        number, request = pickle.loads(file.read(FRAME.unpack(header)[0]))
+        try:
+            reply = _shardcommand(games, *request)
+        except (KeyError, ValueError) as e:
+            reply = None, str(e)
+        data = pickle.dumps((number, reply))
+        sock.sendall(FRAME.pack(len(data)) + data)
+
+class Shards:
+    """The shard processes, and the requests sent to them awaiting replies."""
+
+    def __init__(self, count):
+        self.count = count
+        self.processes = []
+        self.writers = []
+        self.readers = []
+        # Each shard's requests awaiting replies, by number.
+        self.waiting = [{} for _ in range(count)]
+        # The shards whose processes have died.
+        self.dead = set()
+        self.numbers = itertools.count()
+
+    async def start(self):
+        # Spawned rather than forked, so a shard holds no copies of the
+        # server's sockets (the other shards' included) and sees the end of
+        # its own when the server goes away.
+        context = multiprocessing.get_context('spawn')
+        for shard in range(self.count):
+            ours, theirs = socket.socketpair()
+            process = context.Process(target=_shard, args=(theirs,), daemon=True)
+            process.start()
+            theirs.close()
+            reader, writer = await asyncio.open_connection(sock=ours)
+            self.processes.append(process)
+            self.writers.append(writer)
+            self.readers.append(asyncio.ensure_future(self.replies(shard, reader)))
+
+    async def replies(self, shard, reader):
+        """Hand the replies from a shard to whoever is waiting for them."""
+        waiting = self.waiting[shard]
+        try:
+            while True:
+                header = await reader.readexactly(FRAME.size)
+                number, reply = pickle.loads(await reader.readexactly(FRAME.unpack(header)[0]))
+                future = waiting.pop(number)
+                if not future.done():
+                    future.set_result(reply)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.dead.add(shard)
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('a shard process died'))
+            waiting.clear()
+
+    async def request(self, command, name, *args):
+        """
+        Send a request about the game name to its shard and wait for the reply.
+        Raises ConnectionError if the shard has died.
+        """
+        shard = hash(name) % self.count
+        if shard in self.dead:
+            raise ConnectionError('a shard process died')
+        number = next(self.numbers)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[shard][number] = future
+        data = pickle.dumps((number, (command, name) + args))
+        writer = self.writers[shard]
+        writer.write(FRAME.pack(len(data)) + data)
+        await writer.drain()
+        return await future
+
+    async def close(self):
+        for writer in self.writers:
+            writer.close()
+        for reader in self.readers:
+            reader.cancel()
+        # The shards finish when their sockets close.
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+class Match:
+    """A game on the server: its players, spectators and where it's got to."""
+
+    def __init__(self, name):
+        self.name = name
+        # The white and black players' writers.
+        self.players = [None, None]
+        self.spectators = set()
+        self.fen = None
+        self.over = False
+
+    def send(self, line):
+        """Send a line to the players and spectators."""
+        data = (line + '\n').encode()
+        for writer in self.players:
+            if writer is not None:
+                writer.write(data)
+        for writer in list(self.spectators):
+            if writer.transport.get_write_buffer_size() > BACKLOG:
+                self.spectators.discard(writer)
+                writer.close()
+            else:
+                writer.write(data)
+
+class Server:
+    """
+    The state of the server: the matches by name, and the one waiting for a
+    second player from 'play' without a name, if any.
+    """
+
+    def __init__(self, shards=1, fen=None):
+        self.shards = Shards(shards)
+        self.fen = fen
+        self.matches = {}
+        self.waiting = None
+        self.names = itertools.count(1)
+        self.connections = 0
+        self.moves = 0
+
+    async def start(self, host, port):
+        await self.shards.start()
+        return await asyncio.start_server(
+            self.connection, host, port, limit=1024, backlog=4096)
+
+    async def close(self):
+        await self.shards.close()
+
+    async def connection(self, reader, writer):
+        """Serve one client until it quits or goes away."""
+        self.connections += 1
+        # The match the client is in and its colour, None for a spectator.
+        match = black = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                words = line.decode(errors='replace').split()
+                if not words:
+                    continue
+                command, args = words[0].lower(), words[1:]
+                if command == 'quit':
+                    break
+                if command in ('play', 'watch'):
+                    if match is not None:
+                        reply(writer, 'error already in {}'.format(match.name))
+                    elif command == 'play':
+                        match, black = await self.join(writer, args[0] if args else None)
+                    elif args:
+                        match = self.watch(writer, args[0])
+                    else:
+                        reply(writer, 'error watch which game?')
+                elif command == 'move' and len(args) == 1:
+                    if match is None or black is None:
+                        reply(writer, 'error not playing a game')
+                    else:
+                        await self.move(match, black, writer, args[0])
+                else:
+                    reply(writer, 'error unknown command {}'.format(command))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping, the shards are going too.
+            match = None
+        finally:
+            self.connections -= 1
+            if match is not None:
+                await self.leave(match, writer)
+            writer.close()
+
+    async def join(self, writer, name):
+        """Put a player in a match, starting it if it's full. Returns (match, black)."""
+        if name is None:
+            if self.waiting is None:
+                self.waiting = match = Match(AUTONAME + str(next(self.names)))
+                self.matches[match.name] = match
+            else:
+                match, self.waiting = self.waiting, None
+        elif autonamed(name):
+            reply(writer, 'error {} is kept for paired games'.format(name))
+            return None, None
+        else:
+            match = self.matches.setdefault(name, Match(name))
+        if None not in match.players or match.over:
+            reply(writer, 'error {} is full'.format(match.name))
+            return None, None
+        black = match.players[0] is not None
+        match.players[black] = writer
+        reply(writer, 'joined {} {}'.format(match.name, 'black' if black else 'white'))
+        if None not in match.players:
+            (match.fen,) = await self.shards.request('new', match.name, self.fen)
+            match.send('start ' + match.fen)
+        return match, black
+
+    def watch(self, writer, name):
+        match = self.matches.get(name)
+        if match is None:
+            reply(writer, 'error no game {}'.format(name))
+            return None
+        match.spectators.add(writer)
+        reply(writer, 'joined {} spectator'.format(name))
+        if match.fen is not None:
+            reply(writer, 'start ' + match.fen)
+        return match
+
+    async def move(self, match, black, writer, name):
+        if match.fen is None or match.over:
+            reply(writer, 'illegal {} the game {}'.format(
+                name, 'is over' if match.over else "hasn't started"))
+            return
+        found = await self.shards.request('move', match.name, name, black)
+        if not found[0]:
+            reply(writer, 'illegal {} {}'.format(name, found[1]))
+            return
+        _, played, match.fen, outcome, result = found
+        self.moves += 1
+        match.send('moved {} {}'.format(played, match.fen))
+        if outcome is not None:
+            match.over = True
+            match.send('over {} {}'.format(result, outcome))
+            self.matches.pop(match.name, None)
+
+    async def leave(self, match, writer):
+        """Take a client out of its match, ending it if it was a player."""
+        match.spectators.discard(writer)
+        if writer not in match.players:
+            return
+        match.players[match.players.index(writer)] = None
+        if match is self.waiting:
+            self.waiting = None
+        if not match.over:
+            match.over = True
+            if match.fen is not None:
+                match.send('over * abandoned')
+                try:
+                    await self.shards.request('drop', match.name)
+                except (ConnectionError, asyncio.CancelledError):
+                    # The shard died, or the server is stopping and it's going too.
+                    pass
+        if match.players == [None, None]:
+            self.matches.pop(match.name, None)
+
+def reply(writer, line):
+    writer.write((line + '\n').encode())
+
+def raiselimit():
+    """Allow as many open sockets as the system will, for thousands of games."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def serve(host, port, shards, fen=None, ready=None):
+    """Run a server until cancelled. ready: called with the port once listening."""
+    server = Server(shards, fen)
+    listener = await server.start(host, port)
+    # Stop the same way for SIGTERM as for Ctrl-C, so the shards are closed.
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    if ready is not None:
+        ready(listener.sockets[0].getsockname()[1])
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py serve', description='Host games over the network.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT, help='(default: %(default)s, 0 for any)')
+    parser.add_argument(
+        '--shards', type=int, default=os.cpu_count() or 1,
+        help='processes checking moves (default: %(default)s)')
+    parser.add_argument('--fen', help='position games start from')
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error('--shards must be at least 1')
+    if args.fen is not None:
+        try:
+            chess.Squares.fromfen(args.fen)
+        except ValueError as e:
+            parser.error(str(e))
+    raiselimit()
+
+    def ready(port):
+        print('Listening on {}:{}'.format(args.host, port), flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.shards, args.fen, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,184 @@
+"""
+Art styles for the pieces, loaded from files so the board can be drawn with
+different art and at different tile sizes.
+
+A style file is text like
+    # Comments and blank lines between sections are skipped.
+    width 10
+    height 5
+    squares ' ' ':'
+    [white pawn]
+    ~~~~~~~~~~
+    ~~~~()~~~~
+    ...
+with a section for each colour and piece, of height lines of art each (short
+lines are padded with ~). ~ is where the square shows through, and squares
+gives the light and dark square characters (' ' and ':' if not given).
+
+A style is compiled into a Style, the ready made rows of every piece on both
+square colours, which is all the Renderer needs to join up frames. Compiled
+styles are cached in CACHE as JSON named by a hash of the file, so a style is
+only ever compiled once and changing the file makes a new one.
+
+The styles in DIRECTORY can be picked by name: 'python chess.py --style small'.
+"""
+
+import hashlib
+import json
+import os
+import shlex
+
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles')
+CACHE = os.path.join(DIRECTORY, '.cache')
+# Changing how styles are compiled changes this so old caches aren't used.
+FORMAT = 1
+COLOURS = ('white', 'black')
+NAMES = ('pawn', 'rook', 'knight', 'bishop', 'queen', 'king')
+BACKGROUNDS = (' ', ':')
+
+class Style:
+    """
+    A compiled style.
+    tiles: (black, name, dark) -> tuple of row strings.
+    blanks: the rows of an empty light and dark square.
+    """
+
+    def __init__(self, width, height, tiles, blanks):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.blanks = blanks
+
+    @classmethod
+    def fromart(cls, art, width, height, backgrounds=BACKGROUNDS):
+        """
+        Compile art, colour -> piece name -> its rows joined into one
+        ~-masked string.
+        """
+        tiles = {}
+        for colour, pieces in art.items():
+            for name, drawing in pieces.items():
+                for dark, bg in enumerate(backgrounds):
+                    tiles[colour == 'black', name, dark] = tuple(
+                        drawing[y * width:(y + 1) * width].replace('~', bg)
+                        for y in range(height)
+                    )
+        blanks = tuple((bg * width,) * height for bg in backgrounds)
+        return cls(width, height, tiles, blanks)
+
+    def todict(self):
+        """The style as JSON can hold it."""
+        return {
+            'format': FORMAT,
+            'width': self.width,
+            'height': self.height,
+            'tiles': [[black, name, dark, rows] for (black, name, dark), rows in self.tiles.items()],
+            'blanks': self.blanks,
+        }
+
+    @classmethod
+    def fromdict(cls, data):
+        if data.get('format') != FORMAT:
+            raise ValueError('style cache is from another version')
+        tiles = {(black, name, dark): tuple(rows) for black, name, dark, rows in data['tiles']}
+        blanks = tuple(tuple(rows) for rows in data['blanks'])
+        return cls(data['width'], data['height'], tiles, blanks)
+
+def parse(text, path='style'):
+    """
+    Read a style file's text, returning (art, width, height, backgrounds)
+    for Style.fromart(). Raises ValueError if it can't be read.
+    """
+    settings = {'width': None, 'height': None}
+    backgrounds = BACKGROUNDS
+    art = {colour: {} for colour in COLOURS}
+    lines = text.splitlines()
+    number = 0
+
+    def fail(message):
+        raise ValueError('{} line {}: {}'.format(path, number, message))
+
+    while number < len(lines):
+        line = lines[number].rstrip('\n')
+        number += 1
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        if stripped.startswith('['):
+            words = stripped.strip('[]').split()
+            if len(words) != 2 or words[0] not in COLOURS or words[1] not in NAMES:
+                fail('expected [colour piece], e.g. [white pawn]')
+            width, height = settings['width'], settings['height']
+            if width is None or height is None:
+                fail('width and height must come before the pieces')
+            rows = lines[number:number + height]
+            if len(rows) < height:
+                fail('{} needs {} lines of art'.format(stripped, height))
+            for offset, row in enumerate(rows):
+                if len(row) > width:
+                    number += offset + 1
+                    fail('art is wider than {}'.format(width))
+            art[words[0]][words[1]] = ''.join(row.ljust(width, '~') for row in rows)
+            number += height
+            continue
+        try:
+            words = shlex.split(line, posix=True)
+        except ValueError as e:
+            fail(str(e))
+        if words[0] in settings and len(words) == 2 and words[1].isdigit() and int(words[1]) > 0:
+            settings[words[0]] = int(words[1])
+        elif words[0] == 'squares' and len(words) == 3 and all(len(word) == 1 for word in words[1:]):
+            backgrounds = tuple(words[1:])
+        else:
+            fail("expected 'width N', 'height N', \"squares ' ' ':'\" or a [colour piece]")
+
+    missing = [
+        '{} {}'.format(colour, name)
+        for colour in COLOURS for name in NAMES if name not in art[colour]]
+    if missing:
+        raise ValueError('{} has no art for {}'.format(path, ', '.join(missing)))
+    return art, settings['width'], settings['height'], backgrounds
+
+def stylepath(name):
+    """The file of a style name in DIRECTORY, or name if it's a file itself."""
+    if os.path.isfile(name):
+        return name
+    return os.path.join(DIRECTORY, name + '.txt')
+
+def available():
+    """The names of the styles in DIRECTORY."""
+    try:
+        return sorted(name[:-4] for name in os.listdir(DIRECTORY) if name.endswith('.txt'))
+    except OSError:
+        return []
+
+def load(name, cache=CACHE):
+    """
+    The Style of a style name or file, compiled or from the cache.
+    Raises OSError if it can't be read and ValueError if it isn't a style.
+    """
+    path = stylepath(name)
+    with open(path, 'rb') as file:
+        data = file.read()
+    key = hashlib.sha256(b'%d\n' % FORMAT + data).hexdigest()
+    cached = os.path.join(cache, key + '.json')
+    try:
+        with open(cached) as file:
+            return Style.fromdict(json.load(file))
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise ValueError('{}: {}'.format(path, e))
+    style = Style.fromart(*parse(text, path))
+    # A style can still be used where the cache can't be written.
+    try:
+        os.makedirs(cache, exist_ok=True)
+        with open(cached + '.tmp', 'w') as file:
+            json.dump(style.todict(), file)
+        os.replace(cached + '.tmp', cached)
+    except OSError:
+        pass
+    return style
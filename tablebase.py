@@ -0,0 +1,716 @@
+"""
+Endgame tablebases, giving the distance to mate of every position with a
+few pieces (KQK, KRK, KPK, KQKR, ...) so they're played perfectly without
+searching.
+
+A table holds one byte for every way of putting its pieces on the board
+with either side to move, numbered by
+    index = black to move << 6n | square of piece 0 << 6(n-1) | ... | square of piece n-1
+the pieces being white's then black's, each king first then by ORDER, as in
+the table's name. A byte is
+    0         draw
+    1 - 254   1 + the number of plies to mate, odd for the side to move
+              winning and even (0 being checkmated now) for it losing
+    255       the position can't happen
+so a four piece table is 32MB. Positions with castling rights or an en
+passant capture to be made aren't in the tables.
+
+The tables are made by retrograde analysis: every checkmate is found, then
+the positions that can move to one (mate in 1), then those whose every
+move leads to those (mated in 2), and so on until nothing changes. Moves
+that take a piece or promote leave the table for a smaller one, which is
+made first. With NumPy this is done a whole table at a time, without it one
+position at a time with the counting of moves spread over processes.
+
+The tables are saved to DIRECTORY and memory mapped when probed.
+
+Usage:
+    python chess.py tablebase generate <tables, e.g. KQK KRK KQKR> [--dir DIR] [--workers N]
+    python chess.py tablebase probe [fen] [--dir DIR]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+from attacks import ATTACKS, BETWEEN, PAWN_TAKES, RAYS
+import chess
+import gamefile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Where tables are saved and probed.
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+# The most pieces a table can have, kings included.
+PIECES = 4
+# The order of the pieces of a side in a table's name.
+ORDER = 'kqrbnp'
+ILLEGAL = 255
+# Longest mate a byte can hold, in plies.
+LONGEST = 253
+# Positions given to a process at a time without NumPy.
+CHUNK = 1 << 16
+
+def split(name):
+    """The white and black letters of a table name, e.g. 'KQKR' -> ('KQ', 'KR')."""
+    king = name.upper().find('K', 1)
+    if not name.upper().startswith('K') or king < 0:
+        raise ValueError('{} is not a table name'.format(name))
+    return name[:king].upper(), name[king:].upper()
+
+def canonical(white, black):
+    """
+    The name of the table for white and black's pieces (letters in any
+    order), and whether the colours have to be swapped to look it up, the
+    stronger side always being white.
+    """
+    def strength(letters):
+        return len(letters), sorted(-ORDER.index(letter) for letter in letters.lower())
+
+    def ordered(letters):
+        return ''.join(sorted(letters.upper(), key=lambda letter: ORDER.index(letter.lower())))
+
+    flipped = strength(black) > strength(white)
+    if flipped:
+        white, black = black, white
+    return ordered(white) + ordered(black), flipped
+
+class Material:
+    """The pieces of a table and how its positions are numbered."""
+
+    def __init__(self, name):
+        white, black = split(name)
+        self.name = name
+        self.pieces = [(letter.lower(), False) for letter in white] + \
+            [(letter.lower(), True) for letter in black]
+        # The slots of the white and black kings.
+        self.kings = (0, len(white))
+        count = len(self.pieces)
+        self.shifts = tuple(6 * (count - 1 - slot) for slot in range(count))
+        # Positions with each side to move.
+        self.size = 64 ** count
+        self.exits = {}
+
+    def index(self, squares, black):
+        index = black * self.size
+        for square, shift in zip(squares, self.shifts):
+            index |= square << shift
+        return index
+
+    def squares(self, index):
+        """The squares of the pieces of a position, and whether black is to move."""
+        return [index >> shift & 63 for shift in self.shifts], index >= self.size
+
+    def exit(self, taken=None, promoted=None, letter=None):
+        """
+        Where a move taking the piece in slot taken and/or promoting the pawn
+        in slot promoted to letter goes: (table name, whether its colours are
+        swapped, the slot here of the piece in each of its slots).
+        """
+        key = taken, promoted, letter
+        if key not in self.exits:
+            left = [
+                (letter if slot == promoted else piece, black, slot)
+                for slot, (piece, black) in enumerate(self.pieces) if slot != taken
+            ]
+            name, flipped = canonical(
+                ''.join(piece for piece, black, _ in left if not black),
+                ''.join(piece for piece, black, _ in left if black))
+            left.sort(key=lambda piece: (piece[1] != flipped, ORDER.index(piece[0])))
+            self.exits[key] = name, flipped, [slot for _, _, slot in left]
+        return self.exits[key]
+
+    def moveexits(self):
+        """Every (taken, promoted, letter) a move can leave the table by."""
+        found = []
+        for slot, (letter, black) in enumerate(self.pieces):
+            takes = [
+                taken for taken, (other, side) in enumerate(self.pieces)
+                if side != black and other != 'k'
+            ]
+            found.extend((taken, None, None) for taken in takes)
+            if letter == 'p':
+                for promotion in 'qrbn':
+                    found.extend((taken, slot, promotion) for taken in takes + [None])
+        return found
+
+_materials = {}
+
+def material(name):
+    """The (shared) Material of a table."""
+    if name not in _materials:
+        _materials[name] = Material(name)
+    return _materials[name]
+
+def dependencies(name):
+    """The names of the tables moves from name's can go to."""
+    table = material(name)
+    return sorted({table.exit(*key)[0] for key in table.moveexits()})
+
+def tablepath(name, directory=None):
+    return os.path.join(directory or DIRECTORY, name + '.tb')
+
+def attacked(pieces, squares, occupied, target, black):
+    """
+    Whether any of the pieces of black (True/False) attack square target,
+    occupied being the bitmask of the squares with pieces on.
+    """
+    for (letter, side), square in zip(pieces, squares):
+        if side == black and ATTACKS[letter, side][square] >> target & 1:
+            if letter in 'qrb' and BETWEEN[square][target] & occupied:
+                continue
+            return True
+    return False
+
+def legal(table, squares, black):
+    """Whether a position of table with black to move can happen."""
+    occupied = 0
+    for (letter, _), square in zip(table.pieces, squares):
+        if occupied >> square & 1 or (letter == 'p' and (square < 8 or square > 55)):
+            return False
+        occupied |= 1 << square
+    king = squares[table.kings[not black]]
+    return not attacked(table.pieces, squares, occupied, king, black)
+
+def destinations(table, squares, occupied, slot):
+    """
+    Yield (square, slot of the piece taken or None) for every move of the
+    piece in slot, whether it leaves its king in check or not.
+    """
+    letter, black = table.pieces[slot]
+    square = squares[slot]
+    if letter == 'p':
+        step = 8 if black else -8
+        to = square + step
+        if not occupied >> to & 1:
+            yield to, None
+            if square // 8 == (1 if black else 6) and not occupied >> to + step & 1:
+                yield to + step, None
+        rays = [(to,) for to in PAWN_TAKES[black][square] if occupied >> to & 1]
+    else:
+        rays = RAYS[letter][square]
+    for ray in rays:
+        for to in ray:
+            if occupied >> to & 1:
+                taken = squares.index(to)
+                if table.pieces[taken][1] != black:
+                    yield to, taken
+                break
+            if letter != 'p':
+                yield to, None
+
+def origins(table, squares, occupied, slot):
+    """Yield the squares the piece in slot could have moved from without taking."""
+    letter, black = table.pieces[slot]
+    square = squares[slot]
+    if letter == 'p':
+        step = 8 if black else -8
+        start = square - step
+        if 8 <= start < 56 and not occupied >> start & 1:
+            yield start
+            if square // 8 == (3 if black else 4) and not occupied >> start - step & 1:
+                yield start - step
+        return
+    for ray in RAYS[letter][square]:
+        for origin in ray:
+            if occupied >> origin & 1:
+                break
+            yield origin
+
+def opentables(names, directory):
+    """name -> the bytes of each table, memory mapped."""
+    tables = {}
+    for name in names:
+        with open(tablepath(name, directory), 'rb') as file:
+            tables[name] = gamefile.mapfile(file)
+    return tables
+
+def exitvalue(table, tables, squares, black, taken, promoted, letter):
+    """The value in the table it goes to of a move leaving the table."""
+    name, flipped, slots = table.exit(taken, promoted, letter)
+    flip = 56 if flipped else 0
+    index = material(name).index([squares[slot] ^ flip for slot in slots], black != flipped)
+    return tables[name][index]
+
+def _legalchunk(name, start, stop):
+    """The values of positions start to stop, ILLEGAL or 0."""
+    table = material(name)
+    return bytes(
+        0 if legal(table, *table.squares(index)) else ILLEGAL
+        for index in range(start, stop)
+    )
+
+def _countchunk(name, directory, path, start, stop):
+    """
+    Count the moves of positions start to stop, with the ILLEGAL markers of
+    every position at path. Returns (move counts, the indexes of checkmates,
+    {plies: indexes} of the moves out of the table to mates that far away).
+    """
+    table = material(name)
+    with open(path, 'rb') as file:
+        values = gamefile.mapfile(file)
+    tables = opentables(dependencies(name), directory)
+    counts = bytearray(stop - start)
+    mates = []
+    exits = {}
+    for index in range(start, stop):
+        if values[index] == ILLEGAL:
+            continue
+        squares, black = table.squares(index)
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        other = (not black) * table.size
+        moves = 0
+        for slot, (letter, side) in enumerate(table.pieces):
+            if side != black:
+                continue
+            shift = table.shifts[slot]
+            base = index - black * table.size - (squares[slot] << shift) + other
+            for to, taken in destinations(table, squares, occupied, slot):
+                promotes = letter == 'p' and (to < 8 or to > 55)
+                if taken is None and not promotes:
+                    moves += values[base | to << shift] != ILLEGAL
+                    continue
+                moved = list(squares)
+                moved[slot] = to
+                for promotion in ('qrbn' if promotes else (None,)):
+                    value = exitvalue(
+                        table, tables, moved, not black, taken,
+                        slot if promotes else None, promotion)
+                    if value == ILLEGAL:
+                        continue
+                    moves += 1
+                    if value:
+                        exits.setdefault(value - 1, []).append(index)
+        counts[index - start] = moves
+        if not moves and attacked(
+                table.pieces, squares, occupied, squares[table.kings[black]], not black):
+            mates.append(index)
+    for data in tables.values():
+        if data:
+            data.close()
+    values.close()
+    return bytes(counts), mates, exits
+
+def _generatepython(name, directory, workers, path):
+    """Make the table name with plain Python, returning its bytes."""
+    table = material(name)
+    total = table.size * 2
+    ranges = [(start, min(start + CHUNK, total)) for start in range(0, total, CHUNK)]
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    mapper = pool.map if pool is not None else map
+    try:
+        values = bytearray(b''.join(mapper(
+            _legalchunk, [name] * len(ranges), *zip(*ranges))))
+        # The workers count moves by looking up which positions can happen.
+        with open(path, 'wb') as file:
+            file.write(values)
+        counts = bytearray()
+        mates = []
+        levels = {}
+        for chunk, found, exits in mapper(
+                _countchunk, [name] * len(ranges), [directory] * len(ranges),
+                [path] * len(ranges), *zip(*ranges)):
+            counts += chunk
+            mates.extend(found)
+            for plies, indexes in exits.items():
+                levels.setdefault(plies, []).extend(indexes)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    for index in mates:
+        values[index] = 1
+
+    frontier = mates
+    plies = 0
+    while plies < LONGEST and (frontier or any(level >= plies for level in levels)):
+        found = []
+        winning = plies % 2 == 0
+
+        def reach(parent):
+            if values[parent]:
+                return
+            if not winning:
+                counts[parent] -= 1
+                if counts[parent]:
+                    return
+            values[parent] = plies + 2
+            found.append(parent)
+
+        for index in frontier:
+            squares, black = table.squares(index)
+            occupied = 0
+            for square in squares:
+                occupied |= 1 << square
+            # The side that moved to get here.
+            mover = not black
+            base = index - black * table.size + mover * table.size
+            for slot, (_, side) in enumerate(table.pieces):
+                if side != mover:
+                    continue
+                shift = table.shifts[slot]
+                stripped = base - (squares[slot] << shift)
+                for origin in origins(table, squares, occupied, slot):
+                    reach(stripped | origin << shift)
+        for parent in levels.pop(plies, ()):
+            reach(parent)
+        frontier = found
+        plies += 1
+    return values
+
+def _npattacked(np, table, squares, target, black):
+    """numpy version of attacked(), squares being arrays of each piece's square."""
+    hit = np.zeros(len(target), dtype=bool)
+    for slot, (letter, side) in enumerate(table.pieces):
+        if side != black:
+            continue
+        attacks = _NP['attacks'][letter, side][squares[slot], target]
+        if letter in 'qrb':
+            for other in squares:
+                if other is not squares[slot]:
+                    attacks &= ~_NP['between'][squares[slot], target, other]
+        hit |= attacks
+    return hit
+
+_NP = {}
+
+def _nptables(np):
+    """The move tables as numpy arrays, square 64 meaning none."""
+    if not _NP:
+        _NP['attacks'] = {
+            key: np.array([[mask >> to & 1 for to in range(64)] for mask in masks], dtype=bool)
+            for key, masks in ATTACKS.items()
+        }
+        _NP['between'] = np.array(
+            [[[mask >> square & 1 for square in range(64)] for mask in row] for row in BETWEEN],
+            dtype=bool)
+        _NP['rays'] = {}
+        for letter, rays in RAYS.items():
+            padded = np.full((65, 8, 7), 64, dtype=np.int16)
+            for square, directions in enumerate(rays):
+                for direction, ray in enumerate(directions):
+                    padded[square, direction, :len(ray)] = ray
+            _NP['rays'][letter] = padded
+        _NP['takes'] = {}
+        for black, takes in PAWN_TAKES.items():
+            padded = np.full((65, 2), 64, dtype=np.int16)
+            for square, squares in enumerate(takes):
+                padded[square, :len(squares)] = squares
+            _NP['takes'][black] = padded
+    return _NP
+
+def _npsquares(np, table, indexes):
+    return [(indexes >> shift & 63).astype(np.int16) for shift in table.shifts]
+
+def _npindex(np, table, squares, black):
+    index = np.full(len(squares[0]), black * table.size, dtype=np.int64)
+    for square, shift in zip(squares, table.shifts):
+        index |= square.astype(np.int64) << shift
+    return index
+
+def _generatenumpy(name, directory, np):
+    """Make the table name with whole table numpy passes, returning its bytes."""
+    table = material(name)
+    tables = {
+        sub: np.fromfile(tablepath(sub, directory), dtype=np.uint8)
+        for sub in dependencies(name)
+    }
+    moves = _nptables(np)
+    size = table.size
+    values = np.zeros(size * 2, dtype=np.uint8)
+    counts = np.zeros(size * 2, dtype=np.uint8)
+    levels = {}
+
+    squares = _npsquares(np, table, np.arange(size, dtype=np.int64))
+    possible = np.ones(size, dtype=bool)
+    for slot, (letter, _) in enumerate(table.pieces):
+        for other in range(slot):
+            possible &= squares[slot] != squares[other]
+        if letter == 'p':
+            possible &= (squares[slot] >= 8) & (squares[slot] < 56)
+    for black in (False, True):
+        king = squares[table.kings[not black]]
+        values[black * size:(black + 1) * size][
+            ~possible | _npattacked(np, table, squares, king, black)] = ILLEGAL
+    del squares, possible
+
+    for black in (False, True):
+        selected = np.flatnonzero(values[black * size:(black + 1) * size] != ILLEGAL)
+        squares = _npsquares(np, table, selected)
+        # The index of each position with the other side to move.
+        after = _npindex(np, table, squares, not black)
+        found = np.zeros(len(selected), dtype=np.uint8)
+
+        def occupant(to):
+            """The slot of the piece on each to square, -1 for none."""
+            slots = np.full(len(selected), -1, dtype=np.int8)
+            for slot, square in enumerate(squares):
+                slots[square == to] = slot
+            return slots
+
+        def leave(mask, moved, taken, promoted, letter):
+            """Count the moves out of the table and note where they lead."""
+            if not mask.any():
+                return
+            name, flipped, slots = table.exit(taken, promoted, letter)
+            flip = 56 if flipped else 0
+            index = _npindex(
+                np, material(name), [moved[slot][mask] ^ flip for slot in slots],
+                (not black) != flipped)
+            value = tables[name][index]
+            found[mask] += value != ILLEGAL
+            decided = (value != ILLEGAL) & (value != 0)
+            parents = selected[mask][decided] + black * size
+            value = value[decided]
+            for plies in np.unique(value):
+                levels.setdefault(int(plies) - 1, []).append(parents[value == plies])
+
+        def play(slot, to, reachable, takes=True, quiet=True):
+            """Count the moves of the piece in slot to the to squares it can reach."""
+            letter = table.pieces[slot][0]
+            held = occupant(to)
+            moved = list(squares)
+            moved[slot] = to
+            last = (to < 8) | (to > 55) if letter == 'p' else np.zeros(len(selected), dtype=bool)
+            promotions = 'qrbn' if last.any() else ()
+            if takes:
+                for taken, (other, side) in enumerate(table.pieces):
+                    if side == black or other == 'k':
+                        continue
+                    mask = reachable & (held == taken)
+                    for promotion in promotions:
+                        leave(mask & last, moved, taken, slot, promotion)
+                    leave(mask & ~last, moved, taken, None, None)
+            if quiet:
+                mask = reachable & (held < 0)
+                for promotion in promotions:
+                    leave(mask & last, moved, None, slot, promotion)
+                mask &= ~last
+                index = after + ((to.astype(np.int64) - squares[slot]) << table.shifts[slot])
+                ok = np.zeros(len(selected), dtype=bool)
+                ok[mask] = values[index[mask]] != ILLEGAL
+                found[:] += ok
+            return held
+
+        for slot, (letter, side) in enumerate(table.pieces):
+            if side != black:
+                continue
+            square = squares[slot]
+            if letter == 'p':
+                step = 8 if black else -8
+                held = play(slot, square + step, np.ones(len(selected), dtype=bool), takes=False)
+                start = (square // 8 == (1 if black else 6)) & (held < 0)
+                double = np.where(start, square + 2 * step, 64)
+                play(slot, double, start, takes=False)
+                for side in range(2):
+                    to = moves['takes'][black][square, side]
+                    play(slot, to, to != 64, quiet=False)
+                continue
+            for direction in range(8):
+                alive = np.ones(len(selected), dtype=bool)
+                for step in range(7):
+                    to = moves['rays'][letter][square, direction, step]
+                    alive &= to != 64
+                    if not alive.any():
+                        break
+                    alive &= play(slot, to, alive) < 0
+
+        counts[selected + black * size] = found
+        king = squares[table.kings[black]]
+        checked = _npattacked(np, table, squares, king, not black)
+        values[selected[(found == 0) & checked] + black * size] = 1
+        del squares, after
+
+    frontier = np.flatnonzero(values == 1)
+    plies = 0
+    while plies < LONGEST and (len(frontier) or any(level >= plies for level in levels)):
+        winning = plies % 2 == 0
+
+        def reach(parents):
+            parents = parents[values[parents] == 0]
+            if not winning:
+                parents, times = np.unique(parents, return_counts=True)
+                counts[parents] -= times.astype(np.uint8)
+                parents = parents[counts[parents] == 0]
+            values[parents] = plies + 2
+
+        for black in (False, True):
+            children = frontier[(frontier >= size) == black] - black * size
+            if not len(children):
+                continue
+            squares = _npsquares(np, table, children)
+            mover = not black
+
+            def empty(origin):
+                ok = origin != 64
+                for square in squares:
+                    ok &= square != origin
+                return ok
+
+            for slot, (letter, side) in enumerate(table.pieces):
+                if side != mover:
+                    continue
+                shift = table.shifts[slot]
+                base = children + mover * size - (squares[slot].astype(np.int64) << shift)
+                if letter == 'p':
+                    step = 8 if mover else -8
+                    origin = squares[slot] - step
+                    ok = empty(origin) & (origin >= 8) & (origin < 56)
+                    reach(base[ok] | origin[ok].astype(np.int64) << shift)
+                    ok &= squares[slot] // 8 == (3 if mover else 4)
+                    double = np.where(ok, origin - step, 64)
+                    ok &= empty(double)
+                    reach(base[ok] | double[ok].astype(np.int64) << shift)
+                    continue
+                for direction in range(8):
+                    alive = np.ones(len(children), dtype=bool)
+                    for step in range(7):
+                        origin = moves['rays'][letter][squares[slot], direction, step]
+                        alive &= empty(origin)
+                        if not alive.any():
+                            break
+                        reach(base[alive] | origin[alive].astype(np.int64) << shift)
+        if plies in levels:
+            reach(np.concatenate(levels.pop(plies)))
+        plies += 1
+        frontier = np.flatnonzero(values == plies + 1)
+    return values.tobytes()
+
+def generate(name, directory=None, workers=1, progress=None):
+    """
+    Make the table name and any it needs that haven't been made yet, saving
+    them in directory. Returns the names of the tables made.
+    progress: called with each table's name as it's started.
+    """
+    directory = directory or DIRECTORY
+    name, _ = canonical(*split(name))
+    if len(name) > PIECES:
+        raise ValueError('Tables have at most {} pieces'.format(PIECES))
+    made = []
+    for sub in dependencies(name):
+        if not os.path.exists(tablepath(sub, directory)):
+            made.extend(generate(sub, directory, workers, progress))
+    if progress is not None:
+        progress(name)
+    os.makedirs(directory, exist_ok=True)
+    path = tablepath(name, directory)
+    if numpy is not None:
+        values = _generatenumpy(name, directory, numpy)
+    else:
+        values = _generatepython(name, directory, workers, path + '.tmp')
+    with open(path + '.tmp', 'wb') as file:
+        file.write(values)
+    os.replace(path + '.tmp', path)
+    _open.pop(name, None)
+    return made + [name]
+
+# name -> an open table, or None if there isn't one.
+_open = {}
+
+def opentable(name):
+    """The memory mapped table name in DIRECTORY, or None if it hasn't been made."""
+    if name not in _open:
+        try:
+            with open(tablepath(name), 'rb') as file:
+                data = gamefile.mapfile(file)
+        except OSError:
+            data = None
+        if data is not None and len(data) != material(name).size * 2:
+            data = None
+        _open[name] = data
+    return _open[name]
+
+def setdirectory(directory):
+    """Probe the tables in directory from now on."""
+    global DIRECTORY
+    DIRECTORY = directory
+    _open.clear()
+
+def probe(board):
+    """
+    Look a position (a Squares) up. Returns (1, plies) if the side to move
+    mates in plies, (-1, plies) if it's mated in plies, (0, None) for a draw
+    and None if it isn't in a table.
+    """
+    white, black = board.pieces
+    if len(white) + len(black) > PIECES or board.castling:
+        return None
+    turn = board.blackturn
+    ep = board.ep
+    if ep is not None and any(
+            board.codes[square] == 1 | (chess.BLACK_PIECE if turn else 0)
+            for square in PAWN_TAKES[not turn][ep]):
+        return None
+    name, flipped = canonical(
+        ''.join(piece.letter for piece in white.values()),
+        ''.join(piece.letter for piece in black.values()))
+    data = opentable(name)
+    if data is None:
+        return None
+    if flipped:
+        white, black = black, white
+    flip = 56 if flipped else 0
+    squares = [
+        square ^ flip
+        for pieces in (white, black)
+        for square, _ in sorted(pieces.items(), key=lambda item: ORDER.index(item[1].letter))
+    ]
+    value = data[material(name).index(squares, turn != flipped)]
+    if value == ILLEGAL:
+        return None
+    if not value:
+        return 0, None
+    plies = value - 1
+    return (1 if plies % 2 else -1), plies
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py tablebase', description='Make and probe endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    make = commands.add_parser('generate', help='make tables')
+    make.add_argument('tables', nargs='+', help='e.g. KQK KRK KQKR')
+    make.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='processes to use without NumPy (default: %(default)s)')
+    look = commands.add_parser('probe', help='look up a position')
+    look.add_argument('fen', nargs='*', help='position (default: start)')
+    for command in (make, look):
+        command.add_argument(
+            '--dir', default=DIRECTORY, help='where the tables are (default: %(default)s)')
+    args = parser.parse_args(argv)
+    setdirectory(args.dir)
+
+    if args.command == 'generate':
+        start = time.perf_counter()
+
+        def progress(name):
+            print('{} ({:.1f}s)...'.format(name, time.perf_counter() - start), flush=True)
+
+        try:
+            for name in args.tables:
+                generate(name, args.dir, args.workers, progress)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print('Done in {:.1f}s{}.'.format(
+            time.perf_counter() - start, '' if numpy is not None else ' (without NumPy)'))
+        return 0
+
+    try:
+        board = chess.Squares.fromfen(' '.join(args.fen) if args.fen else chess.START_FEN)
+    except ValueError as e:
+        parser.error(str(e))
+    found = probe(board)
+    side = 'Black' if board.blackturn else 'White'
+    if found is None:
+        print('Not in the tables.')
+    elif not found[0]:
+        print('Draw.')
+    else:
+        print('{} {} in {} plies.'.format(
+            side, 'mates' if found[0] > 0 else 'is mated', found[1]))
+    return 0
@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transposition
+
+# Different positions, all in the one bucket of a table of 0 megabytes.
+DEEP = 0x1234
+SHALLOW = 0x5678
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = transposition.TranspositionTable(0)
+        self.table.store(DEEP, 5, transposition.EXACT, 10, 1)
+        # Not deep enough to replace DEEP, so it goes in the second slot.
+        self.table.store(SHALLOW, 1, transposition.EXACT, 20, 2)
+
+    def copies(self, key):
+        table = self.table.table
+        return sum(table[slot] == key and table[slot + 1] != 0 for slot in (0, 2))
+
+    def test_second_slot_replaced_in_place(self):
+        self.assertEqual(self.copies(SHALLOW), 1)
+        # Deep enough that the replacement rule alone would pick the first slot.
+        self.table.store(SHALLOW, 6, transposition.LOWER, 30, 3)
+        self.assertEqual(self.copies(SHALLOW), 1)
+        self.assertEqual(self.table.peek(SHALLOW), (6, transposition.LOWER, 30, 3))
+        self.assertEqual(self.table.peek(DEEP), (5, transposition.EXACT, 10, 1))
+        self.assertEqual(self.table.filled, 2)
+        self.assertEqual(self.table.overwrites, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Transposition table for the engine.
+
+A fixed size hash table of search results keyed by Zobrist hash, held in
+one array of 64 bit integers rather than a dict of objects, so its memory is
+exactly what it's configured to.
+
+Each entry is two integers, the full key and the packed data:
+    bits 0-15   best move (chess.encodemove())
+    bits 16-23  depth searched
+    bits 24-25  bound (EXACT, LOWER or UPPER)
+    bits 26-31  generation (which search stored it)
+    bits 32-63  score + 2 ** 31
+Entries are in buckets of two. The first keeps the deepest result and the
+second always takes whatever the first won't, so deep results survive while
+recent shallow ones are still kept.
+"""
+
+from array import array
+
+EXACT = 1
+# The score is at least (failed high) or at most (failed low) this.
+LOWER = 2
+UPPER = 3
+
+ENTRY_BYTES = 16
+BUCKET = 2
+SCORE_OFFSET = 1 << 31
+
+class TranspositionTable:
+    """
+    megabytes: memory to use, rounded down to a power of two number of
+    buckets.
+    """
+
+    def __init__(self, megabytes=16):
+        buckets = max(megabytes * 1024 * 1024 // (ENTRY_BYTES * BUCKET), 1)
+        # Round down to a power of two so the bucket is key & mask.
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.mask = buckets - 1
+        self.entries = buckets * BUCKET
+        self.table = array('Q', [0]) * (self.entries * 2)
+        self.generation = 0
+        self.filled = 0
+        # Statistics.
+        self.probes = 0
+        self.hits = 0
+        # Probes which found the bucket holding only other positions.
+        self.collisions = 0
+        self.stores = 0
+        # Stores which replaced a different position from this search.
+        self.overwrites = 0
+
+    def megabytes(self):
+        return self.entries * ENTRY_BYTES / (1024 * 1024)
+
+    def newsearch(self):
+        """Start a new search, older entries become first to be replaced."""
+        self.generation = (self.generation + 1) & 63
+
+    def clear(self):
+        """Empty the table and start its statistics again."""
+        self.table = array('Q', [0]) * (self.entries * 2)
+        self.filled = 0
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key):
+        """Get (depth, bound, score, move) stored for key, or None."""
+        self.probes += 1
+        table = self.table
+        index = (key & self.mask) * BUCKET * 2
+        for slot in (index, index + 2):
+            if table[slot] == key:
+                data = table[slot + 1]
+                if data:
+                    self.hits += 1
+                    return (
+                        (data >> 16) & 255, (data >> 24) & 3,
+                        (data >> 32) - SCORE_OFFSET, data & 0xFFFF
+                    )
+        if table[index + 1] or table[index + 3]:
+            self.collisions += 1
+        return None
+
+    def peek(self, key):
+        """probe() without counting it in the statistics."""
+        table = self.table
+        index = (key & self.mask) * BUCKET * 2
+        for slot in (index, index + 2):
+            if table[slot] == key:
+                data = table[slot + 1]
+                if data:
+                    return (
+                        (data >> 16) & 255, (data >> 24) & 3,
+                        (data >> 32) - SCORE_OFFSET, data & 0xFFFF
+                    )
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """Store a search result, move is an encodemove() code or 0."""
+        self.stores += 1
+        table = self.table
+        index = (key & self.mask) * BUCKET * 2
+        first = table[index + 1]
+        # A position already in the bucket is replaced where it is, so it's
+        # never held twice.
+        if table[index] == key:
+            slot = index
+        elif table[index + 2] == key and table[index + 3]:
+            slot = index + 2
+        elif (
+            not first or
+            ((first >> 26) & 63) != self.generation or
+            depth >= (first >> 16) & 255
+        ):
+            slot = index
+        else:
+            slot = index + 2
+
+        old = table[slot + 1]
+        if not old:
+            self.filled += 1
+        elif table[slot] != key:
+            if ((old >> 26) & 63) == self.generation:
+                self.overwrites += 1
+        elif not move:
+            # Keep the best move from an earlier search of the position.
+            move = old & 0xFFFF
+
+        table[slot] = key
+        table[slot + 1] = (
+            move | (min(depth, 255) << 16) | (bound << 24) |
+            (self.generation << 26) | ((score + SCORE_OFFSET) << 32)
+        )
+
+    def stats(self):
+        """Usage statistics, hit and fill rates as fractions."""
+        return {
+            'megabytes': self.megabytes(),
+            'entries': self.entries,
+            'filled': self.filled,
+            'fillrate': self.filled / self.entries,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hitrate': self.hits / self.probes if self.probes else 0.0,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+        }
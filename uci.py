@@ -0,0 +1,262 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be used by
+chess GUIs and match runners.
+
+Reads commands on stdin and answers on stdout. Searches run on a thread of
+their own, leaving this one free to answer isready and stop straight away;
+stop makes the search give up within a node and report its best move from
+the last iteration it finished.
+
+Supports uci, isready, setoption, ucinewgame, position, go (depth, nodes,
+movetime, wtime, btime, winc, binc, movestogo, infinite, ponder), stop,
+ponderhit and quit, with the options Hash, Ponder, BookFile and
+TablebasePath.
+
+Usage:
+    python chess.py uci
+"""
+
+import sys
+import threading
+
+import chess
+import engine
+import tablebase
+from transposition import TranspositionTable
+
+NAME = 'cmdpychess'
+# Moves to share the time left between when the GUI doesn't say.
+MOVESTOGO = 30
+# Seconds kept back each move for talking to the GUI.
+OVERHEAD = 0.05
+
+def budget(limits, black):
+    """Seconds to search for from the go command's limits, None for no limit."""
+    if 'movetime' in limits:
+        return max(limits['movetime'] / 1000 - OVERHEAD, 0.01)
+    left = limits.get('btime' if black else 'wtime')
+    if left is None:
+        return None
+    increment = limits.get('binc' if black else 'winc', 0) / 1000
+    left /= 1000
+    share = left / limits.get('movestogo', MOVESTOGO) + increment * 0.75
+    return max(min(share, left / 2) - OVERHEAD, 0.01)
+
+def scorename(score):
+    """A search score as UCI puts it, 'cp 35' or 'mate -3'."""
+    # Nothing is worse than being checkmated already, 'mate 0'.
+    score = min(max(score, -engine.MATE), engine.MATE)
+    if score > engine.MATE_BOUND:
+        return 'mate {}'.format((engine.MATE - score + 1) // 2)
+    if score < -engine.MATE_BOUND:
+        return 'mate {}'.format(-((engine.MATE + score) // 2))
+    return 'cp {}'.format(score)
+
+class UCI:
+    """
+    The state of a UCI session: the position, the options and the search
+    running on its thread, if any.
+    output: called with each line to send.
+    """
+
+    def __init__(self, output=None):
+        self.output = output or self.write
+        self.game = chess.Game()
+        self.hashsize = 16
+        self.table = TranspositionTable(self.hashsize)
+        self.ponder = False
+        self.book = None
+        self.search = None
+        self.thread = None
+        # Set when the search may report its move, not until stop or
+        # ponderhit when it's infinite or pondering.
+        self.release = threading.Event()
+        # Seconds to search for once a ponder search is told ponderhit.
+        self.pondertime = None
+        self.lock = threading.Lock()
+
+    def write(self, line):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    def send(self, line):
+        # The search thread sends info lines while this one answers commands.
+        with self.lock:
+            self.output(line)
+
+    def run(self, lines):
+        """Carry out each command line, until quit."""
+        for line in lines:
+            if not self.command(line):
+                break
+        self.stop()
+
+    def command(self, line):
+        """Carry out one command, returning False for quit."""
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == 'quit':
+            return False
+        if command == 'uci':
+            self.send('id name ' + NAME)
+            self.send('id author ' + chess.__author__)
+            self.send('option name Hash type spin default 16 min 1 max 4096')
+            self.send('option name Ponder type check default false')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default ' + tablebase.DIRECTORY)
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.setoption(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.table.clear()
+            self.game = chess.Game()
+        elif command == 'position':
+            self.stop()
+            self.position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        else:
+            self.send('info string unknown command ' + command)
+        return True
+
+    def setoption(self, args):
+        """setoption name <name> [value <value>]"""
+        if 'value' in args:
+            split = args.index('value')
+            name, value = ' '.join(args[1:split]), ' '.join(args[split + 1:])
+        else:
+            name, value = ' '.join(args[1:]), ''
+        name = name.lower()
+        self.stop()
+        if name == 'hash':
+            try:
+                self.hashsize = max(int(value), 1)
+            except ValueError:
+                return
+            self.table = TranspositionTable(self.hashsize)
+        elif name == 'ponder':
+            self.ponder = value.lower() == 'true'
+        elif name == 'bookfile':
+            import book
+
+            if self.book is not None:
+                self.book.close()
+                self.book = None
+            if value and value != '<empty>':
+                try:
+                    self.book = book.OpeningBook(value)
+                except (OSError, ValueError) as e:
+                    self.send('info string ' + str(e))
+        elif name == 'tablebasepath':
+            tablebase.setdirectory(value)
+
+    def position(self, args):
+        """position startpos|fen <fen> [moves <move> ...]"""
+        moves = args.index('moves') if 'moves' in args else len(args)
+        try:
+            if args and args[0] == 'fen':
+                game = chess.Game(fen=' '.join(args[1:moves]))
+            else:
+                game = chess.Game()
+        except ValueError as e:
+            self.send('info string ' + str(e))
+            return
+        for name in args[moves + 1:]:
+            result = game.move(name)
+            if not result.legal:
+                self.send('info string {} {}'.format(name, result.reason))
+                break
+        self.game = game
+
+    def go(self, args):
+        """Start a search of the position on the search thread."""
+        limits = {}
+        words = iter(args)
+        for word in words:
+            if word in ('infinite', 'ponder'):
+                limits[word] = True
+            elif word in ('searchmoves',):
+                break
+            else:
+                try:
+                    limits[word] = int(next(words, ''))
+                except ValueError:
+                    pass
+        board = self.game.board
+        movetime = budget(limits, board.blackturn)
+        if self.book is not None and not limits.get('ponder') and not limits.get('infinite'):
+            move = self.book.choose(board)
+            if move in self.game.legalmoves():
+                self.send('info string book move')
+                self.send('bestmove ' + chess.movename(*move))
+                return
+        self.release.clear()
+        self.pondertime = None
+        if limits.get('ponder'):
+            # Think on the opponent's time without a limit until ponderhit.
+            self.pondertime, movetime = movetime, None
+        elif not limits.get('infinite'):
+            self.release.set()
+        self.search = engine.Search(
+            board, movetime, limits.get('nodes'), limits.get('depth'),
+            info=self.info, table=self.table)
+        self.thread = threading.Thread(target=self.think, args=(self.search,), daemon=True)
+        self.thread.start()
+
+    def think(self, search):
+        """Run the search and say what it found, on the search thread."""
+        search.run()
+        # An infinite or ponder search mustn't answer before it's told to.
+        self.release.wait()
+        best = search.best
+        if best is None:
+            moves = search.moves()
+            if not moves:
+                # Checkmate or stalemate, say which before there's no move.
+                self.send('info depth 0 score ' + scorename(search.score))
+                self.send('bestmove 0000')
+                return
+            best = moves[0]
+        line = 'bestmove ' + chess.movename(*best)
+        pv = search.pv()
+        if self.ponder and len(pv) > 1:
+            line += ' ponder ' + chess.movename(*pv[1])
+        self.send(line)
+
+    def info(self, search):
+        elapsed = search.elapsed()
+        self.send('info depth {} score {} nodes {} nps {} time {} pv {}'.format(
+            search.depth, scorename(search.score), search.nodes, search.nps(),
+            int(elapsed * 1000), ' '.join(chess.movename(*move) for move in search.pv())))
+
+    def ponderhit(self):
+        """The move pondered on was played, carry on with the time for this move."""
+        search = self.search
+        if search is None:
+            return
+        if self.pondertime is not None:
+            search.movetime = search.elapsed() + self.pondertime
+        self.release.set()
+
+    def stop(self):
+        """Stop any search, waiting for it to report its move."""
+        if self.thread is None:
+            return
+        self.search.stop()
+        self.release.set()
+        self.thread.join()
+        self.thread = self.search = None
+
+def main(argv):
+    UCI().run(sys.stdin)
+    return 0